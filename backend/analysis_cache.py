@@ -0,0 +1,125 @@
+"""
+Analysis Result Cache
+Content-addressed TTL/LRU cache for AI contract analyses, persisted in SQLite
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "analysis_cache.db")
+
+
+def analysis_key(contract_text: str, delay_scenario: str, request: str) -> str:
+    """Stable hash of the inputs that determine an analysis"""
+    digest = hashlib.sha256()
+    for part in (contract_text, delay_scenario, request):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """In-memory LRU in front of an on-disk table, both bounded by TTL; disk writes are batched by flush()"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, ttl_seconds: float = 24 * 3600,
+                 max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Rows to write (created, result) or delete (None) on the next flush, by key
+        self._pending: Dict[str, Optional[Tuple[float, Dict]]] = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Built in a start-up thread, then written from flush() threads
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analyses (key TEXT PRIMARY KEY, created REAL NOT NULL, result TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM analyses WHERE created < ?", (time.time() - ttl_seconds,))
+            self._db.commit()
+            self._warm()
+
+    def _warm(self):
+        """Load the most recent persisted entries so restarts start warm"""
+        rows = self._db.execute(
+            "SELECT key, created, result FROM analyses ORDER BY created DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for key, created, result in reversed(rows):
+            self._entries[key] = (created, json.loads(result))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a fresh cached result, or None"""
+        entry = self._entries.get(key)
+        if entry and time.time() - entry[0] <= self.ttl_seconds:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        if entry:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict):
+        """Store a result in memory, evicting the least recently used entry when full; flush() persists it"""
+        created = time.time()
+        self._entries[key] = (created, result)
+        self._entries.move_to_end(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._entries.popitem(last=False)[0])
+
+        if self._db:
+            with self._pending_lock:
+                for old_key in evicted:
+                    self._pending[old_key] = None
+                self._pending[key] = (created, result)
+
+    def flush(self):
+        """Write pending inserts and evictions in one transaction; blocking, so run it off the event loop"""
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending or not self._db:
+                return
+            with self._db:
+                self._db.executemany(
+                    "DELETE FROM analyses WHERE key = ?", [(key,) for key, row in pending.items() if row is None]
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO analyses (key, created, result) VALUES (?, ?, ?)",
+                    [(key, row[0], json.dumps(row[1])) for key, row in pending.items() if row is not None]
+                )
+
+    def state(self):
+        """In-memory entries, least recently used first, as [key, created, result] rows"""
+        return [[key, created, result] for key, (created, result) in self._entries.items()]
+
+    def restore(self, entries):
+        """Reload state() rows; expired ones are dropped on their next get()"""
+        for key, created, result in entries:
+            self._entries[key] = (created, result)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def close(self):
+        self.flush()
+        if self._db:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,4 @@
+"""
+Backend Benchmarks
+Run from backend/: python -m benchmarks.micro, python -m benchmarks.loadgen, python -m benchmarks.compare
+"""
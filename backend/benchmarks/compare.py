@@ -0,0 +1,87 @@
+"""
+Benchmark Comparison
+Diff two result files and fail when anything got slower than the threshold allows,
+so a regression is caught before a deploy.
+
+Usage (from backend/):
+    python -m benchmarks.compare benchmarks/results/micro-base.json benchmarks/results/micro-new.json
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.harness import RESULTS_FORMAT, result_key
+
+DEFAULT_THRESHOLD = 0.10
+# Statistics judged for regressions; both are "lower is better"
+JUDGED = ("medianMs", "p95Ms")
+# Results faster than this are too noisy to judge on a relative change
+NOISE_FLOOR_MS = 0.01
+
+
+def load(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("format") != RESULTS_FORMAT:
+        raise ValueError(f"{path}: unsupported result format {report.get('format')}")
+    return report
+
+
+def compare(base: Dict, new: Dict, threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[Dict], List[str]]:
+    """Changes for every result present in both runs, and warnings about what makes them incomparable"""
+    warnings = []
+    if base["suite"] != new["suite"]:
+        warnings.append(f"Comparing different suites: {base['suite']} vs {new['suite']}")
+    for key in ("python", "numpy", "platform", "machine", "cpus"):
+        if base["environment"].get(key) != new["environment"].get(key):
+            warnings.append(f"Environment differs in {key}: {base['environment'].get(key)} "
+                            f"vs {new['environment'].get(key)}")
+
+    baseline = {result_key(result): result for result in base["results"]}
+    changes = []
+    for result in new["results"]:
+        key = result_key(result)
+        before = baseline.pop(key, None)
+        if before is None:
+            warnings.append(f"New result without a baseline: {key}")
+            continue
+        for stat in JUDGED:
+            if stat not in result or stat not in before:
+                continue
+            old_value, new_value = before[stat], result[stat]
+            change = (new_value - old_value) / old_value if old_value > 0 else 0.0
+            changes.append({
+                "key": key,
+                "stat": stat,
+                "base": old_value,
+                "new": new_value,
+                "change": change,
+                "regression": change > threshold and max(old_value, new_value) >= NOISE_FLOOR_MS
+            })
+    warnings.extend(f"Result missing from the new run: {key}" for key in baseline)
+    return changes, warnings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown as a fraction (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    changes, warnings = compare(load(args.base), load(args.new), args.threshold)
+    for warning in warnings:
+        print(f"⚠️  {warning}")
+    for change in changes:
+        marker = "❌" if change["regression"] else "  "
+        print(f"{marker} {change['key']:<60} {change['stat']:<9} {change['base']:>11.4f} -> "
+              f"{change['new']:>11.4f} ms  {change['change']:+7.1%}")
+
+    regressions = [change for change in changes if change["regression"]]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"✅ No regressions beyond {args.threshold:.0%}")
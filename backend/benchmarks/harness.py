@@ -0,0 +1,95 @@
+"""
+Benchmark Harness
+Timing loop, environment capture and the JSON result format shared by every benchmark
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+RESULTS_FORMAT = 1
+
+
+def measure(fn: Callable[[], object], repeat: int = 20, warmup: int = 2, min_seconds: float = 0.0) -> Dict:
+    """
+    Time fn() repeat times (more if min_seconds is not yet reached) after warmup calls.
+    Milliseconds per call: median and p95 are what regressions are judged on.
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples: List[float] = []
+    started = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - started < min_seconds:
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - t0) / 1e6)
+    return summarize(samples)
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Statistics over millisecond samples, in the shape every result uses"""
+    if not samples:
+        return {"runs": 0}
+    ms = np.array(samples)
+    median = float(np.median(ms))
+    return {
+        "runs": len(samples),
+        "medianMs": round(median, 4),
+        "p95Ms": round(float(np.percentile(ms, 95)), 4),
+        "minMs": round(float(ms.min()), 4),
+        "meanMs": round(float(ms.mean()), 4),
+        "opsPerSecond": round(1000 / median, 2) if median > 0 else None
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict:
+    """What the numbers were measured on; compare.py warns when two runs differ here"""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "commit": _git_commit()
+    }
+
+
+def write_results(suite: str, results: List[Dict], config: Dict, out: Optional[str] = None) -> str:
+    """Write one run as JSON; the default path is results/<suite>-<timestamp>.json"""
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{suite}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    report = {
+        "format": RESULTS_FORMAT,
+        "suite": suite,
+        "createdAt": datetime.now().isoformat(),
+        "environment": environment(),
+        "config": config,
+        "results": results
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    return out
+
+
+def result_key(result: Dict) -> str:
+    """Stable identity of a result across runs: name plus sorted parameters"""
+    params = ",".join(f"{key}={value}" for key, value in sorted(result.get("params", {}).items()))
+    return f"{result['name']}[{params}]"
@@ -0,0 +1,283 @@
+"""
+WebSocket Load Generator
+Opens thousands of local clients against a running server.py and measures tick jitter,
+end-to-end update latency and request/response throughput.
+
+Most clients only read frames, which is the broadcast load the server sees from browsers;
+a few probe clients decode every state_delta to time it, and request clients loop
+ping / request_contract to measure round trips under that load. Latency is now minus the
+delta's timestamp, so run on the server's machine (or one with a synced clock). Request clients
+send as fast as replies come back, so raise the server's WS_RATE_LIMIT to measure round trips
+rather than rate-limit errors.
+
+Usage (from backend/, with the server running):
+    python -m benchmarks.loadgen --clients 2000 --duration 60
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import websockets
+
+from benchmarks.harness import summarize, write_results
+from codec import JSON, JSON_SUBPROTOCOL
+
+DEFAULT_URL = "ws://localhost:8080"
+DEFAULT_CONTRACTS = ("CNT-2024-001", "CNT-2024-002", "CNT-2024-003")
+# Clients opened concurrently while ramping up, so the accept queue is not flooded
+CONNECT_BATCH = 100
+
+REPLIES = {"ping": "pong", "request_contract": "contract_data"}
+
+
+class Samples:
+    """Raw measurements from one worker process; plain lists so they pickle back to the parent"""
+
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.frames = 0
+        self.bytes = 0
+        self.latency_ms: List[float] = []
+        self.interval_ms: List[float] = []
+        self.gaps = 0
+        self.errors = 0
+        self.rtt_ms: Dict[str, List[float]] = {msg_type: [] for msg_type in REPLIES}
+
+
+async def _reader(websocket, samples: Samples, probe: bool, measure_from: float, stop: float):
+    """Count every frame; probes also time state_deltas and check their sequence numbers"""
+    last_arrival: Optional[float] = None
+    last_seq: Optional[int] = None
+    while time.monotonic() < stop:
+        try:
+            frame = await asyncio.wait_for(websocket.recv(), stop - time.monotonic())
+        except asyncio.TimeoutError:
+            return
+        if time.monotonic() < measure_from:
+            # Warming up: drain what queued while the other clients connected
+            continue
+        samples.frames += 1
+        samples.bytes += len(frame)
+        if not probe:
+            continue
+
+        message = JSON.decode(frame)
+        if message.get("type") != "state_delta":
+            continue
+        arrived = time.monotonic()
+        samples.latency_ms.append((datetime.now() - datetime.fromisoformat(message["data"]["timestamp"]))
+                                  .total_seconds() * 1000)
+        if last_arrival is not None:
+            samples.interval_ms.append((arrived - last_arrival) * 1000)
+        if last_seq is not None and message["baseSeq"] != last_seq:
+            samples.gaps += 1
+        last_arrival, last_seq = arrived, message["seq"]
+
+
+async def _requester(websocket, samples: Samples, contract_ids: List[str], measure_from: float, stop: float):
+    """One request in flight at a time, alternating ping and request_contract"""
+    sent = 0
+    await _reader(websocket, Samples(), False, measure_from, measure_from)
+    while time.monotonic() < stop:
+        msg_type = "ping" if sent % 2 == 0 else "request_contract"
+        request = {"type": msg_type}
+        if msg_type == "request_contract":
+            request["contractId"] = contract_ids[sent // 2 % len(contract_ids)]
+        started = time.perf_counter()
+        await websocket.send(JSON.encode(request))
+
+        # Deltas keep arriving in between; read past them to the reply
+        while True:
+            try:
+                frame = await asyncio.wait_for(websocket.recv(), max(stop - time.monotonic(), 0.001))
+            except asyncio.TimeoutError:
+                return
+            samples.frames += 1
+            samples.bytes += len(frame)
+            reply_type = JSON.decode(frame).get("type")
+            if reply_type in (REPLIES[msg_type], "error"):
+                break
+        if reply_type == "error":
+            samples.errors += 1
+        else:
+            samples.rtt_ms[msg_type].append((time.perf_counter() - started) * 1000)
+        sent += 1
+
+
+async def _client(url: str, role: str, samples: Samples, options: Dict, start: asyncio.Event):
+    try:
+        websocket = await websockets.connect(url, subprotocols=[JSON_SUBPROTOCOL], max_size=None,
+                                             compression=options["compression"], open_timeout=30)
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+        samples.failed += 1
+        return
+    samples.connected += 1
+    try:
+        await asyncio.wait_for(websocket.recv(), 60)  # initial_state, sent before the run starts
+        await start.wait()
+        measure_from = time.monotonic() + options["warmup"]
+        stop = measure_from + options["duration"]
+        if role == "request":
+            await _requester(websocket, samples, options["contract_ids"], measure_from, stop)
+        else:
+            await _reader(websocket, samples, role == "probe", measure_from, stop)
+    except (websockets.ConnectionClosed, asyncio.TimeoutError):
+        pass
+    finally:
+        await websocket.close()
+
+
+async def _run(url: str, roles: List[str], options: Dict) -> Samples:
+    samples = Samples()
+    start = asyncio.Event()
+    tasks = []
+    for first in range(0, len(roles), CONNECT_BATCH):
+        tasks += [asyncio.create_task(_client(url, role, samples, options, start))
+                  for role in roles[first:first + CONNECT_BATCH]]
+        while samples.connected + samples.failed < len(tasks):
+            await asyncio.sleep(0.01)
+    start.set()
+    await asyncio.gather(*tasks)
+    return samples
+
+
+def run_worker(url: str, roles: List[str], options: Dict) -> Samples:
+    """Process entry point: one event loop driving a slice of the clients"""
+    return asyncio.run(_run(url, roles, options))
+
+
+def assign_roles(clients: int, probes: int, requesters: int) -> List[str]:
+    probes = min(probes, clients)
+    requesters = min(requesters, clients - probes)
+    return ["probe"] * probes + ["request"] * requesters + ["reader"] * (clients - probes - requesters)
+
+
+def scrape_metrics(url: str) -> Dict[str, float]:
+    """Plain samples from the server's /metrics page; empty if it cannot be reached"""
+    http = url.replace("ws://", "http://", 1).replace("wss://", "https://", 1).rstrip("/") + "/metrics"
+    try:
+        with urllib.request.urlopen(http, timeout=5) as response:
+            text = response.read().decode()
+    except OSError:
+        return {}
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            values[name] = float(value)
+    return values
+
+
+def _mean_delta(before: Dict, after: Dict, name: str) -> Optional[float]:
+    """Mean of a histogram over the run, from its _sum and _count before and after"""
+    count = after.get(f"{name}_count", 0) - before.get(f"{name}_count", 0)
+    if count <= 0:
+        return None
+    return (after[f"{name}_sum"] - before.get(f"{name}_sum", 0)) / count
+
+
+def _raise_file_limit():
+    """Thousands of sockets need more descriptors than the usual soft limit of 1024"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and (hard == resource.RLIM_INFINITY or soft < hard):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def report(samples: List[Samples], duration: float, before: Dict, after: Dict) -> List[Dict]:
+    """Merge worker samples into results in the harness format"""
+    latency = [ms for worker in samples for ms in worker.latency_ms]
+    intervals = np.array([ms for worker in samples for ms in worker.interval_ms])
+    connected = sum(worker.connected for worker in samples)
+    params = {"clients": connected}
+
+    results = [{"name": "loadgen.update_latency", "params": params, **summarize(latency)}]
+    if intervals.size:
+        # Jitter is the spread of delta arrivals around their typical spacing
+        jitter = np.abs(intervals - np.median(intervals))
+        results.append({"name": "loadgen.delta_interval", "params": params, **summarize(intervals.tolist())})
+        results.append({"name": "loadgen.delta_jitter", "params": params, **summarize(jitter.tolist())})
+
+    for msg_type in REPLIES:
+        rtt = [ms for worker in samples for ms in worker.rtt_ms[msg_type]]
+        stats = summarize(rtt)
+        results.append({"name": f"loadgen.{msg_type}_rtt", "params": params, **stats,
+                        "throughputPerSecond": round(len(rtt) / duration, 2)})
+
+    results.append({
+        "name": "loadgen.totals",
+        "params": params,
+        "failedConnections": sum(worker.failed for worker in samples),
+        "frames": sum(worker.frames for worker in samples),
+        "framesPerSecond": round(sum(worker.frames for worker in samples) / duration, 2),
+        "megabytesPerSecond": round(sum(worker.bytes for worker in samples) / duration / 1e6, 3),
+        "sequenceGaps": sum(worker.gaps for worker in samples),
+        "requestErrors": sum(worker.errors for worker in samples),
+        "serverTickMs": _round_ms(_mean_delta(before, after, "sim_tick_seconds")),
+        "serverTickLatenessMs": _round_ms(_mean_delta(before, after, "sim_tick_lateness_seconds")),
+        "serverTicksSkipped": (after.get("sim_ticks_skipped_total", 0) - before.get("sim_ticks_skipped_total", 0)
+                               if after else None)
+    })
+    return results
+
+
+def _round_ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket load generator for server.py")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--clients", type=int, default=1000, help="Total WebSocket connections")
+    parser.add_argument("--probes", type=int, default=20, help="Clients that decode and time every delta")
+    parser.add_argument("--request-clients", type=int, default=20, help="Clients looping ping / request_contract")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds, after every client connects")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before the run")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to spread the clients over")
+    parser.add_argument("--compression", choices=("deflate", "none"), default="deflate")
+    parser.add_argument("--contracts", default=",".join(DEFAULT_CONTRACTS), help="Contract IDs to request")
+    parser.add_argument("--out", help="Result file (default: benchmarks/results/loadgen-<timestamp>.json)")
+    args = parser.parse_args()
+
+    _raise_file_limit()
+    roles = assign_roles(args.clients, args.probes, args.request_clients)
+    options = {
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "compression": None if args.compression == "none" else "deflate",
+        "contract_ids": args.contracts.split(",")
+    }
+    workers = max(1, min(args.processes, len(roles)))
+    # Deal roles round-robin so every worker gets its share of probes and requesters
+    slices = [roles[i::workers] for i in range(workers)]
+
+    print(f"🔌 {len(roles):,} clients ({args.probes} probes, {args.request_clients} requesting) "
+          f"-> {args.url} for {args.duration:g}s over {workers} process(es)")
+    before = scrape_metrics(args.url)
+    if workers == 1:
+        samples = [run_worker(args.url, slices[0], options)]
+    else:
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            samples = pool.starmap(run_worker, [(args.url, part, options) for part in slices])
+    after = scrape_metrics(args.url)
+
+    results = report(samples, args.duration, before, after)
+    for result in results:
+        if "medianMs" in result:
+            extra = f"  {result['throughputPerSecond']:,.0f}/s" if "throughputPerSecond" in result else ""
+            print(f"   {result['name']:<26} median {result['medianMs']:>9.2f} ms  p95 {result['p95Ms']:>9.2f} ms{extra}")
+        elif result["name"] == "loadgen.totals":
+            print(f"   {result['frames']:,} frames ({result['megabytesPerSecond']} MB/s), "
+                  f"{result['failedConnections']} failed connections, {result['sequenceGaps']} sequence gaps, "
+                  f"{result['requestErrors']} request errors, "
+                  f"server tick {result['serverTickMs']} ms, lateness {result['serverTickLatenessMs']} ms")
+
+    path = write_results("loadgen", results, vars(args), args.out)
+    print(f"📊 {len(results)} results -> {path}")
@@ -0,0 +1,137 @@
+"""
+Microbenchmarks
+Per-tick simulation, state serialization and contract analysis at parameterized fleet and contract sizes.
+Fleets are loaded from seeded snapshot fixtures (built on first use), so every run times the same trucks.
+
+Usage (from backend/):
+    python -m benchmarks.micro --fleet-sizes 1000,10000,100000 --contract-sizes 100,10000,100000
+"""
+
+import argparse
+import itertools
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from benchmarks.harness import measure, write_results
+from codec import CODECS, JSON
+from contract_analyzer import ContractAnalyzer
+from contract_store import InMemoryContractStore, SQLiteContractStore
+from delta import DeltaEncoder
+from snapshot import create_fixture, exists as fixture_exists, restore
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_FLEET_SIZES = (1000, 10000, 100000)
+DEFAULT_CONTRACT_SIZES = (100, 10000, 100000)
+# Trucks per analyze_fleet call
+FLEET_BATCH = 1000
+
+
+def load_fleet(size: int, seed: int, fixture_dir: str = FIXTURE_DIR):
+    """Seeded fleet of synthetic trucks, from its snapshot fixture"""
+    path = os.path.join(fixture_dir, f"fleet-{size}-seed{seed}")
+    if not fixture_exists(path):
+        print(f"   building fixture {path}")
+        create_fixture(path, size, seed)
+    shard, _ = restore(path, ContractAnalyzer(cache=AnalysisCache(path=None), contracts=InMemoryContractStore()))
+    return shard.simulator
+
+
+def fleet_benchmarks(size: int, seed: int, repeat: int) -> List[Dict]:
+    simulator = load_fleet(size, seed)
+    encoder = DeltaEncoder(simulator)
+    params = {"fleetSize": size}
+    results = []
+
+    def record(name: str, fn, **options):
+        stats = measure(fn, repeat=repeat, **options)
+        results.append({"name": name, "params": params, **stats})
+        print(f"   {name:<28} {stats['medianMs']:>10.3f} ms  (p95 {stats['p95Ms']:.3f})")
+
+    record("update_positions", lambda: simulator.update_positions(1.0))
+    record("get_state", simulator.get_state)
+    state = {"type": "initial_state", "data": simulator.get_state()}
+    for codec in CODECS.values():
+        record(f"serialize_state.{codec.name}", lambda codec=codec: codec.encode(state))
+
+    def tick():
+        simulator.update_positions(1.0)
+        JSON.encode(encoder.delta())
+
+    record("tick.update_delta_encode", tick)
+    return results
+
+
+def make_contracts(count: int, seed: int) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    rates = rng.integers(100, 1000, count).tolist()
+    caps = rng.integers(1000, 10000, count).tolist()
+    hours = rng.uniform(1, 72, count).tolist()
+    return [
+        {
+            "id": f"CNT-BENCH-{i:06d}",
+            "client": f"Client {i % 500}",
+            "route": f"Route {i % 200}",
+            "cargoValue": int(rates[i] * 200),
+            "deliveryDeadline": (now + timedelta(hours=hours[i])).isoformat(),
+            "penaltyPerHour": rates[i],
+            "maxPenalty": caps[i],
+            "terms": f"${rates[i]}/hour, capped at ${caps[i]}"
+        }
+        for i in range(count)
+    ]
+
+
+def contract_benchmarks(size: int, seed: int, repeat: int) -> List[Dict]:
+    analyzer = ContractAnalyzer(cache=AnalysisCache(path=None), contracts=SQLiteContractStore(":memory:"))
+    contracts = make_contracts(size, seed)
+    analyzer.contracts.put_many(contracts)
+    rng = np.random.default_rng(seed)
+    ids = [contracts[i]["id"] for i in rng.integers(0, size, 4096)]
+    picks = itertools.cycle(ids)
+    delays = rng.uniform(0.5, 6, FLEET_BATCH)
+    locations = np.column_stack((rng.uniform(72, 89, FLEET_BATCH), rng.uniform(12, 29, FLEET_BATCH)))
+    params = {"contracts": size}
+    results = []
+
+    def record(name: str, fn, extra: Dict = None):
+        stats = measure(fn, repeat=repeat, min_seconds=0.2)
+        results.append({"name": name, "params": {**params, **(extra or {})}, **stats})
+        print(f"   {name:<28} {stats['medianMs']:>10.4f} ms  ({stats['opsPerSecond']:,.0f}/s)")
+
+    record("calculate_penalty", lambda: analyzer.calculate_penalty(next(picks), 2.5))
+    record("analyze_arbitrage_opportunity",
+           lambda: analyzer.analyze_arbitrage_opportunity("TRK-BENCH", next(picks), 2.5, [73.8, 18.5]))
+    batch_ids = ids[:FLEET_BATCH]
+    record("analyze_fleet", lambda: analyzer.analyze_fleet([f"TRK-{i}" for i in range(FLEET_BATCH)], batch_ids,
+                                                           delays, locations), {"batch": FLEET_BATCH})
+    return results
+
+
+def _sizes(text: str) -> List[int]:
+    return [int(size) for size in text.split(",") if size]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend microbenchmarks")
+    parser.add_argument("--fleet-sizes", type=_sizes, default=list(DEFAULT_FLEET_SIZES))
+    parser.add_argument("--contract-sizes", type=_sizes, default=list(DEFAULT_CONTRACT_SIZES))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Result file (default: benchmarks/results/micro-<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.fleet_sizes:
+        print(f"🚛 Fleet of {size:,}")
+        results += fleet_benchmarks(size, args.seed, args.repeat)
+    for size in args.contract_sizes:
+        print(f"📄 {size:,} contracts")
+        results += contract_benchmarks(size, args.seed, args.repeat)
+
+    path = write_results("micro", results, vars(args) | {"fleetBatch": FLEET_BATCH}, args.out)
+    print(f"📊 {len(results)} results -> {path}")
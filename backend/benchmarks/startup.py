@@ -0,0 +1,115 @@
+"""
+Start-up Budget
+Import time of each process entry module, measured in fresh interpreters, plus how long server.py
+takes to accept connections. Exits non-zero when an import is over budget or pulls in a
+module that must stay deferred (the OpenAI SDK is only imported on the first AI call).
+
+Usage (from backend/):
+    python -m benchmarks.startup --budget-ms 150
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.harness import summarize, write_results
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each kind of process imports first
+ENTRY_MODULES = ("server", "shard", "gateway", "cluster", "forecast", "contract_analyzer")
+
+# Heavy SDKs no entry module may import at start-up
+DEFERRED_MODULES = ("openai",)
+
+DEFAULT_BUDGET_MS = 150.0
+
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print((time.perf_counter() - started) * 1000, ",".join(m for m in {deferred!r} if m in sys.modules))
+"""
+
+
+def _environment() -> Dict[str, str]:
+    """Start-up without side effects: no snapshot restore, no event segments, no API key"""
+    env = dict(os.environ, SNAPSHOT_DIR="", EVENT_LOG_DIR="", OPENAI_API_KEY="")
+    env.pop("PYTHONSTARTUP", None)
+    return env
+
+
+def import_time(module: str, repeat: int) -> Dict:
+    """Milliseconds to import module in a fresh interpreter, and which deferred modules it loaded"""
+    samples: List[float] = []
+    loaded = set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, deferred=DEFERRED_MODULES)],
+                                cwd=BACKEND_DIR, env=_environment(), capture_output=True, text=True, check=True)
+        ms, _, modules = output.stdout.strip().splitlines()[-1].partition(" ")
+        samples.append(float(ms))
+        loaded.update(name for name in modules.split(",") if name)
+    return {"name": f"import.{module}", "params": {}, **summarize(samples), "deferredLoaded": sorted(loaded)}
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+
+def server_listen_time(timeout: float = 30.0) -> Dict:
+    """Milliseconds from launching server.py until it accepts a TCP connection"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "server.py"], cwd=BACKEND_DIR,
+                               env=dict(_environment(), WS_HOST="localhost", WS_PORT=str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with socket.create_connection(("localhost", port), timeout=0.1):
+                    ms = (time.perf_counter() - started) * 1000
+                    return {"name": "server.listen", "params": {}, **summarize([ms])}
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError(f"server.py did not listen within {timeout:g}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure process start-up against a budget")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Maximum median import time of any entry module")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="Result file (default: benchmarks/results/startup-<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = [import_time(module, args.repeat) for module in ENTRY_MODULES]
+    results.append(server_listen_time())
+
+    failures = []
+    for result in results:
+        over = result["name"].startswith("import.") and result["medianMs"] > args.budget_ms
+        deferred = result.get("deferredLoaded")
+        marker = "❌" if over or deferred else "  "
+        print(f"{marker} {result['name']:<26} {result['medianMs']:>8.1f} ms"
+              + (f"  loaded {', '.join(deferred)}" if deferred else ""))
+        if over:
+            failures.append(f"{result['name']} took {result['medianMs']:.1f} ms (budget {args.budget_ms:g} ms)")
+        if deferred:
+            failures.append(f"{result['name']} imported {', '.join(deferred)} at start-up")
+
+    path = write_results("startup", results, vars(args), args.out)
+    print(f"📊 {len(results)} results -> {path}")
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print(f"✅ Every entry module imports within {args.budget_ms:g} ms")
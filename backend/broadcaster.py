@@ -0,0 +1,178 @@
+"""
+Fan-Out Broadcaster
+Encodes each frame once per codec and feeds bounded per-client queues drained by writer tasks
+"""
+
+import asyncio
+from collections import deque
+from typing import Callable, Container, Deque, Dict, Iterable, Optional, Set, Tuple
+
+from websockets.exceptions import ConnectionClosed
+
+from codec import Frame, codec_for
+from metrics import registry
+
+# What to do when a client's send queue is full; replies to the client's own requests are never discarded
+DROP = "drop"              # discard the oldest queued broadcast frame
+COALESCE = "coalesce"      # discard queued state frames and send one fresh snapshot instead
+DISCONNECT = "disconnect"  # close the connection
+POLICIES = (DROP, COALESCE, DISCONNECT)
+
+# Close code sent to clients that cannot keep up (1013: try again later)
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+class ClientChannel:
+    """Bounded outbound queue and writer task for one connection"""
+
+    def __init__(self, websocket, broadcaster: "Broadcaster"):
+        self.websocket = websocket
+        self.broadcaster = broadcaster
+        self.codec = codec_for(getattr(websocket, "subprotocol", None))
+        self._bytes_sent = registry.counter("ws_bytes_sent_total", "Frame bytes written to clients",
+                                            {"codec": self.codec.name})
+        # Entries are (seq, frame, reply); seq is None for frames that are not state updates,
+        # reply is True for messages answering this client's requests
+        self.queue: Deque[Tuple[Optional[int], Frame, bool]] = deque()
+        self.needs_resync = False
+        self.dropped = 0
+        self._ready = asyncio.Event()
+        self.task = asyncio.create_task(self._writer())
+
+    def push(self, seq: Optional[int], frame: Frame, reply: bool = False):
+        """Queue a frame without blocking, applying the slow-client policy when full"""
+        if len(self.queue) >= self.broadcaster.max_queue and not self._make_room(seq, reply):
+            return
+        self.queue.append((seq, frame, reply))
+        self._ready.set()
+
+    def _make_room(self, seq: Optional[int], reply: bool) -> bool:
+        """Apply the slow-client policy to a full queue; False when the new frame is not to be queued"""
+        policy = self.broadcaster.policy
+        if policy == DISCONNECT:
+            self.broadcaster.disconnect(self.websocket)
+            return False
+
+        if policy == COALESCE:
+            kept = deque(entry for entry in self.queue if entry[0] is None)
+            if seq is not None or len(kept) < len(self.queue):
+                self.dropped += len(self.queue) - len(kept)
+                self.queue = kept
+                self.needs_resync = True
+                self._ready.set()
+            if seq is not None:
+                # The snapshot sent instead covers this frame too
+                return False
+            if len(self.queue) < self.broadcaster.max_queue:
+                return True
+
+        # Replies answer one request each and are bounded by the dispatcher's limits, so only broadcasts go
+        oldest = next((i for i, entry in enumerate(self.queue) if not entry[2]), None)
+        if oldest is not None:
+            del self.queue[oldest]
+        elif not reply:
+            self.dropped += 1
+            return False
+        else:
+            return True
+        self.dropped += 1
+        return True
+
+    async def _writer(self):
+        """Drain the queue into the socket, one frame at a time"""
+        synced_seq = -1
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+
+                if self.needs_resync:
+                    self.needs_resync = False
+                    snapshot = self.broadcaster.snapshot_factory(self.websocket)
+                    synced_seq = snapshot.get("seq", -1)
+                    frame = self.codec.encode(snapshot)
+                    await self.websocket.send(frame)
+                    self._bytes_sent.inc(len(frame))
+
+                while self.queue:
+                    seq, frame, _ = self.queue.popleft()
+                    # Frames already covered by a coalesced snapshot are stale
+                    if seq is not None and seq <= synced_seq:
+                        continue
+                    await self.websocket.send(frame)
+                    self._bytes_sent.inc(len(frame))
+                    if self.needs_resync:
+                        break
+        except ConnectionClosed:
+            pass
+
+
+class Broadcaster:
+    """Serialize-once, fan-out-many delivery to every connected client"""
+
+    def __init__(self, snapshot_factory: Callable[[object], Dict], max_queue: int = 64, policy: str = COALESCE):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-client policy: {policy}")
+        self.snapshot_factory = snapshot_factory
+        self.max_queue = max_queue
+        self.policy = policy
+        self.channels: Dict[object, ClientChannel] = {}
+        self._closing: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def add(self, websocket) -> ClientChannel:
+        """Start a writer for a newly connected client"""
+        channel = ClientChannel(websocket, self)
+        channel.task.add_done_callback(lambda _: self.channels.pop(websocket, None))
+        self.channels[websocket] = channel
+        return channel
+
+    def remove(self, websocket):
+        """Stop a client's writer and forget its queue"""
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            channel.task.cancel()
+
+    def disconnect(self, websocket):
+        """Drop a client that fell too far behind"""
+        self.remove(websocket)
+        print(f"🐢 Disconnecting slow client: {id(websocket)}")
+        task = asyncio.create_task(websocket.close(code=SLOW_CLIENT_CLOSE_CODE, reason="Client too slow"))
+        # The loop only keeps weak references to tasks
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def publish(self, message: Dict, skip: Container = ()):
+        """Encode a message once and queue it for every client; never waits on sockets"""
+        self.publish_to([websocket for websocket in self.channels if websocket not in skip], message)
+
+    def publish_to(self, websockets: Iterable, message: Dict):
+        """Encode a message once per codec in use and queue it for the given clients"""
+        frames: Dict[str, Frame] = {}
+        seq = message.get("seq")
+        for websocket in websockets:
+            channel = self.channels.get(websocket)
+            if channel is None:
+                continue
+            frame = frames.get(channel.codec.name)
+            if frame is None:
+                frame = frames[channel.codec.name] = channel.codec.encode(message)
+            channel.push(seq, frame)
+
+    def send(self, websocket, message: Dict):
+        """
+        Queue a message for one client, ordered with its broadcast frames. Messages without a seq are
+        replies and are never dropped for a slow client; state frames sent this way can be, like broadcasts.
+        """
+        channel = self.channels.get(websocket)
+        if channel:
+            seq = message.get("seq")
+            channel.push(seq, channel.codec.encode(message), reply=seq is None)
+
+    async def close(self):
+        """Cancel every writer task"""
+        for websocket in list(self.channels):
+            self.remove(websocket)
+
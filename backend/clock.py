@@ -0,0 +1,68 @@
+"""
+Fixed-Timestep Simulation Clock
+Schedules ticks against a monotonic clock so the period does not drift with tick cost
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator
+
+# What to do when the loop falls more than one period behind
+SKIP = "skip"          # drop the missed ticks and realign to the schedule
+CATCH_UP = "catch-up"  # run missed ticks back-to-back, up to max_catch_up of them
+
+
+class FixedTimestepClock:
+    """Yields tick numbers at a fixed rate; tick n is due at start + n * period"""
+
+    def __init__(self, tick_hz: float = 1.0, policy: str = SKIP, max_catch_up: int = 5):
+        if tick_hz <= 0:
+            raise ValueError("tick_hz must be positive")
+        if policy not in (SKIP, CATCH_UP):
+            raise ValueError(f"Unknown missed-tick policy: {policy}")
+        self.tick_hz = tick_hz
+        self.period = 1.0 / tick_hz
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+
+        self.tick = 0
+        self.skipped = 0
+        self.lateness = 0.0
+        self._start = None
+
+    @property
+    def elapsed(self) -> float:
+        """Simulated seconds covered by the ticks issued so far"""
+        return self.tick * self.period
+
+    def _due(self, tick: int) -> float:
+        return self._start + tick * self.period
+
+    async def ticks(self) -> AsyncIterator[int]:
+        """Wait for each tick's deadline and yield its number"""
+        self._start = time.monotonic()
+        behind = 0
+
+        while True:
+            now = time.monotonic()
+            due = self._due(self.tick)
+            if now < due:
+                await asyncio.sleep(due - now)
+                now = time.monotonic()
+
+            self.lateness = now - due
+            missed = int(self.lateness // self.period)
+            if missed:
+                if self.policy == SKIP or behind >= self.max_catch_up:
+                    # Jump to the latest due tick; missed ones never run
+                    self.tick += missed
+                    self.skipped += missed
+                    self.lateness -= missed * self.period
+                    behind = 0
+                else:
+                    behind += 1
+            else:
+                behind = 0
+
+            yield self.tick
+            self.tick += 1
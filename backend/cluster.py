@@ -0,0 +1,91 @@
+"""
+Sharded Cluster Launcher
+Runs the fleet as shard processes behind one or more WebSocket gateway processes on one machine.
+Shards simulate disjoint slices of the fleet and stream deltas over Unix sockets; gateways
+share WS_PORT through SO_REUSEPORT, so the kernel spreads client connections across them.
+
+Usage:
+    python cluster.py --shards 4 --gateways 2 --fleet-size 100000
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+from typing import List
+
+from dotenv import load_dotenv
+
+from contract_analyzer import demo_contracts
+from contract_store import DEFAULT_CONTRACT_DB, SQLiteContractStore
+from gateway import WS_HOST, WS_PORT, run_gateway
+from shard import run_shard
+
+load_dotenv()
+
+CLUSTER_SOCKET_DIR = os.getenv("CLUSTER_SOCKET_DIR", "")
+
+# Synthetic trucks are numbered from here; each shard gets its own block
+FIRST_TRUCK_NUMBER = 1000
+
+
+def shard_paths(socket_dir: str, shards: int) -> List[str]:
+    return [os.path.join(socket_dir, f"shard-{index}.sock") for index in range(shards)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the simulation as shard and gateway processes")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="Simulation processes")
+    parser.add_argument("--gateways", type=int, default=1, help="WebSocket processes sharing the port")
+    parser.add_argument("--fleet-size", type=int, default=0, help="Synthetic trucks, split across shards")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--host", default=WS_HOST)
+    parser.add_argument("--port", type=int, default=WS_PORT)
+    args = parser.parse_args()
+
+    socket_dir = CLUSTER_SOCKET_DIR or tempfile.mkdtemp(prefix="chainreaction-")
+    os.makedirs(socket_dir, exist_ok=True)
+    paths = shard_paths(socket_dir, args.shards)
+
+    # Every shard and gateway opens the same contract database; seeding it here, once, keeps them
+    # from re-seeding it concurrently at start-up
+    contracts = SQLiteContractStore(os.getenv("CONTRACT_DB_PATH", DEFAULT_CONTRACT_DB))
+    contracts.put_many(demo_contracts())
+    contracts.close()
+
+    # spawn, not fork: each process builds its own event loop, router and SQLite connection
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    per_shard, extra = divmod(args.fleet_size, args.shards)
+    first = FIRST_TRUCK_NUMBER
+    for index, path in enumerate(paths):
+        count = per_shard + (index < extra)
+        seed = None if args.seed is None else args.seed + index
+        processes.append(context.Process(target=run_shard, args=(index, path, count, seed, first),
+                                         name=f"shard-{index}"))
+        first += count
+    for index in range(args.gateways):
+        processes.append(context.Process(target=run_gateway, args=(index, paths, args.host, args.port),
+                                         name=f"gateway-{index}"))
+
+    print("=" * 60)
+    print(f"🚀 ChainReaction cluster: {args.shards} shards, {args.gateways} gateways, "
+          f"{args.fleet_size:,} synthetic trucks")
+    print(f"🔌 Shard sockets in {socket_dir}")
+    print("=" * 60)
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n\n🛑 Cluster stopped by user")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
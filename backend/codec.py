@@ -0,0 +1,131 @@
+"""
+WebSocket Frame Codecs
+Per-connection wire formats negotiated by subprotocol: JSON text frames or MessagePack with packed coordinates
+"""
+
+import json
+import struct
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # binary codec is only offered when msgpack is installed
+    msgpack = None
+
+JSON_SUBPROTOCOL = "chainreaction.json"
+MSGPACK_SUBPROTOCOL = "chainreaction.msgpack"
+
+# Fields holding [lon, lat] pairs (or lists of them); the binary codec sends them as float32 bytes
+COORDINATE_FIELDS = ("position", "destination", "route", "location", "path")
+
+Frame = Union[str, bytes]
+
+_PAIR = struct.Struct("<2f")
+
+
+class JSONCodec:
+    """Text frames, as every existing client expects; orjson when available"""
+
+    name = "json"
+    subprotocol = JSON_SUBPROTOCOL
+
+    def encode(self, message: Dict) -> str:
+        if orjson is not None:
+            return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        return json.dumps(message)
+
+    def decode(self, frame: Frame) -> Dict:
+        if orjson is not None:
+            return orjson.loads(frame)
+        return json.loads(frame)
+
+
+class MsgPackCodec:
+    """
+    Binary frames. Coordinate fields are flattened to little-endian float32 bytes
+    (lon, lat, lon, lat, ...), about a fifth of their JSON size.
+    """
+
+    name = "msgpack"
+    subprotocol = MSGPACK_SUBPROTOCOL
+
+    @staticmethod
+    def _is_coordinates(value) -> bool:
+        """A numeric pair or list of pairs; the same keys also hold strings, e.g. a contract's route name"""
+        if isinstance(value, np.ndarray):
+            return value.size > 0 and value.shape[-1] == 2 and np.issubdtype(value.dtype, np.number)
+        if not isinstance(value, (list, tuple)) or not value:
+            return False
+        first = value[0]
+        if isinstance(first, (list, tuple, np.ndarray)):
+            return len(first) == 2 and all(isinstance(x, (int, float, np.number)) for x in first)
+        return len(value) == 2 and all(isinstance(x, (int, float, np.number)) for x in value)
+
+    @staticmethod
+    def _coordinates(value) -> bytes:
+        if isinstance(value, np.ndarray):
+            return value.astype("<f4", copy=False).tobytes()
+        if len(value) == 2 and not isinstance(value[0], (list, tuple, np.ndarray)):
+            return _PAIR.pack(*value)  # struct beats a NumPy round trip for one pair
+        return np.asarray(value, dtype="<f4").tobytes()
+
+    @staticmethod
+    def _pack(value):
+        if isinstance(value, dict):
+            return {
+                key: (MsgPackCodec._coordinates(item)
+                      if key in COORDINATE_FIELDS and MsgPackCodec._is_coordinates(item)
+                      else MsgPackCodec._pack(item))
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [MsgPackCodec._pack(item) for item in value]
+        return value
+
+    @staticmethod
+    def _unpack(value):
+        if isinstance(value, dict):
+            unpacked = {}
+            for key, item in value.items():
+                if key in COORDINATE_FIELDS and isinstance(item, bytes):
+                    pairs = np.frombuffer(item, dtype="<f4").astype(np.float64).reshape(-1, 2).tolist()
+                    if key in ("route", "path"):
+                        unpacked[key] = pairs
+                    else:
+                        unpacked[key] = pairs[0] if pairs else None
+                else:
+                    unpacked[key] = MsgPackCodec._unpack(item)
+            return unpacked
+        if isinstance(value, list):
+            return [MsgPackCodec._unpack(item) for item in value]
+        return value
+
+    def encode(self, message: Dict) -> bytes:
+        return msgpack.packb(self._pack(message), use_bin_type=True)
+
+    def decode(self, frame: Frame) -> Dict:
+        if isinstance(frame, str):
+            # Clients on the binary protocol may still send plain JSON text
+            return JSON.decode(frame)
+        return self._unpack(msgpack.unpackb(frame, raw=False))
+
+
+JSON = JSONCodec()
+CODECS: Dict[str, object] = {JSON_SUBPROTOCOL: JSON}
+if msgpack is not None:
+    CODECS[MSGPACK_SUBPROTOCOL] = MsgPackCodec()
+
+# Offered to clients in preference order; clients sending no subprotocol get JSON
+SUBPROTOCOLS: List[str] = list(reversed(list(CODECS)))
+
+
+def codec_for(subprotocol: Optional[str]):
+    """Codec for a negotiated subprotocol, JSON when none was negotiated"""
+    return CODECS.get(subprotocol, JSON)
@@ -5,77 +5,147 @@ Analyzes contracts, calculates penalties, and finds arbitrage opportunities
 
 import os
 import json
-from typing import Dict, Optional
+import asyncio
+from typing import Dict, List, Optional, Sequence, Union
 from datetime import datetime, timedelta
-from openai import OpenAI
+import numpy as np
+
+from analysis_cache import AnalysisCache, DEFAULT_CACHE_PATH, analysis_key
+from contract_store import ContractRepository, DEFAULT_CONTRACT_DB, SQLiteContractStore
+from contract_parser import PARSER_CONFIDENCE_THRESHOLD, contract_penalty, parse_contract_terms, terms_from_llm
+from spot_market import SpotMarket
+
+# Spot providers farther than this from a stalled truck are not considered
+SPOT_SEARCH_RADIUS_KM = 250.0
+
+# Ranked spot quotes offered per stalled truck: the pick plus its runners-up
+SPOT_ALTERNATIVES = 3
+
+# At most this many chat completions in flight at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+
+# Scenario sent to the LLM when the clause parser is not confident enough
+TERMS_EXTRACTION_SCENARIO = "Extract the penalty terms: per-hour rate, tiers, maximum penalty, deadline and force majeure exemptions."
+
+# What the model is asked to answer: a delay analysis, or the terms in the clause parser's shape
+ANALYSIS_REQUEST = """Please analyze:
+1. What is the penalty for this delay?
+2. What alternatives should we consider?
+3. What's the recommended action?
+
+Respond in JSON format with: penalty, alternatives, recommendation"""
+TERMS_REQUEST = """Respond in JSON format with: penaltyPerHour (number), maxPenalty (number, or null if uncapped),
+deadlineHours (number or null), tiers (list of {fromHour, toHour, ratePerHour}, toHour null for the
+open-ended last tier) and forceMajeure (list of exempt events)"""
+
+
+def demo_contracts(now: Optional[datetime] = None) -> List[Dict]:
+    """The demo trucks' contracts, due from now"""
+    now = datetime.now() if now is None else now
+    return [
+        {
+            "id": "CNT-2024-001",
+            "client": "TechCorp India Pvt Ltd",
+            "route": "Pune to Mumbai",
+            "cargoValue": 120000,
+            "deliveryDeadline": (now + timedelta(hours=3)).isoformat(),
+            "penaltyPerHour": 500,
+            "maxPenalty": 2500,
+            "terms": "Delivery must be completed within 3 hours. Penalty of $500/hour for delays up to 5 hours. Maximum penalty capped at $2,500."
+        },
+        {
+            "id": "CNT-2024-002",
+            "client": "PharmaCare Ltd",
+            "route": "Bangalore to Hyderabad",
+            "cargoValue": 85000,
+            "deliveryDeadline": (now + timedelta(hours=4)).isoformat(),
+            "penaltyPerHour": 400,
+            "maxPenalty": 2000,
+            "terms": "Temperature-controlled delivery within 4 hours. $400/hour penalty for delays."
+        },
+        {
+            "id": "CNT-2024-003",
+            "client": "AutoParts Express",
+            "route": "Kolkata to Bhubaneswar",
+            "cargoValue": 95000,
+            "deliveryDeadline": (now + timedelta(hours=5)).isoformat(),
+            "penaltyPerHour": 350,
+            "maxPenalty": 1750,
+            "terms": "Standard delivery in 5 hours. $350/hour penalty applies."
+        }
+    ]
 
 
 class ContractAnalyzer:
     """Analyzes supply chain contracts and calculates financial impacts"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 cache: Optional[AnalysisCache] = None, contracts: Optional[ContractRepository] = None,
+                 seed_contracts: bool = True):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        # OPENAI_BASE_URL points the client at a local stub server for testing
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self._client = None
         if not self.api_key:
             print("⚠️  WARNING: OpenAI API key not found. Using mock responses.")
-            self.client = None
-        else:
-            self.client = OpenAI(api_key=self.api_key)
-
-        # In-memory contract database
-        self.contracts = {
-            "CNT-2024-001": {
-                "id": "CNT-2024-001",
-                "client": "TechCorp India Pvt Ltd",
-                "route": "Pune to Mumbai",
-                "cargoValue": 120000,
-                "deliveryDeadline": (datetime.now() + timedelta(hours=3)).isoformat(),
-                "penaltyPerHour": 500,
-                "maxPenalty": 2500,
-                "terms": "Delivery must be completed within 3 hours. Penalty of $500/hour for delays up to 5 hours. Maximum penalty capped at $2,500."
-            },
-            "CNT-2024-002": {
-                "id": "CNT-2024-002",
-                "client": "PharmaCare Ltd",
-                "route": "Bangalore to Hyderabad",
-                "cargoValue": 85000,
-                "deliveryDeadline": (datetime.now() + timedelta(hours=4)).isoformat(),
-                "penaltyPerHour": 400,
-                "maxPenalty": 2000,
-                "terms": "Temperature-controlled delivery within 4 hours. $400/hour penalty for delays."
-            },
-            "CNT-2024-003": {
-                "id": "CNT-2024-003",
-                "client": "AutoParts Express",
-                "route": "Kolkata to Bhubaneswar",
-                "cargoValue": 95000,
-                "deliveryDeadline": (datetime.now() + timedelta(hours=5)).isoformat(),
-                "penaltyPerHour": 350,
-                "maxPenalty": 1750,
-                "terms": "Standard delivery in 5 hours. $350/hour penalty applies."
-            }
-        }
 
-        # Spot market alternatives
-        self.spot_market = [
+        if cache is None:
+            cache = AnalysisCache(
+                path=os.getenv("ANALYSIS_CACHE_PATH", DEFAULT_CACHE_PATH) or None,
+                ttl_seconds=float(os.getenv("ANALYSIS_CACHE_TTL", 24 * 3600))
+            )
+        self.analysis_cache = cache
+        self._llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # Contract repository; a single process (re)seeds the demo contracts on every start, a cluster
+        # seeds them once in the parent, before shards and gateways open the same database
+        if contracts is None:
+            contracts = SQLiteContractStore(os.getenv("CONTRACT_DB_PATH", DEFAULT_CONTRACT_DB))
+        self.contracts = contracts
+        if seed_contracts:
+            self.contracts.put_many(demo_contracts())
+
+        # Spot market alternatives: these providers are always quoted, a feed can add thousands more
+        self.spot_market = SpotMarket()
+        self.add_spot_providers([
             {
                 "provider": "QuickFreight India",
                 "baseCost": 800,
                 "eta": "45 minutes",
-                "availability": "high"
+                "availability": "high",
+                "location": [73.8567, 18.5204]  # Pune
             },
             {
                 "provider": "RapidLogistics",
                 "baseCost": 950,
                 "eta": "30 minutes",
-                "availability": "medium"
+                "availability": "medium",
+                "location": [72.8777, 19.0760]  # Mumbai
             },
             {
                 "provider": "ExpressHaul Services",
                 "baseCost": 1100,
                 "eta": "20 minutes",
-                "availability": "low"
+                "availability": "low",
+                "location": [77.5946, 12.9716]  # Bangalore
             }
-        ]
+        ])
+
+    @property
+    def client(self):
+        """
+        OpenAI client, None without an API key. The SDK is imported on first use: it costs more
+        start-up time than the rest of the backend together, and most processes never call it.
+        """
+        if self._client is None and self.api_key:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    def add_spot_providers(self, providers: List[Dict]):
+        """Register standing spot market providers; their quotes never expire"""
+        self.spot_market.add_quotes(providers, pinned=True)
 
     def get_contract(self, contract_id: str) -> Optional[Dict]:
         """Retrieve contract details"""
@@ -87,42 +157,51 @@ class ContractAnalyzer:
         if not contract:
             return {"error": "Contract not found"}
 
-        penalty_per_hour = contract["penaltyPerHour"]
-        max_penalty = contract["maxPenalty"]
-
-        calculated_penalty = min(penalty_per_hour * delay_hours, max_penalty)
-
         return {
             "contractId": contract_id,
             "delayHours": delay_hours,
-            "penaltyPerHour": penalty_per_hour,
-            "calculatedPenalty": calculated_penalty,
-            "maxPenalty": max_penalty,
+            "penaltyPerHour": contract["penaltyPerHour"],
+            "calculatedPenalty": contract_penalty(contract, delay_hours),
+            "maxPenalty": contract.get("maxPenalty"),
             "terms": contract["terms"]
         }
 
-    def find_spot_market_solution(self, location: str, destination: str) -> Dict:
-        """Find the best spot market alternative"""
-        # For demo, return the cheapest option
-        best_option = min(self.spot_market, key=lambda x: x["baseCost"])
+    def find_spot_market_solution(self, location: Union[str, List[float]], destination: str) -> Dict:
+        """Find the best spot market alternative, weighing cost, ETA and availability"""
+        if isinstance(location, str):
+            options = self.spot_market.top(k=SPOT_ALTERNATIVES)
+        else:
+            # Providers with a depot near the truck; anywhere if none is close
+            options = self.spot_market.top(location, SPOT_ALTERNATIVES, SPOT_SEARCH_RADIUS_KM)
+            if not options:
+                options = self.spot_market.top(k=SPOT_ALTERNATIVES)
+        if not options:
+            return {"error": "No spot market quotes available"}
+
+        def summary(quote: Dict) -> Dict:
+            return {
+                "quoteId": quote["id"],
+                "provider": quote["provider"],
+                "cost": quote["cost"],
+                "eta": quote["eta"],
+                "availability": quote["availability"]
+            }
 
-        return {
-            "provider": best_option["provider"],
-            "cost": best_option["baseCost"],
-            "eta": best_option["eta"],
-            "availability": best_option["availability"]
-        }
+        return {**summary(options[0]), "alternatives": [summary(quote) for quote in options[1:]]}
 
-    def analyze_arbitrage_opportunity(self, truck_id: str, contract_id: str, delay_hours: float = 2.5) -> Dict:
+    def analyze_arbitrage_opportunity(self, truck_id: str, contract_id: str, delay_hours: float = 2.5,
+                                      location: Optional[List[float]] = None) -> Dict:
         """
         Analyze if there's an arbitrage opportunity
         Returns comparison of paying penalty vs booking alternative
         """
         penalty_info = self.calculate_penalty(contract_id, delay_hours)
-        spot_solution = self.find_spot_market_solution("Pune", "Mumbai")
+        spot_solution = self.find_spot_market_solution(location or "Pune", "Mumbai")
 
         if penalty_info.get("error"):
             return penalty_info
+        if spot_solution.get("error"):
+            return spot_solution
 
         penalty_cost = penalty_info["calculatedPenalty"]
         solution_cost = spot_solution["cost"]
@@ -150,12 +229,117 @@ class ContractAnalyzer:
                 "reason": "No cost-effective alternative available"
             }
 
-    async def ai_contract_analysis(self, contract_text: str, delay_scenario: str) -> Dict:
+    def _best_spot_options(self, locations: Optional[np.ndarray], count: int) -> List[Optional[Dict]]:
+        """Best-scoring spot quote for each location"""
+        if locations is None:
+            return [self.spot_market.best()] * count
+        return [self.spot_market.best(location, SPOT_SEARCH_RADIUS_KM) for location in locations.tolist()]
+
+    def analyze_fleet(self, truck_ids: Sequence[str], contract_ids: Sequence[str],
+                      delay_hours: Union[float, Sequence[float]],
+                      locations: Optional[Sequence[Sequence[float]]] = None) -> List[Dict]:
+        """
+        Analyze many delayed trucks at once with array math
+        Returns the EXECUTE recommendations, highest net savings first
+        """
+        count = len(truck_ids)
+        if not count:
+            return []
+
+        terms = self.contracts.get_many(set(contract_ids))
+        # The flat-rate rule of contract_penalty, as array math; unknown contracts are NaN
+        penalty_per_hour = np.array(
+            [(terms[c].get("penaltyPerHour") or 0) if terms[c] else np.nan for c in contract_ids], dtype=np.float64
+        )
+        max_penalty = np.array(
+            [(terms[c]["maxPenalty"] if terms[c].get("maxPenalty") is not None else np.inf) if terms[c] else np.nan
+             for c in contract_ids],
+            dtype=np.float64
+        )
+        delay = np.broadcast_to(np.asarray(delay_hours, dtype=np.float64), (count,))
+
+        projected_penalty = np.minimum(penalty_per_hour * delay, max_penalty)
+        # Tiered contracts (ingested from text or documents) are not a single rate
+        for row, contract_id in enumerate(contract_ids):
+            contract = terms[contract_id]
+            if contract and contract.get("tiers"):
+                projected_penalty[row] = contract_penalty(contract, float(delay[row]))
+        if locations is not None:
+            locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        options = self._best_spot_options(locations, count)
+        solution_cost = np.array([spot["cost"] if spot else np.nan for spot in options], dtype=np.float64)
+        net_savings = projected_penalty - solution_cost
+
+        # Unknown contracts produce NaN, which never compares > 0
+        execute = np.flatnonzero(net_savings > 0)
+        execute = execute[np.argsort(-net_savings[execute], kind="stable")]
+
+        recommendations = []
+        for row in execute.tolist():
+            spot = options[row]
+            recommendations.append({
+                "truckId": truck_ids[row],
+                "contractId": contract_ids[row],
+                "projectedPenalty": round(float(projected_penalty[row]), 2),
+                "projectedDelayHours": round(float(delay[row]), 2),
+                "solutionType": f"Relief Truck via {spot['provider']}",
+                "solutionCost": spot["cost"],
+                "quoteId": spot["id"],
+                "netSavings": round(float(net_savings[row]), 2),
+                "details": f"Deploy backup truck - ETA {spot['eta']}",
+                "recommendation": "EXECUTE",
+                "confidence": 0.95
+            })
+        return recommendations
+
+    async def extract_terms(self, contract_text: str) -> Dict:
+        """
+        Structured penalty terms for free-text contracts
+        Uses the local clause parser and only asks the LLM when it is unsure; when neither
+        gives usable terms, the parser's best guess is returned with needsReview set
+        """
+        terms = parse_contract_terms(contract_text)
+        if terms["confidence"] >= PARSER_CONFIDENCE_THRESHOLD:
+            return terms
+
+        extracted = None
+        if self.api_key:
+            answer = await self.ai_contract_analysis(contract_text, TERMS_EXTRACTION_SCENARIO, TERMS_REQUEST)
+            if "error" not in answer:
+                extracted = terms_from_llm(answer)
+        if extracted is None:
+            return {**terms, "needsReview": True}
+
+        # The model read the whole text; the parser fills in only what it left out
+        merged = {**terms, **{field: value for field, value in extracted.items() if value not in (None, [])}}
+        return {**merged, "source": "llm"}
+
+    async def ingest_contract_text(self, contract_id: str, contract_text: str, **fields) -> Dict:
+        """Register a contract from its text, deriving penalty terms from the clauses"""
+        terms = await self.extract_terms(contract_text)
+        deadline_hours = terms["deadlineHours"] or 0
+
+        contract = {
+            "id": contract_id,
+            **fields,
+            "deliveryDeadline": (datetime.now() + timedelta(hours=deadline_hours)).isoformat(),
+            "penaltyPerHour": terms["penaltyPerHour"] or 0,
+            "maxPenalty": terms["maxPenalty"],
+            "tiers": terms["tiers"],
+            "forceMajeure": terms["forceMajeure"],
+            "needsReview": terms.get("needsReview", False),
+            "terms": contract_text.strip()
+        }
+        self.contracts[contract_id] = contract
+        return contract
+
+    async def ai_contract_analysis(self, contract_text: str, delay_scenario: str,
+                                   request: str = ANALYSIS_REQUEST) -> Dict:
         """
         Use OpenAI to analyze contract and suggest solutions
         Falls back to rule-based if API key not available
         """
-        if not self.client:
+        if not self.api_key:
             # Mock response when no API key
             return {
                 "analysis": "Contract parsed successfully (mock mode)",
@@ -164,8 +348,32 @@ class ContractAnalyzer:
                 "confidence": 0.9
             }
 
+        key = analysis_key(contract_text, delay_scenario, request)
+        cached = self.analysis_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Identical prompts already in flight share one completion
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._analyze_uncached(key, contract_text, delay_scenario, request))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _analyze_uncached(self, key: str, contract_text: str, delay_scenario: str, request: str) -> Dict:
+        """Run one completion under the concurrency limit and cache successes"""
+        async with self._llm_slots:
+            result = await self._complete(contract_text, delay_scenario, request)
+        if "error" not in result:
+            self.analysis_cache.put(key, result)
+            await asyncio.to_thread(self.analysis_cache.flush)
+        return result
+
+    async def _complete(self, contract_text: str, delay_scenario: str, request: str) -> Dict:
+        """Ask the model for an analysis without blocking the event loop"""
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -179,12 +387,7 @@ class ContractAnalyzer:
                         
                         Scenario: {delay_scenario}
                         
-                        Please analyze:
-                        1. What is the penalty for this delay?
-                        2. What alternatives should we consider?
-                        3. What's the recommended action?
-                        
-                        Respond in JSON format with: penalty, alternatives, recommendation
+                        {request}
                         """
                     }
                 ],
@@ -208,6 +411,7 @@ class ContractAnalyzer:
         contract = self.get_contract(contract_id)
         if not contract:
             return "Contract not found"
+        cap = f"max ${contract['maxPenalty']}" if contract.get("maxPenalty") is not None else "no cap"
 
         return f"""
 Contract: {contract['id']}
@@ -215,7 +419,7 @@ Client: {contract['client']}
 Route: {contract['route']}
 Cargo Value: ${contract['cargoValue']:,}
 Deadline: {contract['deliveryDeadline']}
-Penalty: ${contract['penaltyPerHour']}/hour (max ${contract['maxPenalty']})
+Penalty: ${contract['penaltyPerHour']}/hour ({cap})
 Terms: {contract['terms']}
         """.strip()
 
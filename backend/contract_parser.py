@@ -0,0 +1,219 @@
+"""
+Contract Terms Parser
+Deterministic extraction of penalty clauses from contract text, no network calls
+"""
+
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Below this confidence the caller should fall back to the LLM
+PARSER_CONFIDENCE_THRESHOLD = 0.7
+
+# Parsed documents remembered by content hash
+PARSE_CACHE_SIZE = 4096
+
+_AMOUNT = r"\$\s?(?P<{name}>\d[\d,]*(?:\.\d+)?)"
+_HOURS = r"(?P<{name}>\d+(?:\.\d+)?)\s*(?:hours?|hrs?)\b"
+
+RATE_PATTERN = re.compile(
+    _AMOUNT.format(name="rate") + r"\s*(?:/|per)\s*(?:hour|hr)\b(?P<tail>[^.\n$]*)",
+    re.IGNORECASE
+)
+TIER_BOUND_PATTERN = re.compile(r"(?:first|up\s+to)\s+" + _HOURS.format(name="hours"), re.IGNORECASE)
+TIER_OPEN_PATTERN = re.compile(r"\b(?:thereafter|after\s+that|beyond|additional)\b", re.IGNORECASE)
+CAP_PATTERN = re.compile(
+    r"(?:maximum|max\.?|capped|cap|not\s+(?:to\s+)?exceed)[^$\n]{0,40}" + _AMOUNT.format(name="cap"),
+    re.IGNORECASE
+)
+DEADLINE_PATTERN = re.compile(
+    r"(?:within|expected\s+duration:?|on-time\s+delivery\s+threshold:?|\bin)\s+" + _HOURS.format(name="hours"),
+    re.IGNORECASE
+)
+FORCE_MAJEURE_PATTERN = re.compile(
+    r"force\s+majeure:?\s*(?P<clause>.+?)(?:\n\s*\n|\Z)",
+    re.IGNORECASE | re.DOTALL
+)
+EXEMPTION_SPLIT = re.compile(r",\s*(?:and\s+|or\s+)?|\s+and\s+|\s+or\s+|\n\s*[-*]\s*")
+
+_parse_cache: "OrderedDict[str, Dict]" = OrderedDict()
+
+
+def _number(text: str) -> float:
+    value = float(text.replace(",", ""))
+    return int(value) if value.is_integer() else value
+
+
+def _document_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _parse_tiers(text: str) -> List[Dict]:
+    """Per-hour rates in clause order; a bounded tier starts where the previous ended"""
+    tiers = []
+    start = 0
+    for match in RATE_PATTERN.finditer(text):
+        tail = match.group("tail")
+        bound = TIER_BOUND_PATTERN.search(tail)
+        tier = {"fromHour": start, "toHour": None, "ratePerHour": _number(match.group("rate"))}
+        if bound and not TIER_OPEN_PATTERN.search(tail):
+            tier["toHour"] = start + _number(bound.group("hours"))
+            start = tier["toHour"]
+        tiers.append(tier)
+        if tier["toHour"] is None:
+            break
+    return tiers
+
+
+def _parse_force_majeure(text: str) -> List[str]:
+    match = FORCE_MAJEURE_PATTERN.search(text)
+    if not match:
+        return []
+    clause = match.group("clause")
+    clause = re.split(r"\s+(?:are\s+|is\s+)?exempt(?:ed)?\b", clause, maxsplit=1, flags=re.IGNORECASE)[0]
+    items = [item.strip(" .:-*\n") for item in EXEMPTION_SPLIT.split(clause)]
+    return [item for item in items if item]
+
+
+def parse_contract_terms(text: str) -> Dict:
+    """Extract per-hour rate, tiers, cap, force-majeure exemptions and deadline from contract text"""
+    key = _document_hash(text)
+    cached = _parse_cache.get(key)
+    if cached is not None:
+        _parse_cache.move_to_end(key)
+        return cached
+
+    tiers = _parse_tiers(text)
+    cap = CAP_PATTERN.search(text)
+    deadline = DEADLINE_PATTERN.search(text)
+
+    max_penalty = _number(cap.group("cap")) if cap else None
+    confidence = 0.0
+    if tiers:
+        confidence += 0.5
+    if max_penalty is not None:
+        confidence += 0.3
+    elif tiers and tiers[-1]["toHour"] is not None:
+        # No explicit cap, but the penalty stops accruing after the last bounded tier
+        max_penalty = sum(t["ratePerHour"] * (t["toHour"] - t["fromHour"]) for t in tiers)
+        confidence += 0.15
+    if deadline:
+        confidence += 0.2
+
+    terms = {
+        "penaltyPerHour": tiers[0]["ratePerHour"] if tiers else None,
+        "tiers": tiers,
+        "maxPenalty": max_penalty,
+        "forceMajeure": _parse_force_majeure(text),
+        "deadlineHours": _number(deadline.group("hours")) if deadline else None,
+        "confidence": round(confidence, 2),
+        "source": "parser",
+        "documentHash": key
+    }
+
+    _parse_cache[key] = terms
+    if len(_parse_cache) > PARSE_CACHE_SIZE:
+        _parse_cache.popitem(last=False)
+    return terms
+
+
+def parse_contract_document(document: Dict) -> Dict:
+    """Extract the same terms from a structured contract like data/sample_contract.json"""
+    sla = document.get("slaTerms", {})
+    structure = sla.get("penaltyStructure", {})
+
+    hourly = sorted(
+        (int(name[4:]), rate) for name, rate in structure.items()
+        if name.startswith("hour") and name[4:].isdigit()
+    )
+    tiers: List[Dict] = []
+    for hour, rate in hourly:
+        if tiers and tiers[-1]["ratePerHour"] == rate and tiers[-1]["toHour"] == hour - 1:
+            tiers[-1]["toHour"] = hour
+        else:
+            tiers.append({"fromHour": hour - 1, "toHour": hour, "ratePerHour": rate})
+
+    deadline = DEADLINE_PATTERN.search(f"within {sla.get('onTimeDeliveryThreshold', '')}")
+    max_penalty = structure.get("maxPenalty")
+
+    confidence = (0.5 if tiers else 0.0) + (0.3 if max_penalty is not None else 0.0) + (0.2 if deadline else 0.0)
+    return {
+        "penaltyPerHour": tiers[0]["ratePerHour"] if tiers else None,
+        "tiers": tiers,
+        "maxPenalty": max_penalty,
+        "forceMajeure": list(document.get("forcemajeure") or document.get("forceMajeure") or []),
+        "deadlineHours": _number(deadline.group("hours")) if deadline else None,
+        "confidence": round(confidence, 2),
+        "source": "parser",
+        "documentHash": _document_hash(json.dumps(document, sort_keys=True))
+    }
+
+
+def terms_from_llm(answer: Dict) -> Optional[Dict]:
+    """
+    Penalty terms from the LLM's JSON answer, in the parser's shape; None without a usable rate.
+    Numbers may come back as strings like "$1,500"; anything unreadable is treated as missing.
+    """
+    def number(value) -> Optional[float]:
+        if value is None or isinstance(value, bool):
+            return None
+        try:
+            value = _number(str(value).strip().lstrip("$"))
+        except ValueError:
+            return None
+        return value if 0 <= value < float("inf") else None
+
+    tiers: List[Dict] = []
+    for tier in answer.get("tiers") or []:
+        rate = number(tier.get("ratePerHour")) if isinstance(tier, dict) else None
+        if rate is None:
+            continue
+        start = number(tier.get("fromHour"))
+        if start is None:
+            start = tiers[-1]["toHour"] or 0 if tiers else 0
+        tiers.append({"fromHour": start, "toHour": number(tier.get("toHour")), "ratePerHour": rate})
+
+    rate = number(answer.get("penaltyPerHour"))
+    if rate is None and tiers:
+        rate = tiers[0]["ratePerHour"]
+    if rate is None:
+        return None
+    exemptions = answer.get("forceMajeure")
+    return {
+        "penaltyPerHour": rate,
+        "tiers": tiers or [{"fromHour": 0, "toHour": None, "ratePerHour": rate}],
+        "maxPenalty": number(answer.get("maxPenalty")),
+        "forceMajeure": [str(item) for item in exemptions] if isinstance(exemptions, list) else [],
+        "deadlineHours": number(answer.get("deadlineHours"))
+    }
+
+
+def tiered_penalty(terms: Dict, delay_hours: float, exempt: bool = False) -> float:
+    """Penalty owed for a delay under parsed terms, honoring tiers and the cap"""
+    if exempt or delay_hours <= 0 or not terms.get("tiers"):
+        return 0.0
+
+    penalty = 0.0
+    for tier in terms["tiers"]:
+        end = tier["toHour"] if tier["toHour"] is not None else float("inf")
+        hours = min(delay_hours, end) - tier["fromHour"]
+        if hours <= 0:
+            break
+        penalty += hours * tier["ratePerHour"]
+
+    max_penalty: Optional[float] = terms.get("maxPenalty")
+    return min(penalty, max_penalty) if max_penalty is not None else penalty
+
+
+def contract_penalty(contract: Dict, delay_hours: float) -> float:
+    """
+    Penalty owed for a delay under a stored contract: its tiers when it has any, otherwise the
+    per-hour rate (none means 0) up to the cap (none means uncapped)
+    """
+    if contract.get("tiers"):
+        return tiered_penalty(contract, delay_hours)
+    max_penalty = contract.get("maxPenalty")
+    cap = max_penalty if max_penalty is not None else float("inf")
+    return min((contract.get("penaltyPerHour") or 0) * delay_hours, cap)
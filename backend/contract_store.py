@@ -0,0 +1,275 @@
+"""
+Contract Repository
+Pluggable contract storage: in-memory for tests and demos, SQLite for large books
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from contract_parser import parse_contract_document
+
+DEFAULT_CONTRACT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "contracts.db")
+
+# CSV columns converted to numbers on import
+NUMERIC_FIELDS = ("cargoValue", "penaltyPerHour", "maxPenalty")
+
+
+class ContractRepository:
+    """Interface shared by every contract store"""
+
+    def get(self, contract_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get_many(self, contract_ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        return {contract_id: self.get(contract_id) for contract_id in contract_ids}
+
+    def put(self, contract: Dict):
+        self.put_many([contract])
+
+    def put_many(self, contracts: Iterable[Dict]):
+        raise NotImplementedError
+
+    def by_client(self, client: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def by_route(self, route: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def due_between(self, start: datetime, end: datetime, limit: int = 1000) -> List[Dict]:
+        raise NotImplementedError
+
+    def due_within(self, hours: float, limit: int = 1000) -> List[Dict]:
+        """Contracts whose delivery deadline falls within the next N hours"""
+        now = datetime.now()
+        return self.due_between(now, now + timedelta(hours=hours), limit)
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, contract_id: str) -> bool:
+        return self.get(contract_id) is not None
+
+    def __getitem__(self, contract_id: str) -> Dict:
+        contract = self.get(contract_id)
+        if contract is None:
+            raise KeyError(contract_id)
+        return contract
+
+    def __setitem__(self, contract_id: str, contract: Dict):
+        self.put({**contract, "id": contract_id})
+
+    def bulk_import(self, path: str, batch_size: int = 5000) -> int:
+        """Load contracts from a JSON list or a CSV file, in batches"""
+        count = 0
+        batch: List[Dict] = []
+        for contract in _read_contracts(path):
+            batch.append(contract)
+            if len(batch) >= batch_size:
+                self.put_many(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.put_many(batch)
+            count += len(batch)
+        return count
+
+
+class InMemoryContractStore(ContractRepository):
+    """Plain dict storage; every query is a scan"""
+
+    def __init__(self):
+        self.contracts: Dict[str, Dict] = {}
+
+    def get(self, contract_id: str) -> Optional[Dict]:
+        return self.contracts.get(contract_id)
+
+    def put_many(self, contracts: Iterable[Dict]):
+        for contract in contracts:
+            self.contracts[contract["id"]] = contract
+
+    def by_client(self, client: str) -> List[Dict]:
+        return [c for c in self.contracts.values() if c.get("client") == client]
+
+    def by_route(self, route: str) -> List[Dict]:
+        return [c for c in self.contracts.values() if c.get("route") == route]
+
+    def due_between(self, start: datetime, end: datetime, limit: int = 1000) -> List[Dict]:
+        low, high = start.isoformat(), end.isoformat()
+        due = sorted(
+            (c for c in self.contracts.values() if low <= c.get("deliveryDeadline", "") <= high),
+            key=lambda c: c["deliveryDeadline"]
+        )
+        return due[:limit]
+
+    def __len__(self) -> int:
+        return len(self.contracts)
+
+
+class SQLiteContractStore(ContractRepository):
+    """SQLite table with secondary indexes and a bounded LRU read cache"""
+
+    def __init__(self, path: str = DEFAULT_CONTRACT_DB, cache_size: int = 4096):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self.cache_size = cache_size
+
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS contracts (
+                    id TEXT PRIMARY KEY,
+                    client TEXT,
+                    route TEXT,
+                    deadline TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS contracts_client ON contracts (client)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS contracts_route ON contracts (route)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS contracts_deadline ON contracts (deadline)")
+
+    def _remember(self, contract: Dict):
+        # Caller holds the lock
+        self._cache[contract["id"]] = contract
+        self._cache.move_to_end(contract["id"])
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get(self, contract_id: str) -> Optional[Dict]:
+        # Lookups also run on request threads. The read and the cache insert share one critical
+        # section with put_many's write, so a row replaced in between is never cached.
+        with self._lock:
+            contract = self._cache.get(contract_id)
+            if contract is not None:
+                self._cache.move_to_end(contract_id)
+                return contract
+
+            row = self._db.execute("SELECT data FROM contracts WHERE id = ?", (contract_id,)).fetchone()
+            if row is None:
+                return None
+            contract = json.loads(row[0])
+            self._remember(contract)
+            return contract
+
+    def get_many(self, contract_ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        result: Dict[str, Optional[Dict]] = {}
+        missing = []
+        with self._lock:
+            for contract_id in contract_ids:
+                contract = self._cache.get(contract_id)
+                result[contract_id] = contract
+                if contract is None:
+                    missing.append(contract_id)
+                else:
+                    self._cache.move_to_end(contract_id)
+
+            # SQLite limits bound parameters per statement
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(f"SELECT data FROM contracts WHERE id IN ({placeholders})", chunk).fetchall()
+                for (data,) in rows:
+                    contract = json.loads(data)
+                    result[contract["id"]] = contract
+                    self._remember(contract)
+        return result
+
+    def put_many(self, contracts: Iterable[Dict]):
+        rows = []
+        for contract in contracts:
+            rows.append((
+                contract["id"], contract.get("client"), contract.get("route"),
+                contract.get("deliveryDeadline"), json.dumps(contract)
+            ))
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO contracts (id, client, route, deadline, data) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            # Dropped in the same critical section as the write, so no lookup caches the old version
+            for row in rows:
+                self._cache.pop(row[0], None)
+
+    def by_client(self, client: str) -> List[Dict]:
+        return self._query("SELECT data FROM contracts WHERE client = ?", (client,))
+
+    def by_route(self, route: str) -> List[Dict]:
+        return self._query("SELECT data FROM contracts WHERE route = ?", (route,))
+
+    def due_between(self, start: datetime, end: datetime, limit: int = 1000) -> List[Dict]:
+        return self._query(
+            "SELECT data FROM contracts WHERE deadline BETWEEN ? AND ? ORDER BY deadline LIMIT ?",
+            (start.isoformat(), end.isoformat(), limit)
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM contracts").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+def _read_contracts(path: str) -> Iterable[Dict]:
+    """Yield contract dicts from a .json list/object or a .csv file"""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                for field in NUMERIC_FIELDS:
+                    # A blank cell is a missing value (for maxPenalty: no cap), not an empty string
+                    value = (row.get(field) or "").strip()
+                    row[field] = float(value) if value else None
+                yield row
+        return
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("contracts", [data])
+    for contract in data:
+        yield _normalize_document(contract) if "slaTerms" in contract else contract
+
+
+def _normalize_document(document: Dict) -> Dict:
+    """Flatten a structured contract like data/sample_contract.json into the store's shape"""
+    terms = parse_contract_document(document)
+    delivery = document.get("deliveryTerms", {})
+    client = document.get("client")
+    deadline_hours = terms["deadlineHours"] or 0
+
+    return {
+        "id": document.get("id") or document["contractId"],
+        "client": client.get("name") if isinstance(client, dict) else client,
+        "route": f"{delivery.get('origin', '').split(',')[0]} to {delivery.get('destination', '').split(',')[0]}",
+        "cargoValue": delivery.get("cargoValue"),
+        "deliveryDeadline": (datetime.now() + timedelta(hours=deadline_hours)).isoformat(),
+        "penaltyPerHour": terms["penaltyPerHour"],
+        "maxPenalty": terms["maxPenalty"],
+        "tiers": terms["tiers"],
+        "forceMajeure": terms["forceMajeure"],
+        "terms": json.dumps(document.get("slaTerms", {}))
+    }
+
+
+if __name__ == "__main__":
+    # Bulk import: python contract_store.py contracts.csv [more.json ...]
+    store = SQLiteContractStore(os.getenv("CONTRACT_DB_PATH", DEFAULT_CONTRACT_DB))
+    for source in sys.argv[1:]:
+        imported = store.bulk_import(source)
+        print(f"📥 Imported {imported:,} contracts from {source}")
+    print(f"📚 {len(store):,} contracts in store")
@@ -0,0 +1,123 @@
+"""
+Delta Encoding for State Broadcasts
+Turns per-tick fleet state into sequence-numbered deltas against the last broadcast
+"""
+
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from fleet_store import (CHANGED_ADDED, CHANGED_POSITION, CHANGED_ROUTE, CHANGED_ROUTE_INDEX, CHANGED_STATUS,
+                         CHANGED_VELOCITY, STATUSES, FleetChanges)
+from simulation import TruckSimulator
+
+# Number of recent events carried in a full snapshot, matching get_state()
+SNAPSHOT_EVENTS = 10
+
+# ETA moves smaller than this (one minute) are not worth a field update
+ETA_RESOLUTION_HOURS = 1 / 60
+
+
+class DeltaEncoder:
+    """Tracks what clients have already seen and emits only what changed"""
+
+    def __init__(self, simulator: TruckSimulator):
+        self.simulator = simulator
+        self.seq = 0
+        self._events_sent = simulator.events.last_seq
+        # Change-feed batches since the last delta; only those trucks are diffed
+        self._changes: List[FleetChanges] = []
+        simulator.on_change(self._on_change)
+        self._capture()
+
+    def _on_change(self, changes: FleetChanges):
+        self._changes.append(changes)
+
+    def _capture(self):
+        """Remember the fleet size and the ETAs clients hold as of the last emitted sequence number"""
+        fleet = self.simulator.fleet
+        self._size = fleet.size
+        self._eta_hours = fleet.eta_hours[:fleet.size].copy()
+
+    def snapshot(self) -> Dict:
+        """Full state at the current sequence number, for connects and resyncs"""
+        fleet = self.simulator.fleet
+        return {
+            "type": "initial_state",
+            "seq": self.seq,
+            "data": {
+                "trucks": fleet.to_dicts(),
+                "events": self.simulator.events.latest(SNAPSHOT_EVENTS, up_to=self._events_sent),
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+
+    def delta(self) -> Dict:
+        """Advance the sequence number and return the changes since the previous one"""
+        fleet = self.simulator.fleet
+        n = self._size
+
+        self.simulator.publish_changes()
+        changes = FleetChanges.merge(self._changes)
+        self._changes = []
+        # Trucks added since the last delta are sent whole below; earlier additions were in the baseline
+        known = (changes.rows < n) & ((changes.fields & ~np.uint8(CHANGED_ADDED)) != 0)
+        changed_rows, fields = changes.rows[known], changes.fields[known]
+
+        # ETA drifts with the clock for every stopped or live truck, so it is still compared fleet-wide
+        with np.errstate(invalid="ignore"):
+            # inf - inf is NaN: a truck that stays unprojectable has not changed
+            eta_changed = np.abs(fleet.eta_hours[:n] - self._eta_hours) > ETA_RESOLUTION_HOURS
+        row_fields = np.zeros(n, dtype=np.uint8)
+        row_fields[changed_rows] = fields
+        rows = np.flatnonzero(eta_changed | (row_fields != 0))
+
+        # Gather the changed rows column by column; per-row indexing is slow, on memory-mapped columns most of all
+        positions = fleet.positions[rows].tolist()
+        lateness = fleet.lateness_hours[rows].tolist()
+        route_index = fleet.route_index[rows].tolist()
+        velocity = fleet.velocity[rows].astype(np.int64).tolist()
+        status = fleet.status[rows].tolist()
+
+        trucks: List[Dict] = []
+        for i, (row, bits, eta) in enumerate(zip(rows.tolist(), row_fields[rows].tolist(),
+                                                 eta_changed[rows].tolist())):
+            update = {"id": fleet.ids[row]}
+            if bits & CHANGED_POSITION:
+                update["position"] = positions[i]
+            if bits & CHANGED_ROUTE:
+                update["route"] = fleet.route(row).tolist()
+            if eta:
+                update["eta"] = fleet.eta(row)
+                update["latenessHours"] = round(lateness[i], 2)
+            if bits & CHANGED_ROUTE_INDEX:
+                update["currentRouteIndex"] = route_index[i]
+            if bits & CHANGED_VELOCITY:
+                update["velocity"] = velocity[i]
+            if bits & CHANGED_STATUS:
+                update["status"] = STATUSES[status[i]]
+            trucks.append(update)
+
+        # Trucks added since the last tick are sent whole
+        trucks.extend(fleet.to_dict(row) for row in range(n, fleet.size))
+
+        events = self.simulator.events.since(self._events_sent)
+        # A burst beyond since()'s limit carries over to the next tick
+        self._events_sent = events[-1]["seq"] if events else self._events_sent
+        # Unsent ETA drift accumulates against the last value clients saw
+        eta_sent = np.where(eta_changed, fleet.eta_hours[:n], self._eta_hours)
+        self._capture()
+        self._eta_hours[:n] = eta_sent
+        self.seq += 1
+
+        return {
+            "type": "state_delta",
+            "seq": self.seq,
+            "baseSeq": self.seq - 1,
+            "data": {
+                "trucks": trucks,
+                "events": events,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
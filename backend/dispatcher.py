@@ -0,0 +1,191 @@
+"""
+Request Dispatcher
+Routes client messages to per-type handlers on the event loop, a thread pool or a process pool
+"""
+
+import asyncio
+import inspect
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+from metrics import registry
+
+# Where a handler runs
+LOOP = "loop"
+THREAD = "thread"
+PROCESS = "process"
+
+# Requests per second per connection, with bursts up to DEFAULT_BURST
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 40
+# Unanswered requests one connection may have before more are refused
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_THREADS = 4
+DEFAULT_PROCESSES = 1
+
+
+class RequestError(Exception):
+    """Raised by a handler to answer its request with an error message"""
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst; each request takes one"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until the next token"""
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class Handler:
+    def __init__(self, fn: Callable, where: str, msg_type: str):
+        self.fn = fn
+        self.where = where
+        self.seconds = registry.histogram("ws_request_seconds", "Time to answer each client request type",
+                                          {"type": msg_type})
+
+
+class Dispatcher:
+    """Rate-limited handler registry; process handlers are module-level fn(data), the others fn(data, websocket)"""
+
+    def __init__(self, send: Callable[[Any, Dict], None], rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, threads: int = DEFAULT_THREADS,
+                 processes: int = DEFAULT_PROCESSES):
+        self.send = send
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.processes = processes
+        self.handlers: Dict[str, Handler] = {}
+        self._buckets: Dict[Any, TokenBucket] = {}
+        self._in_flight: Dict[Any, Set[asyncio.Task]] = {}
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix="request")
+        # Started on the first process request; spawned, since forking a process with threads is unsafe
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._rejected = {
+            reason: registry.counter("ws_requests_rejected_total", "Client requests refused before running",
+                                     {"reason": reason})
+            for reason in ("rate_limited", "too_many_in_flight", "unknown_type")
+        }
+
+    def handler(self, msg_type: str, where: str = LOOP):
+        """Decorator registering fn as the handler for msg_type"""
+        if where not in (LOOP, THREAD, PROCESS):
+            raise ValueError(f"Unknown handler placement: {where}")
+
+        def register(fn: Callable) -> Callable:
+            self.handlers[msg_type] = Handler(fn, where, msg_type)
+            return fn
+        return register
+
+    def _reply(self, websocket, data: Dict, reply: Dict):
+        if "requestId" in data:
+            reply = {**reply, "requestId": data["requestId"]}
+        self.send(websocket, reply)
+
+    def _reject(self, websocket, data: Dict, reason: str, message: str, **extra):
+        self._rejected[reason].inc()
+        self._reply(websocket, data, {"type": "error", "code": reason, "message": message, **extra})
+
+    def dispatch(self, websocket, data: Dict):
+        """Start one decoded request; its reply is sent whenever it is ready"""
+        msg_type = data.get("type")
+        bucket = self._buckets.get(websocket)
+        if bucket is None:
+            bucket = self._buckets[websocket] = TokenBucket(self.rate, self.burst)
+        if not bucket.take():
+            self._reject(websocket, data, "rate_limited", "Too many requests",
+                         retryAfterMs=round(bucket.retry_after() * 1000))
+            return
+
+        handler = self.handlers.get(msg_type)
+        if handler is None:
+            self._reject(websocket, data, "unknown_type", f"Unknown message type: {msg_type}")
+            return
+
+        if handler.where == LOOP and not inspect.iscoroutinefunction(handler.fn):
+            # Quick handlers answer inline, in arrival order, without a task
+            started = time.perf_counter()
+            try:
+                reply = handler.fn(data, websocket)
+            except Exception as e:
+                reply = self._error(data, e)
+            self._answer(handler, websocket, data, reply, started)
+            return
+
+        tasks = self._in_flight.setdefault(websocket, set())
+        if len(tasks) >= self.max_in_flight:
+            self._reject(websocket, data, "too_many_in_flight",
+                         f"More than {self.max_in_flight} requests awaiting replies")
+            return
+
+        task = asyncio.create_task(self._run(handler, websocket, data))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async def _run(self, handler: Handler, websocket, data: Dict):
+        started = time.perf_counter()
+        try:
+            if handler.where == THREAD:
+                reply = await asyncio.get_running_loop().run_in_executor(self._threads, handler.fn, data, websocket)
+            elif handler.where == PROCESS:
+                reply = await self.run_in_process(handler.fn, data)
+            else:
+                reply = await handler.fn(data, websocket)
+        except Exception as e:
+            reply = self._error(data, e)
+        self._answer(handler, websocket, data, reply, started)
+
+    @staticmethod
+    def _error(data: Dict, error: Exception) -> Dict:
+        if isinstance(error, RequestError):
+            return {"type": "error", "message": str(error)}
+        if isinstance(error, (TypeError, ValueError)):
+            return {"type": "error", "message": f"Invalid {data['type']} request: {error}"}
+        # One failing request answers with an error instead of closing the connection
+        traceback.print_exception(error)
+        return {"type": "error", "message": f"{data['type']} failed"}
+
+    def _answer(self, handler: Handler, websocket, data: Dict, reply: Optional[Dict], started: float):
+        handler.seconds.observe(time.perf_counter() - started)
+        if reply is None and "requestId" in data:
+            reply = {"type": "ack"}
+        if reply is not None:
+            self._reply(websocket, data, reply)
+
+    async def run_in_process(self, fn: Callable, *args):
+        """Run a module-level function on the process pool, for handlers that gather its arguments on the loop"""
+        return await asyncio.get_running_loop().run_in_executor(self._processes(), fn, *args)
+
+    def _processes(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._process_pool
+
+    def close(self, websocket):
+        """Forget a disconnected client; its unfinished requests are cancelled and never answered"""
+        self._buckets.pop(websocket, None)
+        for task in self._in_flight.pop(websocket, ()):
+            task.cancel()
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,246 @@
+"""
+Event Log
+Fixed-capacity ring buffer of agent events with sequence IDs, secondary indexes and on-disk history
+"""
+
+import bisect
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterator, List, Optional
+
+# Events kept in memory; older ones are only reachable through the segment files
+EVENT_LOG_CAPACITY = 4096
+# Events per segment file, and how many segment files are retained
+EVENT_SEGMENT_SIZE = 4096
+EVENT_SEGMENTS_KEPT = 64
+
+DEFAULT_EVENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "events")
+
+
+class EventLog:
+    """
+    Ring buffer of the most recent events, indexed by truck and by type.
+    With a directory, every event is also queued for rotating JSONL segments named by
+    their first sequence number, written by flush(), so history past the ring stays queryable.
+    """
+
+    def __init__(self, capacity: int = EVENT_LOG_CAPACITY, directory: Optional[str] = None,
+                 segment_size: int = EVENT_SEGMENT_SIZE, segments_kept: int = EVENT_SEGMENTS_KEPT):
+        if capacity <= 0:
+            raise ValueError(f"Event log capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self._ring: List[Optional[Dict]] = [None] * capacity
+        self._count = 0
+        self.last_seq = 0
+
+        # Sequence numbers per key, oldest first; trimmed as the ring evicts
+        self.by_truck: Dict[str, Deque[int]] = {}
+        self.by_type: Dict[str, Deque[int]] = {}
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segments_kept = segments_kept
+        self._segments: List[int] = []
+        self._segment_file = None
+        self._segment_count = 0
+        # Events appended but not yet written; flush() swaps the list out under the lock
+        self._pending: List[Dict] = []
+        self._pending_lock = threading.Lock()
+        # Serializes flushes so batches reach the segments in sequence order
+        self._write_lock = threading.Lock()
+        self._written_seq = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._segments = sorted(
+                int(name[7:-6]) for name in os.listdir(directory)
+                if name.startswith("events-") and name.endswith(".jsonl")
+            )
+            self._resume()
+            self._written_seq = self.last_seq
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def pending(self) -> int:
+        """Events not yet written to a segment"""
+        return len(self._pending)
+
+    @property
+    def oldest_seq(self) -> int:
+        """Sequence number of the oldest event still in memory"""
+        return self.last_seq - self._count + 1
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"events-{first_seq:012d}.jsonl")
+
+    def _resume(self):
+        """Continue numbering after the last persisted event so IDs never repeat across restarts"""
+        if not self._segments:
+            return
+        last = None
+        for event in self._read_segment(self._segments[-1]):
+            last = event
+        if last:
+            self.last_seq = last["seq"]
+
+    def _read_segment(self, first_seq: int) -> Iterator[Dict]:
+        try:
+            with open(self._segment_path(first_seq), encoding="utf-8") as f:
+                for line in f:
+                    if line.endswith("\n"):  # a torn final line from a crash is skipped
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def _write(self, event: Dict):
+        if self._segment_file is None or self._segment_count >= self.segment_size:
+            if self._segment_file:
+                self._segment_file.close()
+            self._segments.append(event["seq"])
+            self._segment_file = open(self._segment_path(event["seq"]), "a", encoding="utf-8")
+            self._segment_count = 0
+            while len(self._segments) > self.segments_kept:
+                os.remove(self._segment_path(self._segments.pop(0)))
+
+        self._segment_file.write(json.dumps(event) + "\n")
+        self._segment_count += 1
+
+    def flush(self):
+        """Write queued events to the segment files; safe to call from a worker thread"""
+        with self._write_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            for event in batch:
+                self._write(event)
+            self._segment_file.flush()
+            self._written_seq = batch[-1]["seq"]
+
+    @staticmethod
+    def _index(index: Dict[str, Deque[int]], key: Optional[str], seq: int):
+        if key is not None:
+            index.setdefault(key, deque()).append(seq)
+
+    @staticmethod
+    def _unindex(index: Dict[str, Deque[int]], key: Optional[str], seq: int):
+        seqs = index.get(key)
+        if seqs and seqs[0] == seq:
+            seqs.popleft()
+            if not seqs:
+                del index[key]
+
+    def append(self, event_type: str, message: str, truck_id: Optional[str] = None,
+               severity: str = "info", timestamp: Optional[str] = None) -> Dict:
+        """Record an event and return it; timestamp defaults to now"""
+        self.last_seq += 1
+        seq = self.last_seq
+        event = {
+            "id": f"evt-{seq}",
+            "seq": seq,
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "type": event_type,
+            "severity": severity,
+            "message": message,
+            "truckId": truck_id
+        }
+        if self.directory:
+            with self._pending_lock:
+                self._pending.append(event)
+        self._store(event)
+        return event
+
+    def _store(self, event: Dict):
+        """Put an event in its ring slot, evicting and unindexing whatever it replaces"""
+        seq = event["seq"]
+        self.last_seq = max(self.last_seq, seq)
+        slot = seq % self.capacity
+        evicted = self._ring[slot]
+        if evicted is not None:
+            if evicted["seq"] > self._written_seq and self._pending:
+                # More events than the ring holds arrived between flushes: write them before the
+                # ring forgets them, so since() can still find everything below oldest_seq on disk
+                self.flush()
+            self._unindex(self.by_truck, evicted["truckId"], evicted["seq"])
+            self._unindex(self.by_type, evicted["type"], evicted["seq"])
+        else:
+            self._count += 1
+        self._ring[slot] = event
+        self._index(self.by_truck, event["truckId"], seq)
+        self._index(self.by_type, event["type"], seq)
+
+    def get(self, seq: int) -> Optional[Dict]:
+        """Event by sequence number, if still in memory"""
+        if not self.oldest_seq <= seq <= self.last_seq:
+            return None
+        return self._ring[seq % self.capacity]
+
+    def latest(self, n: int = 10, up_to: Optional[int] = None) -> List[Dict]:
+        """The last n events, oldest first, optionally ending at sequence number up_to"""
+        end = self.last_seq if up_to is None else min(up_to, self.last_seq)
+        start = max(end - n + 1, self.oldest_seq)
+        return [self._ring[seq % self.capacity] for seq in range(start, end + 1)]
+
+    def since(self, seq: int, limit: int = 1000) -> List[Dict]:
+        """Events after sequence number seq, oldest first, reading segment files for evicted history"""
+        events: List[Dict] = []
+        oldest = self.oldest_seq
+        if seq + 1 < oldest and self._segments:
+            start = max(bisect.bisect_right(self._segments, seq + 1) - 1, 0)
+            for first_seq in self._segments[start:]:
+                if first_seq >= oldest:
+                    break
+                for event in self._read_segment(first_seq):
+                    if event["seq"] >= oldest or len(events) >= limit:
+                        break
+                    if event["seq"] > seq:
+                        events.append(event)
+
+        start = max(seq + 1, oldest)
+        end = min(self.last_seq, start + limit - len(events) - 1)
+        events.extend(self._ring[s % self.capacity] for s in range(start, end + 1))
+        return events
+
+    def _select(self, seqs: Optional[Deque[int]], limit: int) -> List[Dict]:
+        if not seqs:
+            return []
+        picked = list(seqs)[-limit:] if limit < len(seqs) else list(seqs)
+        return [self._ring[seq % self.capacity] for seq in picked]
+
+    def for_truck(self, truck_id: str, limit: int = 100) -> List[Dict]:
+        """The most recent in-memory events for one truck, oldest first"""
+        return self._select(self.by_truck.get(truck_id), limit)
+
+    def of_type(self, event_type: str, limit: int = 100) -> List[Dict]:
+        """The most recent in-memory events of one type, oldest first"""
+        return self._select(self.by_type.get(event_type), limit)
+
+    def state(self) -> Dict:
+        """The in-memory events, oldest first, for a snapshot"""
+        return {"lastSeq": self.last_seq, "events": self.latest(self.capacity)}
+
+    def restore(self, state: Dict):
+        """
+        Refill the ring from state(). Events persisted to segments after the
+        snapshot was taken are replayed on top, so nothing in between is lost.
+        """
+        for event in state["events"]:
+            self._store(event)
+        resumed = self.last_seq
+        after = state["lastSeq"]
+        if self.directory and resumed > after:
+            start = max(bisect.bisect_right(self._segments, after + 1) - 1, 0)
+            for first_seq in self._segments[start:]:
+                for event in self._read_segment(first_seq):
+                    if event["seq"] > after:
+                        self._store(event)
+
+    def close(self):
+        self.flush()
+        if self._segment_file:
+            self._segment_file.close()
+            self._segment_file = None
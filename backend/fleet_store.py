@@ -0,0 +1,522 @@
+"""
+Columnar Fleet Store
+Keeps truck state in contiguous NumPy arrays so a tick is one vectorized step
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spatial_index import haversine_km
+
+# Status strings are stored as small integer codes; the order is the wire order
+STATUSES = ("on-time", "delayed", "critical", "resolved")
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+ON_TIME = STATUS_CODES["on-time"]
+DELAYED = STATUS_CODES["delayed"]
+CRITICAL = STATUS_CODES["critical"]
+
+# Hours a stopped truck is expected to stay stopped, when projecting its arrival
+STALLED_RESUME_HOURS = 2.5
+
+# Packed route keys are block * stride + km along the route; longer than any route
+_ROUTE_KEY_STRIDE = 1e6
+
+# Packed points no longer part of any route (left behind by reroutes) past which the routes are repacked
+ROUTE_COMPACT_FRACTION = 0.5
+
+# Array columns with one entry per truck, and the packed per-point route columns
+PER_TRUCK_COLUMNS = (
+    "positions", "velocity", "status", "route_index", "route_offsets", "route_lengths", "route_block", "route_km",
+    "distance", "cruise_velocity", "trip_hours", "deadline_hours", "eta_hours", "lateness_hours", "destinations",
+    "live"
+)
+ROUTE_COLUMNS = ("route_coords", "route_cum", "_route_keys")
+
+# Bits of the per-truck change mask: which wire fields a truck changed since changes were last collected.
+# ETA is not tracked; it moves with the clock for every stopped or live truck.
+CHANGED_POSITION = 1
+CHANGED_VELOCITY = 2
+CHANGED_STATUS = 4
+CHANGED_ROUTE = 8
+CHANGED_ROUTE_INDEX = 16
+CHANGED_ADDED = 32
+
+
+class FleetChanges:
+    """Trucks that changed since the last collection, each with a bitmask of the fields that changed"""
+
+    def __init__(self, rows: np.ndarray, fields: np.ndarray):
+        self.rows = rows
+        self.fields = fields
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def rows_with(self, fields: int) -> np.ndarray:
+        """Rows where any of the given field bits changed"""
+        return self.rows[(self.fields & fields) != 0]
+
+    @classmethod
+    def merge(cls, batches: List["FleetChanges"]) -> "FleetChanges":
+        """Combine several collections into one, OR-ing the fields of trucks that appear in more than one"""
+        if len(batches) == 1:
+            return batches[0]
+        if not batches:
+            return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8))
+        rows = np.concatenate([batch.rows for batch in batches])
+        fields = np.concatenate([batch.fields for batch in batches])
+        order = np.argsort(rows, kind="stable")
+        rows, fields = rows[order], fields[order]
+        unique, starts = np.unique(rows, return_index=True)
+        return cls(unique, np.bitwise_or.reduceat(fields, starts) if len(rows) else fields)
+
+
+class FleetStore:
+    """Structure-of-arrays storage for the whole truck fleet"""
+
+    def __init__(self, capacity: int = 16, epoch: Optional[datetime] = None):
+        capacity = max(1, capacity)
+        self.size = 0
+
+        # Hot columns, touched every tick
+        self.positions = np.zeros((capacity, 2), dtype=np.float64)
+        self.velocity = np.zeros(capacity, dtype=np.float32)
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.route_index = np.zeros(capacity, dtype=np.int32)
+
+        # Packed routes: truck i owns route_coords[route_offsets[i]:route_offsets[i] + route_lengths[i]]
+        self.route_offsets = np.zeros(capacity, dtype=np.int64)
+        self.route_lengths = np.zeros(capacity, dtype=np.int32)
+        self.route_coords = np.zeros((capacity * 21, 2), dtype=np.float64)
+        # Km from the route start to each packed point, and the same offset by route block for one global search
+        self.route_cum = np.zeros(capacity * 21, dtype=np.float64)
+        self._route_keys = np.zeros(capacity * 21, dtype=np.float64)
+        self._coords_used = 0
+        self._coords_dead = 0
+        self._blocks = 0
+        self.route_block = np.zeros(capacity, dtype=np.int64)
+        self.route_km = np.zeros(capacity, dtype=np.float64)
+
+        # Kinematics, in simulated hours since epoch
+        self.epoch = datetime.now() if epoch is None else epoch
+        self.hours = 0.0
+        self.distance = np.zeros(capacity, dtype=np.float64)
+        self.cruise_velocity = np.zeros(capacity, dtype=np.float32)
+        self.trip_hours = np.zeros(capacity, dtype=np.float64)
+        self.deadline_hours = np.zeros(capacity, dtype=np.float64)
+        self.eta_hours = np.zeros(capacity, dtype=np.float64)
+        self.lateness_hours = np.zeros(capacity, dtype=np.float64)
+        # Trucks positioned by real telemetry rather than moved along their route
+        self.live = np.zeros(capacity, dtype=bool)
+
+        # Change tracking: field bits per truck, and the rows marked since the last collection
+        self.changes = np.zeros(capacity, dtype=np.uint8)
+        self._marked: List[np.ndarray] = []
+        self._marked_count = 0
+
+        # Cold columns, only read when dicts are materialized
+        self.ids: List[str] = []
+        self.drivers: List[str] = []
+        self.cargo_values: List[int] = []
+        self.contract_ids: List[Optional[str]] = []
+        self.destinations = np.zeros((capacity, 2), dtype=np.float64)
+
+        self.index: Dict[str, int] = {}
+        self.by_contract: Dict[str, List[int]] = {}
+
+    @property
+    def capacity(self) -> int:
+        return len(self.velocity)
+
+    def _grow(self, min_capacity: int):
+        """Double the per-truck columns until min_capacity fits"""
+        new_capacity = max(self.capacity, 1)
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+
+        def resized(column: np.ndarray) -> np.ndarray:
+            grown = np.zeros((new_capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            return grown
+
+        for name in PER_TRUCK_COLUMNS + ("changes",):
+            setattr(self, name, resized(getattr(self, name)))
+
+    def _reserve_coords(self, extra: int):
+        """Make room for extra packed route points"""
+        needed = self._coords_used + extra
+        if needed <= len(self.route_coords):
+            return
+        new_len = max(needed, len(self.route_coords) * 2)
+        used = self._coords_used
+
+        def grown(column: np.ndarray) -> np.ndarray:
+            bigger = np.zeros((new_len,) + column.shape[1:], dtype=column.dtype)
+            bigger[:used] = column[:used]
+            return bigger
+
+        for name in ROUTE_COLUMNS:
+            setattr(self, name, grown(getattr(self, name)))
+
+    def _pack_routes(self, rows: np.ndarray, routes: List[np.ndarray]):
+        """Append routes for rows, with cumulative segment lengths for position lookups"""
+        lengths = np.array([len(route) for route in routes], dtype=np.int32)
+        total = int(lengths.sum())
+        self._reserve_coords(total)
+        start = self._coords_used
+        offsets = start + np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+
+        coords = np.concatenate(routes)
+        legs = np.zeros(total)
+        legs[1:] = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+        legs[offsets - start] = 0.0  # no leg between one route's end and the next route's start
+        along = np.cumsum(legs)
+        cum = along - np.repeat(along[offsets - start], lengths)
+        blocks = self._blocks + np.arange(len(routes))
+
+        self.route_coords[start:start + total] = coords
+        self.route_cum[start:start + total] = cum
+        self._route_keys[start:start + total] = cum + np.repeat(blocks, lengths) * _ROUTE_KEY_STRIDE
+        self._coords_used += total
+        self._blocks += len(routes)
+
+        self.route_offsets[rows] = offsets
+        self.route_lengths[rows] = lengths
+        self.route_block[rows] = blocks
+        self.route_km[rows] = cum[offsets - start + lengths - 1]
+
+    def state(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Copies of the used part of every array column, plus the scalar and string state as JSON"""
+        arrays = {name: getattr(self, name)[:self.size].copy() for name in PER_TRUCK_COLUMNS}
+        arrays.update({name: getattr(self, name)[:self._coords_used].copy() for name in ROUTE_COLUMNS})
+        meta = {
+            "size": self.size,
+            "blocks": self._blocks,
+            "epoch": self.epoch.isoformat(),
+            "hours": self.hours,
+            "ids": list(self.ids),
+            "drivers": list(self.drivers),
+            "cargoValues": list(self.cargo_values),
+            "contractIds": list(self.contract_ids)
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_state(cls, arrays: Dict[str, np.ndarray], meta: Dict) -> "FleetStore":
+        """
+        Rebuild a store from state(); arrays may be copy-on-write memory maps, so
+        pages are only read when touched and writes never reach the snapshot file.
+        """
+        store = cls(capacity=1)
+        for name in PER_TRUCK_COLUMNS + ROUTE_COLUMNS:
+            setattr(store, name, arrays[name])
+        store.size = meta["size"]
+        store.changes = np.zeros(len(store.velocity), dtype=np.uint8)
+        store._coords_used = len(arrays["route_coords"])
+        store._coords_dead = store._coords_used - int(store.route_lengths[:store.size].sum())
+        store._blocks = meta["blocks"]
+        store.epoch = datetime.fromisoformat(meta["epoch"])
+        store.hours = meta["hours"]
+        store.ids = meta["ids"]
+        store.drivers = meta["drivers"]
+        store.cargo_values = meta["cargoValues"]
+        store.contract_ids = meta["contractIds"]
+        store.index = {truck_id: row for row, truck_id in enumerate(store.ids)}
+        for row, contract_id in enumerate(store.contract_ids):
+            if contract_id:
+                store.by_contract.setdefault(contract_id, []).append(row)
+        return store
+
+    def add_truck(self, truck: Dict) -> int:
+        """Append a truck given in the dict shape used by get_state()"""
+        return self.add_trucks([truck])[0]
+
+    def add_trucks(self, trucks: List[Dict], now: Optional[datetime] = None) -> List[int]:
+        """Append many trucks at once, returning their row indexes; ETAs are measured from now"""
+        if not trucks:
+            return []
+
+        start = self.size
+        end = start + len(trucks)
+        if end > self.capacity:
+            self._grow(end)
+
+        rows = np.arange(start, end)
+        self._pack_routes(rows, [np.asarray(truck["route"], dtype=np.float64).reshape(-1, 2) for truck in trucks])
+        self.positions[start:end] = [truck["position"] for truck in trucks]
+        self.destinations[start:end] = [truck["destination"] for truck in trucks]
+        self.velocity[start:end] = [truck["velocity"] for truck in trucks]
+        self.cruise_velocity[start:end] = self.velocity[start:end]
+        self.status[start:end] = [STATUS_CODES[truck["status"]] for truck in trucks]
+        self.route_index[start:end] = [truck.get("currentRouteIndex", 0) for truck in trucks]
+        self.distance[start:end] = self.route_cum[self.route_offsets[start:end] + self.route_index[start:end]]
+
+        # The ETA a truck is added with is its delivery deadline
+        now = datetime.now() if now is None else now
+        self.trip_hours[start:end] = [
+            (datetime.fromisoformat(truck["eta"]) - now).total_seconds() / 3600 for truck in trucks
+        ]
+        self.deadline_hours[start:end] = self.hours + self.trip_hours[start:end]
+
+        for row, truck in enumerate(trucks, start):
+            self.index[truck["id"]] = row
+            self.ids.append(truck["id"])
+            self.drivers.append(truck["driver"])
+            self.cargo_values.append(truck["cargoValue"])
+            self.contract_ids.append(truck.get("contractId"))
+            if truck.get("contractId"):
+                self.by_contract.setdefault(truck["contractId"], []).append(row)
+
+        self.size = end
+        self.project(rows)
+        self.mark(rows, CHANGED_ADDED)
+        return list(range(start, end))
+
+    def row(self, truck_id: str) -> Optional[int]:
+        """Return the row index of a truck, or None if unknown"""
+        return self.index.get(truck_id)
+
+    def rows_for_contract(self, contract_id: str) -> List[int]:
+        """Return the rows of every truck carrying a contract"""
+        return self.by_contract.get(contract_id, [])
+
+    def mark(self, rows, fields: int):
+        """Record that fields of the given rows changed; every write to a wire field goes through here"""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        if len(rows):
+            self.changes[rows] |= fields
+            self._marked_count += len(rows)
+            # Past a fleet's worth of marks collect_changes() scans the mask instead, so stop keeping them
+            if self._marked_count <= self.size:
+                self._marked.append(rows)
+
+    def collect_changes(self) -> FleetChanges:
+        """Everything marked since the last call, then start afresh; costs the number of changes, not the fleet"""
+        if not self._marked_count:
+            return FleetChanges.merge([])
+        if self._marked_count * 8 < self.size:
+            rows = np.unique(np.concatenate(self._marked))
+        else:
+            # Most of the fleet changed: one pass over the mask beats sorting the marks
+            rows = np.flatnonzero(self.changes[:self.size])
+        self._marked = []
+        self._marked_count = 0
+        fields = self.changes[rows]
+        self.changes[rows] = 0
+        return FleetChanges(rows, fields)
+
+    def set_status(self, row: int, status: str):
+        self.set_status_codes(np.array([row]), np.array([STATUS_CODES[status]], dtype=np.int8))
+
+    def set_status_codes(self, rows: np.ndarray, codes: np.ndarray):
+        """Set status codes for many trucks, marking only those that actually changed"""
+        changed = self.status[rows] != codes
+        self.status[rows[changed]] = codes[changed]
+        self.mark(rows[changed], CHANGED_STATUS)
+
+    def set_velocity(self, row: int, velocity: float):
+        if self.velocity[row] != velocity:
+            self.velocity[row] = velocity
+            self.mark(row, CHANGED_VELOCITY)
+
+    def get_status(self, row: int) -> str:
+        return STATUSES[self.status[row]]
+
+    def delayed_rows(self) -> np.ndarray:
+        """Rows of every truck currently delayed or critical"""
+        status = self.status[:self.size]
+        return np.flatnonzero((status == DELAYED) | (status == CRITICAL))
+
+    def route(self, row: int) -> np.ndarray:
+        """Return a view of one truck's packed route"""
+        offset = self.route_offsets[row]
+        return self.route_coords[offset:offset + self.route_lengths[row]]
+
+    def set_route(self, row: int, coords):
+        """
+        Give a truck a new route from its start. A route no longer than the old one is written over it;
+        a longer one is appended, and once half the packed points are dead the routes are repacked.
+        """
+        rows = np.array([row])
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        old_length = int(self.route_lengths[row])
+        if len(coords) <= old_length:
+            self._rewrite_route(row, coords)
+            self._coords_dead += old_length - len(coords)
+        else:
+            self._pack_routes(rows, [coords])
+            self._coords_dead += old_length
+            if self._coords_dead > self._coords_used * ROUTE_COMPACT_FRACTION:
+                self._compact_routes()
+        self.route_index[row] = 0
+        self.distance[row] = 0.0
+        self.project(rows)
+        self.mark(rows, CHANGED_ROUTE | CHANGED_ROUTE_INDEX)
+
+    def _rewrite_route(self, row: int, coords: np.ndarray):
+        """Put a route in the span of a longer one, keeping its route block so the packed keys stay sorted"""
+        offset, span = int(self.route_offsets[row]), int(self.route_lengths[row])
+        cum = np.zeros(len(coords))
+        cum[1:] = np.cumsum(haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1]))
+        self.route_coords[offset:offset + len(coords)] = coords
+        self.route_cum[offset:offset + len(coords)] = cum
+        # The unused tail repeats the last key, so every route block still ascends
+        keys = np.full(span, cum[-1])
+        keys[:len(coords)] = cum
+        self._route_keys[offset:offset + span] = keys + self.route_block[row] * _ROUTE_KEY_STRIDE
+        self.route_lengths[row] = len(coords)
+        self.route_km[row] = cum[-1]
+
+    def _compact_routes(self):
+        """Repack every truck's route back to back in row order, dropping the dead points between them"""
+        lengths = self.route_lengths[:self.size].astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        points = np.repeat(self.route_offsets[:self.size] - offsets, lengths) + np.arange(lengths.sum())
+        total = len(points)
+        blocks = np.arange(self.size, dtype=np.int64)
+        self.route_coords[:total] = self.route_coords[points]
+        self.route_cum[:total] = self.route_cum[points]
+        self._route_keys[:total] = self.route_cum[:total] + np.repeat(blocks, lengths) * _ROUTE_KEY_STRIDE
+        self.route_offsets[:self.size] = offsets
+        self.route_block[:self.size] = blocks
+        self._coords_used = total
+        self._coords_dead = 0
+        self._blocks = self.size
+
+    def eta(self, row: int) -> Optional[str]:
+        """Projected arrival as a timestamp, None while it cannot be projected"""
+        hours = self.eta_hours[row]
+        return (self.epoch + timedelta(hours=float(hours))).isoformat() if np.isfinite(hours) else None
+
+    def _locate(self, rows: np.ndarray):
+        """Place trucks on their routes by km travelled: one binary search over every packed route"""
+        keys = self.route_block[rows] * _ROUTE_KEY_STRIDE + self.distance[rows]
+        last = self.route_offsets[rows] + self.route_lengths[rows] - 1
+        segment = np.searchsorted(self._route_keys[:self._coords_used], keys, side="right") - 1
+        segment = np.clip(segment, self.route_offsets[rows], np.maximum(last - 1, self.route_offsets[rows]))
+        following = np.minimum(segment + 1, last)
+
+        span = self.route_cum[following] - self.route_cum[segment]
+        fraction = np.divide(self.distance[rows] - self.route_cum[segment], span,
+                             out=np.zeros(len(rows)), where=span > 0)
+        start, end = self.route_coords[segment], self.route_coords[following]
+        self.positions[rows] = start + (end - start) * np.clip(fraction, 0.0, 1.0)[:, None]
+        self.route_index[rows] = segment - self.route_offsets[rows]
+
+    def _nearest_points(self, rows: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Index of the packed route point closest to each position, searching only that truck's route"""
+        lengths = self.route_lengths[rows].astype(np.int64)
+        firsts = np.cumsum(lengths) - lengths
+        points = np.repeat(self.route_offsets[rows] - firsts, lengths) + np.arange(lengths.sum())
+        observed = np.repeat(positions, lengths, axis=0)
+        # Equirectangular squared distance: ranks points the same as haversine at route scale, far cheaper
+        offset = self.route_coords[points] - observed
+        offset[:, 0] *= np.cos(np.radians(observed[:, 1]))
+        gap = np.einsum("ij,ij->i", offset, offset)
+
+        closest = gap == np.repeat(np.minimum.reduceat(gap, firsts), lengths)
+        hits = np.flatnonzero(closest)
+        owners = np.repeat(np.arange(len(rows)), lengths)[hits]
+        return points[hits[np.unique(owners, return_index=True)[1]]]
+
+    def observe(self, rows: np.ndarray, positions: np.ndarray, velocity: np.ndarray):
+        """
+        Apply reported positions and speeds. The trucks become live: advance() stops
+        moving them, and progress along the route is taken from the nearest route point.
+        """
+        moved = np.any(self.positions[rows] != positions, axis=1)
+        sped = self.velocity[rows] != velocity
+        before = self.route_index[rows]
+
+        self.positions[rows] = positions
+        self.velocity[rows] = velocity
+        self.live[rows] = True
+        nearest = self._nearest_points(rows, positions)
+        self.distance[rows] = self.route_cum[nearest]
+        self.route_index[rows] = nearest - self.route_offsets[rows]
+        self.project(rows)
+
+        self.mark(rows[moved], CHANGED_POSITION)
+        self.mark(rows[sped], CHANGED_VELOCITY)
+        self.mark(rows[self.route_index[rows] != before], CHANGED_ROUTE_INDEX)
+
+    def project(self, rows: np.ndarray):
+        """Recompute ETA and lateness from remaining distance and current speed"""
+        velocity = self.velocity[rows].astype(np.float64)
+        speed = np.where(velocity > 0, velocity, self.cruise_velocity[rows])
+        remaining = self.route_km[rows] - self.distance[rows]
+        drive = np.divide(remaining, speed, out=np.full(len(rows), np.inf), where=speed > 0)
+        drive[remaining <= 0] = 0.0
+        stalled = np.where(velocity > 0, 0.0, STALLED_RESUME_HOURS)
+        self.eta_hours[rows] = self.hours + stalled + drive
+        self.lateness_hours[rows] = np.maximum(self.eta_hours[rows] - self.deadline_hours[rows], 0.0)
+
+    def advance(self, dt_hours: float) -> np.ndarray:
+        """
+        Move every truck velocity x dt along its route and refresh every ETA.
+        Trucks reaching their destination start the route again with a fresh deadline.
+        Live trucks are left where their last report put them. Returns the rows that moved.
+        """
+        n = self.size
+        self.hours += dt_hours
+        rows = np.flatnonzero((self.velocity[:n] > 0) & ~self.live[:n])
+
+        distance = self.distance[rows] + self.velocity[rows] * dt_hours
+        arrived = distance >= self.route_km[rows]
+        distance[arrived] = 0.0
+        self.distance[rows] = distance
+        self.deadline_hours[rows[arrived]] = self.hours + self.trip_hours[rows[arrived]]
+
+        before = self.route_index[rows]
+        self._locate(rows)
+        self.project(np.arange(n))
+        self.mark(rows, CHANGED_POSITION)
+        self.mark(rows[self.route_index[rows] != before], CHANGED_ROUTE_INDEX)
+        return rows
+
+    def to_dict(self, row: int) -> Dict:
+        """Materialize one truck in the dict shape used by get_state()"""
+        return {
+            "id": self.ids[row],
+            "driver": self.drivers[row],
+            "cargoValue": self.cargo_values[row],
+            "status": STATUSES[self.status[row]],
+            "velocity": int(self.velocity[row]),
+            "position": self.positions[row].tolist(),
+            "destination": self.destinations[row].tolist(),
+            "route": self.route(row).tolist(),
+            "currentRouteIndex": int(self.route_index[row]),
+            "contractId": self.contract_ids[row],
+            "eta": self.eta(row),
+            "latenessHours": round(float(self.lateness_hours[row]), 2),
+        }
+
+    def to_dicts(self) -> List[Dict]:
+        """Materialize the whole fleet, converting columns to Python lists once"""
+        n = self.size
+        positions = self.positions[:n].tolist()
+        destinations = self.destinations[:n].tolist()
+        velocity = self.velocity[:n].astype(np.int64).tolist()
+        status = self.status[:n].tolist()
+        route_index = self.route_index[:n].tolist()
+        lateness = self.lateness_hours[:n].round(2).tolist()
+
+        return [
+            {
+                "id": self.ids[row],
+                "driver": self.drivers[row],
+                "cargoValue": self.cargo_values[row],
+                "status": STATUSES[status[row]],
+                "velocity": velocity[row],
+                "position": positions[row],
+                "destination": destinations[row],
+                "route": self.route(row).tolist(),
+                "currentRouteIndex": route_index[row],
+                "contractId": self.contract_ids[row],
+                "eta": self.eta(row),
+                "latenessHours": lateness[row],
+            }
+            for row in range(n)
+        ]
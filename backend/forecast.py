@@ -0,0 +1,250 @@
+"""
+Monte Carlo SLA Forecast
+Headless fast-forward runs of a fleet snapshot, turned into penalty-exposure distributions per contract
+
+Usage:
+    python forecast.py --trials 10000 --seed 42 --out data/forecast.json
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from contract_parser import contract_penalty
+from contract_store import ContractRepository
+from fleet_store import FleetStore, ON_TIME, STATUS_CODES
+
+# Incidents per truck-hour of driving, and how they split across simulate_delay severities
+INCIDENT_RATE_PER_HOUR = 0.15
+SEVERITIES = ("minor", "major", "critical")
+SEVERITY_WEIGHTS = (0.6, 0.3, 0.1)
+# Mean hours until an incident of each severity is resolved
+MEAN_RESOLUTION_HOURS = {"minor": 0.5, "major": 1.0, "critical": 2.0}
+
+# A trip still unfinished this many hours past schedule is cut off
+MAX_OVERRUN_HOURS = 12.0
+
+# The demo fleet forecast without a live one is dated from this, so a seed always gives the same report
+FORECAST_EPOCH = datetime(2025, 1, 1)
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Per-truck lists in a fleet_input()
+INPUT_FIELDS = ("contractIds", "velocity", "severity", "remainingKm", "deadlineHours")
+
+# Contract fields contract_penalty reads
+TERM_FIELDS = ("penaltyPerHour", "maxPenalty", "tiers")
+
+# Per-process state, set once by the pool initializer
+_fleet: Optional[Dict[str, np.ndarray]] = None
+_contract_ids: List[str] = []
+_penalty_per_hour: Optional[np.ndarray] = None
+_max_penalty: Optional[np.ndarray] = None
+_tiered: List[Tuple[int, Dict]] = []
+
+
+def fleet_input(fleet: FleetStore) -> Dict[str, list]:
+    """
+    What a forecast needs of every truck on a contract, as plain lists so it can cross
+    process and shard boundaries: hours are measured from the moment it is taken.
+    """
+    rows = np.array([row for row in range(fleet.size) if fleet.contract_ids[row]], dtype=np.int64)
+    velocity = fleet.velocity[rows].astype(np.float64)
+    # Trucks already delayed carry on as an incident in progress: stopped ones as critical
+    severity = np.where(fleet.status[rows] == ON_TIME, -1, SEVERITIES.index("major"))
+    severity[fleet.status[rows] == STATUS_CODES["resolved"]] = -1
+    severity[velocity == 0] = SEVERITIES.index("critical")
+    return {
+        "contractIds": [fleet.contract_ids[row] for row in rows.tolist()],
+        "velocity": velocity.tolist(),
+        "severity": severity.tolist(),
+        "remainingKm": np.maximum(fleet.route_km[rows] - fleet.distance[rows], 0.0).tolist(),
+        "deadlineHours": (fleet.deadline_hours[rows] - fleet.hours).tolist()
+    }
+
+
+def merge_fleet_inputs(inputs: Iterable[Dict[str, list]]) -> Dict[str, list]:
+    """One forecast input from several shards' fleet_input()"""
+    merged: Dict[str, list] = {field: [] for field in INPUT_FIELDS}
+    for part in inputs:
+        for field, values in merged.items():
+            values.extend(part[field])
+    return merged
+
+
+def contract_terms(contracts: ContractRepository, contract_ids: Iterable[str]) -> Dict[str, Dict]:
+    """The penalty terms of each known contract, without the rest of the contract"""
+    return {
+        contract_id: {field: contract.get(field) for field in TERM_FIELDS}
+        for contract_id, contract in contracts.get_many(set(contract_ids)).items() if contract
+    }
+
+
+def demo_input() -> Tuple[Dict[str, list], Dict[str, Dict]]:
+    """The demo trucks and contracts, dated from FORECAST_EPOCH"""
+    from analysis_cache import AnalysisCache
+    from contract_analyzer import ContractAnalyzer
+    from contract_store import InMemoryContractStore
+    from event_log import EventLog
+    from simulation import TruckSimulator
+
+    fleet = fleet_input(TruckSimulator(events=EventLog(capacity=64), epoch=FORECAST_EPOCH).fleet)
+    analyzer = ContractAnalyzer(cache=AnalysisCache(path=None), contracts=InMemoryContractStore())
+    return fleet, contract_terms(analyzer.contracts, fleet["contractIds"])
+
+
+def _init_worker(fleet: Dict[str, list], terms: Dict[str, Dict]):
+    global _fleet, _contract_ids, _penalty_per_hour, _max_penalty, _tiered
+    _fleet = {field: np.asarray(values, dtype=np.float64) for field, values in fleet.items() if field != "contractIds"}
+    _contract_ids = fleet["contractIds"]
+    # The flat-rate rule of contract_penalty as array math; unknown contracts owe nothing
+    known = [terms.get(contract_id) for contract_id in _contract_ids]
+    _penalty_per_hour = np.array([(t["penaltyPerHour"] or 0) if t else 0.0 for t in known], dtype=np.float64)
+    _max_penalty = np.array(
+        [t["maxPenalty"] if t and t["maxPenalty"] is not None else np.inf for t in known], dtype=np.float64
+    )
+    _tiered = [(i, t) for i, t in enumerate(known) if t and t.get("tiers")]
+
+
+def _trial_seeds(seed: int, trials: int) -> List[np.random.SeedSequence]:
+    """One independent seed per trial, so results do not depend on how trials are split across workers"""
+    return np.random.SeedSequence(seed).spawn(trials)
+
+
+def run_trial(seed_sequence: np.random.SeedSequence, step_minutes: float = 5.0) -> np.ndarray:
+    """Fast-forward the fleet snapshot to delivery; returns the penalty owed on each truck's contract"""
+    rng = np.random.default_rng(seed_sequence)
+    velocity = _fleet["velocity"].copy()
+    severity = _fleet["severity"].astype(np.int64)
+    remaining = _fleet["remainingKm"].copy()
+    deadline = _fleet["deadlineHours"]
+    count = len(velocity)
+    resolution_hours = np.array([MEAN_RESOLUTION_HOURS[s] for s in SEVERITIES])
+    major, critical = SEVERITIES.index("major"), SEVERITIES.index("critical")
+
+    dt = step_minutes / 60.0
+    finished_at = np.where(remaining <= 0, 0.0, np.nan)
+    elapsed = 0.0
+    horizon = max(float(deadline.max(initial=0.0)), 0.0) + MAX_OVERRUN_HOURS
+    while elapsed < horizon and np.isnan(finished_at).any():
+        incidents = rng.random(count) < INCIDENT_RATE_PER_HOUR * dt
+        picks = rng.choice(len(SEVERITIES), size=count, p=SEVERITY_WEIGHTS)
+        recoveries = rng.random(count)
+        resumed_speeds = rng.integers(60, 76, count)
+        driving = np.isnan(finished_at)
+
+        # The same speed changes as TruckSimulator.simulate_delay and resolve_delay
+        hit = driving & (severity < 0) & incidents
+        resolved = driving & (severity >= 0) & (recoveries < dt / resolution_hours[np.maximum(severity, 0)])
+        severity[hit] = picks[hit]
+        velocity[hit & (picks == critical)] = 0.0
+        slowed = hit & (picks == major)
+        velocity[slowed] = np.maximum(20.0, velocity[slowed] - 40)
+        slowed = hit & (picks < major)
+        velocity[slowed] = np.maximum(40.0, velocity[slowed] - 20)
+        velocity[resolved] = resumed_speeds[resolved]
+        severity[resolved] = -1
+
+        covered = np.where(driving, velocity * dt, 0.0)
+        # Arrival falls inside the step, not at its end
+        done = driving & (covered >= remaining)
+        finished_at[done] = elapsed + remaining[done] / velocity[done]
+        remaining -= covered
+        elapsed += dt
+
+    finished_at[np.isnan(finished_at)] = elapsed
+    delay_hours = np.maximum(finished_at - deadline, 0.0)
+
+    penalties = np.minimum(_penalty_per_hour * delay_hours, _max_penalty)
+    for i, terms in _tiered:
+        penalties[i] = contract_penalty(terms, float(delay_hours[i]))
+    return penalties
+
+
+def _run_chunk(args: Tuple[List[np.random.SeedSequence], float]) -> np.ndarray:
+    seeds, step_minutes = args
+    return np.vstack([run_trial(seed_sequence, step_minutes) for seed_sequence in seeds])
+
+
+def summarize(contract_ids: List[str], penalties: np.ndarray) -> Dict:
+    """Penalty-exposure distribution per contract (over all its trucks) and for the whole fleet"""
+    def describe(values: np.ndarray) -> Dict:
+        summary = {
+            "mean": round(float(values.mean()), 2),
+            "std": round(float(values.std()), 2),
+            "max": round(float(values.max()), 2),
+            "probabilityOfPenalty": round(float((values > 0).mean()), 4)
+        }
+        for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            summary[f"p{q}"] = round(float(value), 2)
+        return summary
+
+    columns: Dict[str, List[int]] = {}
+    for i, contract_id in enumerate(contract_ids):
+        columns.setdefault(contract_id, []).append(i)
+    return {
+        "contracts": {contract_id: describe(penalties[:, i].sum(axis=1)) for contract_id, i in columns.items()},
+        "fleet": describe(penalties.sum(axis=1))
+    }
+
+
+def forecast(trials: int = 1000, seed: int = 0, step_minutes: float = 5.0, workers: Optional[int] = None,
+             chunk_size: int = 250, fleet: Optional[Dict[str, list]] = None,
+             terms: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Run seeded trials of a fleet_input() snapshot with its contract_terms() across a process pool;
+    the demo fleet when none is given. The same seed and snapshot give the same result.
+    """
+    if fleet is None:
+        fleet, terms = demo_input()
+    terms = terms or {}
+    seeds = _trial_seeds(seed, trials)
+    chunks = [(seeds[start:start + chunk_size], step_minutes) for start in range(0, trials, chunk_size)]
+
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    if not fleet["contractIds"] or not trials:
+        results = [np.zeros((trials, len(fleet["contractIds"])))]
+    elif workers == 1:
+        _init_worker(fleet, terms)
+        results = [_run_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fleet, terms)) as pool:
+            # map() keeps chunk order, so the stacked matrix is independent of scheduling
+            results = list(pool.map(_run_chunk, chunks))
+
+    penalties = np.vstack(results)
+    return {
+        "trials": trials,
+        "seed": seed,
+        "stepMinutes": step_minutes,
+        "workers": workers,
+        "trucks": len(fleet["contractIds"]),
+        "seconds": round(time.perf_counter() - started, 2),
+        **(summarize(fleet["contractIds"], penalties) if trials else {"contracts": {}, "fleet": None})
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo penalty-exposure forecast of the demo fleet")
+    parser.add_argument("--trials", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--step-minutes", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=None, help="Processes to use (default: all cores)")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = forecast(args.trials, args.seed, args.step_minutes, args.workers)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"📈 {args.trials:,} trials in {report['seconds']}s -> {args.out}")
+    else:
+        print(text)
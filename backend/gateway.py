@@ -0,0 +1,441 @@
+"""
+Broadcast Gateway
+Holds WebSocket clients for a sharded cluster: mirrors every shard's trucks from its
+delta stream, merges them into one state_delta per tick, forwards truck commands
+to the shard that owns the truck and merges every shard's answer to history queries
+"""
+
+import asyncio
+import itertools
+import os
+from datetime import datetime
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import websockets
+from dotenv import load_dotenv
+
+from analysis_cache import AnalysisCache
+from broadcaster import Broadcaster
+from clock import FixedTimestepClock
+from codec import SUBPROTOCOLS, codec_for
+from contract_analyzer import ContractAnalyzer
+from delta import SNAPSHOT_EVENTS
+from dispatcher import (DEFAULT_BURST, DEFAULT_MAX_IN_FLIGHT, DEFAULT_PROCESSES, DEFAULT_RATE, DEFAULT_THREADS, Dispatcher,
+                        RequestError)
+from event_log import EventLog
+from forecast import merge_fleet_inputs
+from handlers import register_handlers
+from history import merge_arbitrage_logs, merge_savings, merge_status_history
+from metrics import registry
+from shard import encode_frame, read_frame
+from subscriptions import SubscriptionIndex
+
+load_dotenv()
+
+WS_HOST = os.getenv("WS_HOST", "localhost")
+WS_PORT = int(os.getenv("WS_PORT", 8080))
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", 64))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "coalesce")
+WS_COMPRESSION = os.getenv("WS_COMPRESSION", "deflate")
+SIM_TICK_HZ = float(os.getenv("SIM_TICK_HZ", 1))
+EVENT_LOG_CAPACITY = int(os.getenv("EVENT_LOG_CAPACITY", 4096))
+WS_RATE_LIMIT = float(os.getenv("WS_RATE_LIMIT", DEFAULT_RATE))
+WS_RATE_BURST = int(os.getenv("WS_RATE_BURST", DEFAULT_BURST))
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+REQUEST_THREADS = int(os.getenv("REQUEST_THREADS", DEFAULT_THREADS))
+REQUEST_PROCESSES = int(os.getenv("REQUEST_PROCESSES", DEFAULT_PROCESSES))
+
+# Seconds between attempts to reach a shard that is not up yet or went away
+SHARD_RECONNECT_SECONDS = 1.0
+# A forwarded command or history query the shard has not answered by then fails
+SHARD_REQUEST_SECONDS = float(os.getenv("SHARD_REQUEST_SECONDS", 10))
+
+frames_received = registry.counter("gateway_shard_frames_total", "Frames received from shards")
+merge_seconds = registry.histogram("gateway_merge_seconds", "Time spent folding shard frames into the mirror")
+flush_seconds = registry.histogram("gateway_flush_seconds", "Time spent building and queueing each merged delta")
+shards_connected = registry.gauge("gateway_shards_connected", "Shards this gateway is receiving from")
+connected_clients = registry.gauge("ws_connected_clients", "Open WebSocket connections")
+
+
+class FleetMirror:
+    """
+    Gateway-side copy of every shard's trucks as wire dicts, with the FleetStore
+    lookups SubscriptionIndex needs (row, contract_ids, positions, to_dict).
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.positions = np.zeros((capacity, 2), dtype=np.float64)
+        self.trucks: List[Dict] = []
+        self.ids: List[str] = []
+        self.contract_ids: List[Optional[str]] = []
+        self.shard_of: List[int] = []
+        self.index: Dict[str, int] = {}
+        self.by_contract: Dict[str, List[int]] = {}
+
+    def row(self, truck_id: str) -> Optional[int]:
+        return self.index.get(truck_id)
+
+    def rows_for_contract(self, contract_id: str) -> List[int]:
+        return self.by_contract.get(contract_id, [])
+
+    def to_dict(self, row: int) -> Dict:
+        return self.trucks[row]
+
+    def to_dicts(self) -> List[Dict]:
+        return list(self.trucks)
+
+    def _add(self, truck: Dict, shard: int) -> int:
+        row = self.size
+        if row == len(self.positions):
+            grown = np.zeros((row * 2, 2), dtype=np.float64)
+            grown[:row] = self.positions
+            self.positions = grown
+        self.size += 1
+        self.trucks.append(dict(truck))
+        self.ids.append(truck["id"])
+        self.contract_ids.append(truck.get("contractId"))
+        self.shard_of.append(shard)
+        self.index[truck["id"]] = row
+        if truck.get("contractId"):
+            self.by_contract.setdefault(truck["contractId"], []).append(row)
+        self.positions[row] = truck["position"]
+        return row
+
+    def apply(self, shard: int, updates: List[Dict]):
+        """Fold truck updates (partial or whole) from one shard into the mirror"""
+        for update in updates:
+            row = self.index.get(update["id"])
+            if row is None:
+                self._add(update, shard)
+                continue
+            self.trucks[row].update(update)
+            if "position" in update:
+                self.positions[row] = update["position"]
+
+
+class ShardHistory:
+    """
+    FleetHistory's queries for the whole cluster: each shard answers for its own trucks and the answers
+    are merged. Called from request threads like FleetHistory's; the asking happens on the gateway's loop.
+    """
+
+    def __init__(self, gateway: "Gateway", loop: asyncio.AbstractEventLoop):
+        self.gateway = gateway
+        self.loop = loop
+
+    def _ask(self, query: str, *args, truck_id: Optional[str] = None) -> List:
+        async def ask_shards():
+            if truck_id is not None:
+                shards = [self.gateway._shard_for(truck_id)]
+                if shards[0] is None:
+                    return []
+            else:
+                shards = list(self.gateway.shards)
+                if not shards:
+                    raise RequestError("No shards connected")
+            return await asyncio.gather(*(
+                self.gateway.ask(shard, {"type": "history", "query": query, "args": list(args)}) for shard in shards
+            ))
+        return asyncio.run_coroutine_threadsafe(ask_shards(), self.loop).result()
+
+    def savings(self, start: float, end: float, bucket_seconds: float = 3600) -> Dict:
+        return merge_savings(self._ask("savings", start, end, bucket_seconds))
+
+    def status_history(self, start: float, end: float, bucket_seconds: float = 3600) -> Dict:
+        return merge_status_history(self._ask("status_history", start, end, bucket_seconds))
+
+    def arbitrage_log(self, limit: int = 50) -> List[Dict]:
+        return merge_arbitrage_logs(self._ask("arbitrage_log", limit), limit)
+
+    def track(self, truck_id: str, start: float, end: float) -> Optional[Dict]:
+        found = self._ask("track", truck_id, start, end, truck_id=truck_id)
+        return found[0] if found else None
+
+
+class Gateway:
+    """
+    WebSocket front end for a set of shards; several gateways can share one port. Client requests go
+    through the same Dispatcher and handlers as server.py: lookups are answered here, truck commands
+    by the owning shard, history queries by every shard.
+    """
+
+    def __init__(self, shard_paths: List[str]):
+        self.shard_paths = shard_paths
+        self.mirror = FleetMirror()
+        # Shard events are re-sequenced here so clients see one ordered stream
+        self.events = EventLog(EVENT_LOG_CAPACITY)
+        self.seq = 0
+        self._events_sent = 0
+        self._pending: Dict[str, Dict] = {}
+
+        self.shards: Dict[int, asyncio.StreamWriter] = {}
+        # Requests awaiting a shard's reply: request ID -> (shard, future)
+        self._requests: Dict[int, Tuple[int, asyncio.Future]] = {}
+        self._request_ids = itertools.count(1)
+        self._followers: List[asyncio.Task] = []
+        self.history: Optional[ShardHistory] = None
+
+        self.subscriptions = SubscriptionIndex()
+        self.clients = Broadcaster(self.client_snapshot, max_queue=WS_SEND_QUEUE, policy=WS_SLOW_CLIENT_POLICY)
+        self.analyzer = ContractAnalyzer(cache=AnalysisCache(path=None), seed_contracts=False)
+
+        self.dispatcher = Dispatcher(self.clients.send, WS_RATE_LIMIT, WS_RATE_BURST, WS_MAX_IN_FLIGHT,
+                                     REQUEST_THREADS, REQUEST_PROCESSES)
+        register_handlers(self.dispatcher, self)
+        self.dispatcher.handler("execute_arbitrage")(self.forward)
+        self.dispatcher.handler("reroute")(self.forward)
+        self.dispatcher.handler("telemetry")(self.forward_telemetry)
+
+    def start(self):
+        """Follow every shard; called on the gateway's event loop"""
+        self.history = ShardHistory(self, asyncio.get_running_loop())
+        self._followers = [asyncio.create_task(self.follow(path)) for path in self.shard_paths]
+
+    # ----- shard side -----
+
+    def _record_events(self, events: List[Dict]):
+        for event in events:
+            self.events.append(event["type"], event["message"], event.get("truckId"), event.get("severity", "info"),
+                               event.get("timestamp"))
+
+    async def follow(self, path: str):
+        """Stay connected to one shard, folding its frames into the mirror"""
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+            except (FileNotFoundError, ConnectionError):
+                await asyncio.sleep(SHARD_RECONNECT_SECONDS)
+                continue
+
+            index = None
+            try:
+                while True:
+                    frame = await read_frame(reader)
+                    frames_received.inc()
+                    with merge_seconds.time():
+                        index = self._receive(frame, writer, index)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                print(f"⚠️  Lost shard at {path}; reconnecting")
+            finally:
+                if index is not None:
+                    self.shards.pop(index, None)
+                    shards_connected.set(len(self.shards))
+                    self._fail_requests(index)
+                writer.close()
+            await asyncio.sleep(SHARD_RECONNECT_SECONDS)
+
+    def _fail_requests(self, shard: int):
+        """Answer every request still waiting on a shard that went away"""
+        for request_id, (owner, future) in list(self._requests.items()):
+            if owner == shard and not future.done():
+                future.set_exception(RequestError(f"Lost shard {shard}"))
+
+    def _receive(self, frame: Dict, writer: asyncio.StreamWriter, index: Optional[int]) -> Optional[int]:
+        msg_type = frame.get("type")
+
+        if msg_type == "hello":
+            index = frame["shard"]
+            self.shards[index] = writer
+            shards_connected.set(len(self.shards))
+            data = frame["snapshot"]["data"]
+            self._fold(index, data["trucks"])
+            self._record_events(data["events"])
+
+        elif msg_type == "state_delta":
+            data = frame["data"]
+            self._fold(frame["shard"], data["trucks"])
+            self._record_events(data["events"])
+
+        elif msg_type == "broadcast":
+            self.broadcast(frame["message"], frame.get("truckId"))
+
+        elif msg_type == "reply":
+            pending = self._requests.get(frame["requestId"])
+            if pending is not None and not pending[1].done():
+                pending[1].set_result(frame["message"])
+        return index
+
+    def _fold(self, shard: int, updates: List[Dict]):
+        self.mirror.apply(shard, updates)
+        for update in updates:
+            pending = self._pending.get(update["id"])
+            if pending is None:
+                self._pending[update["id"]] = dict(update)
+            else:
+                pending.update(update)
+
+    def _shard_for(self, truck_id: Optional[str]) -> Optional[int]:
+        row = self.mirror.row(truck_id)
+        return self.mirror.shard_of[row] if row is not None else None
+
+    async def ask(self, shard: int, data: Dict):
+        """Send a request to one shard and wait for its reply message; an error reply raises RequestError"""
+        writer = self.shards.get(shard)
+        if writer is None:
+            raise RequestError(f"Shard {shard} is not connected")
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = (shard, future)
+        writer.write(encode_frame({**data, "requestId": request_id, "timestamp": datetime.now().isoformat()}))
+        try:
+            reply = await asyncio.wait_for(future, SHARD_REQUEST_SECONDS)
+        except asyncio.TimeoutError:
+            raise RequestError(f"Shard {shard} did not answer within {SHARD_REQUEST_SECONDS:g}s")
+        finally:
+            self._requests.pop(request_id, None)
+        if isinstance(reply, dict) and reply.get("type") == "error":
+            raise RequestError(reply["message"])
+        return reply
+
+    async def forecast_input(self) -> Dict[str, list]:
+        """Every shard's trucks on a contract, for a forecast of the whole cluster"""
+        if not self.shards:
+            raise RequestError("No shards connected")
+        parts = await asyncio.gather(*(self.ask(shard, {"type": "forecast_input"}) for shard in list(self.shards)))
+        return merge_fleet_inputs(parts)
+
+    async def forward(self, data: Dict, websocket) -> Optional[Dict]:
+        """Send a client's truck command to the shard that owns the truck; returns the shard's reply"""
+        shard = self._shard_for(data.get("truckId"))
+        if shard is None:
+            raise RequestError(f"Unknown truck {data.get('truckId')}")
+        return await self.ask(shard, data)
+
+    async def forward_telemetry(self, data: Dict, websocket) -> Dict:
+        """Split a telemetry batch by owning shard and merge the shards' acknowledgements into one"""
+        try:
+            if "reports" in data:
+                groups: Dict[Optional[int], List] = {}
+                for report in data["reports"]:
+                    groups.setdefault(self._shard_for(report.get("truckId")), []).append(report)
+                parts = {shard: {"type": "telemetry", "reports": reports} for shard, reports in groups.items()}
+            else:
+                columns = ("truckIds", "positions", "velocities", "timestamps")
+                groups = {}
+                for i, truck_id in enumerate(data.get("truckIds") or []):
+                    groups.setdefault(self._shard_for(truck_id), []).append(i)
+                parts = {
+                    shard: {"type": "telemetry", **{
+                        column: [data[column][i] for i in indexes] for column in columns
+                        if data.get(column) is not None
+                    }}
+                    for shard, indexes in groups.items()
+                }
+        except (TypeError, IndexError, AttributeError) as e:
+            raise RequestError(f"Invalid telemetry: {e}")
+
+        live = [shard for shard in parts if shard in self.shards]
+        acks = await asyncio.gather(*(self.ask(shard, parts[shard]) for shard in live))
+        rejected: Dict[str, int] = {}
+        unknown = sum(len(part.get("reports") or part.get("truckIds") or [])
+                      for shard, part in parts.items() if shard not in self.shards)
+        if unknown:
+            rejected["unknown"] = unknown
+        for ack in acks:
+            for reason, count in ack["rejected"].items():
+                rejected[reason] = rejected.get(reason, 0) + count
+        return {"type": "telemetry_ack", "accepted": sum(ack["accepted"] for ack in acks), "rejected": rejected}
+
+    # ----- client side -----
+
+    def snapshot(self) -> Dict:
+        return {
+            "type": "initial_state",
+            "seq": self.seq,
+            "data": {
+                "trucks": self.mirror.to_dicts(),
+                "events": self.events.latest(SNAPSHOT_EVENTS, up_to=self._events_sent),
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+
+    def client_snapshot(self, websocket) -> Dict:
+        """Full state for one client, narrowed to its subscription if it has one"""
+        return self.subscriptions.filter_snapshot(websocket, self.snapshot(), self.mirror)
+
+    def delta(self) -> Dict:
+        """Every shard's changes since the last flush, merged into one state_delta"""
+        trucks = list(self._pending.values())
+        self._pending = {}
+        events = self.events.since(self._events_sent)
+        self._events_sent = events[-1]["seq"] if events else self._events_sent
+        self.seq += 1
+        return {
+            "type": "state_delta",
+            "seq": self.seq,
+            "baseSeq": self.seq - 1,
+            "data": {
+                "trucks": trucks,
+                "events": events,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+
+    def broadcast(self, message: Dict, truck_id: Optional[str] = None):
+        self.clients.publish(message, skip=self.subscriptions)
+        if truck_id and self.subscriptions.subscriptions:
+            self.clients.publish_to(
+                [ws for ws in self.subscriptions.subscriptions if self.subscriptions.wants(ws, truck_id)],
+                message
+            )
+
+    async def flush_loop(self):
+        """Send one merged delta per tick, on the same clock the shards run"""
+        async for _ in FixedTimestepClock(SIM_TICK_HZ).ticks():
+            with flush_seconds.time():
+                delta = self.delta()
+                routed = self.subscriptions.route_delta(delta, self.mirror)
+                self.clients.publish(delta, skip=self.subscriptions)
+                for websocket, message in routed.items():
+                    self.clients.send(websocket, message)
+
+    async def serve_http(self, path, request_headers):
+        if path == "/metrics":
+            connected_clients.set(len(self.clients))
+            return HTTPStatus.OK, [("Content-Type", "text/plain; version=0.0.4")], registry.render().encode()
+        return None
+
+    async def handle_client(self, websocket):
+        self.clients.add(websocket)
+        codec = codec_for(websocket.subprotocol)
+        try:
+            self.clients.send(websocket, self.client_snapshot(websocket))
+            async for message in websocket:
+                try:
+                    data = codec.decode(message)
+                except ValueError:
+                    self.clients.send(websocket, {"type": "error", "message": f"Invalid {codec.name} message"})
+                    continue
+                self.dispatcher.dispatch(websocket, data)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.clients.remove(websocket)
+            self.dispatcher.close(websocket)
+            self.subscriptions.unsubscribe(websocket)
+
+
+async def serve_gateway(index: int, shard_paths: List[str], host: str = WS_HOST, port: int = WS_PORT):
+    """Follow every shard and serve clients; reuse_port lets gateways share the listening port"""
+    gateway = Gateway(shard_paths)
+    gateway.start()
+
+    compression = None if WS_COMPRESSION == "none" else WS_COMPRESSION
+    async with websockets.serve(gateway.handle_client, host, port, compression=compression, reuse_port=True,
+                                subprotocols=SUBPROTOCOLS, process_request=gateway.serve_http):
+        print(f"📡 Gateway {index} (pid {os.getpid()}) listening on ws://{host}:{port}")
+        try:
+            await gateway.flush_loop()
+        finally:
+            gateway.dispatcher.shutdown()
+
+
+def run_gateway(index: int, shard_paths: List[str], host: str = WS_HOST, port: int = WS_PORT):
+    """Process entry point"""
+    try:
+        asyncio.run(serve_gateway(index, shard_paths, host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,148 @@
+"""
+Client Request Handlers
+The request types every WebSocket front end answers the same way, registered on its Dispatcher.
+server.py answers them from the simulation it runs; a cluster gateway from its mirror of the shards,
+with history queries merged from every shard. Truck commands (execute_arbitrage, reroute, telemetry)
+change a fleet, so each front end registers its own.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from dispatcher import THREAD, Dispatcher, RequestError
+from forecast import contract_terms, forecast
+from subscriptions import parse_bbox
+
+load_dotenv()
+
+FORECAST_MAX_TRIALS = int(os.getenv("FORECAST_MAX_TRIALS", 2000))
+
+
+def history_window(data: dict):
+    """The last N hours, and the bucket width in seconds, of a history query"""
+    end = time.time()
+    return end - float(data.get("hours", 24)) * 3600, end, float(data.get("bucketMinutes", 60)) * 60
+
+
+def register_handlers(dispatcher: Dispatcher, service):
+    """
+    Register the shared request types. service provides analyzer, subscriptions, events (an EventLog),
+    history (FleetHistory queries, called from request threads), client_snapshot(websocket) and
+    async forecast_input() (a fleet_input() of every truck); they are looked up per request, so they
+    may be built after registration.
+    """
+
+    @dispatcher.handler("request_contract", THREAD)
+    def request_contract(data: dict, websocket):
+        return {
+            "type": "contract_data",
+            "data": service.analyzer.get_contract(data.get("contractId"))
+        }
+
+    @dispatcher.handler("request_due_contracts", THREAD)
+    def request_due_contracts(data: dict, websocket):
+        # Contracts whose delivery deadline falls within the next N hours
+        hours = float(data.get("hours", 24))
+        limit = min(int(data.get("limit", 100)), 1000)
+
+        return {
+            "type": "due_contracts",
+            "hours": hours,
+            "data": service.analyzer.contracts.due_within(hours, limit)
+        }
+
+    @dispatcher.handler("request_events")
+    def request_events(data: dict, websocket):
+        # Event history: after a sequence number, or the latest for one truck or type
+        log = service.events
+        limit = min(int(data.get("limit", 100)), 1000)
+        if data.get("truckId"):
+            events = log.for_truck(data["truckId"], limit)
+        elif data.get("eventType"):
+            events = log.of_type(data["eventType"], limit)
+        else:
+            events = log.since(int(data.get("sinceSeq", 0)), limit)
+
+        return {
+            "type": "event_history",
+            "lastSeq": log.last_seq,
+            "data": service.subscriptions.filter_events(websocket, events)
+        }
+
+    @dispatcher.handler("request_savings_history", THREAD)
+    def request_savings_history(data: dict, websocket):
+        return {
+            "type": "savings_history",
+            **service.history.savings(*history_window(data))
+        }
+
+    @dispatcher.handler("request_status_history", THREAD)
+    def request_status_history(data: dict, websocket):
+        return {
+            "type": "status_history",
+            **service.history.status_history(*history_window(data))
+        }
+
+    @dispatcher.handler("request_arbitrage_history", THREAD)
+    def request_arbitrage_history(data: dict, websocket):
+        return {
+            "type": "arbitrage_history",
+            "data": service.history.arbitrage_log(min(int(data.get("limit", 50)), 1000))
+        }
+
+    @dispatcher.handler("request_truck_track", THREAD)
+    def request_truck_track(data: dict, websocket):
+        start, end, _ = history_window(data)
+        track = service.history.track(data.get("truckId"), start, end)
+        if track is None:
+            raise RequestError(f"No history for truck {data.get('truckId')}")
+
+        return {
+            "type": "truck_track",
+            **track
+        }
+
+    @dispatcher.handler("request_forecast")
+    async def request_forecast(data: dict, websocket):
+        # Penalty exposure of the fleet as it is now, from fresh Monte Carlo trials. The snapshot is
+        # taken on the loop; the trials are seconds of CPU, kept off the simulation's core.
+        trials = min(int(data.get("trials", 200)), FORECAST_MAX_TRIALS)
+        seed, step_minutes = int(data.get("seed", 0)), float(data.get("stepMinutes", 5.0))
+        fleet = await service.forecast_input()
+        terms = await asyncio.to_thread(contract_terms, service.analyzer.contracts, fleet["contractIds"])
+
+        return {
+            "type": "forecast",
+            "data": await dispatcher.run_in_process(forecast, trials, seed, step_minutes, 1, 250, fleet, terms)
+        }
+
+    @dispatcher.handler("resync")
+    def resync(data: dict, websocket):
+        # Client saw a gap in state_delta sequence numbers
+        return service.client_snapshot(websocket)
+
+    @dispatcher.handler("subscribe")
+    def subscribe(data: dict, websocket):
+        try:
+            bbox = parse_bbox(data.get("bbox"))
+        except (TypeError, ValueError) as e:
+            raise RequestError(f"Invalid subscription: {e}")
+
+        service.subscriptions.subscribe(websocket, data.get("truckIds") or [], data.get("contractIds") or [], bbox)
+        return service.client_snapshot(websocket)
+
+    @dispatcher.handler("unsubscribe")
+    def unsubscribe(data: dict, websocket):
+        service.subscriptions.unsubscribe(websocket)
+        return service.client_snapshot(websocket)
+
+    @dispatcher.handler("ping")
+    def ping(data: dict, websocket):
+        return {
+            "type": "pong",
+            "timestamp": datetime.now().isoformat()
+        }
@@ -0,0 +1,551 @@
+"""
+Fleet History
+Memory-mapped columnar time series of positions, status changes and arbitrage for the analytics pages
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fleet_store import CHANGED_ADDED, CHANGED_STATUS, STATUSES, FleetChanges, FleetStore
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history")
+
+# Positions are rolled up per truck every minute, and the minutes again per hour
+ROLLUP_SECONDS = 60
+COARSE_ROLLUP_SECONDS = 3600
+
+# A segment is sealed when it holds this many rows or spans this many seconds, whichever comes first
+SEGMENT_ROWS = 1 << 20
+SEGMENT_SECONDS = 24 * 3600
+# Series written in fixed-size batches on a cadence size their segments to one segment's worth of batches;
+# event series (transitions, arbitrage) use this size
+EVENT_SEGMENT_ROWS = 1 << 16
+
+# Per-minute positions are the bulk of the data and are kept for less time than everything else
+DETAIL_RETENTION_DAYS = 7
+RETENTION_DAYS = 90
+
+# Truck tracks over longer windows come from the hourly rollup, which scans 60x fewer rows
+DETAIL_TRACK_SECONDS = 6 * 3600
+
+# Upper bound on the buckets one aggregate query returns; larger windows get wider buckets
+MAX_BUCKETS = 2000
+
+POSITION_COLUMNS = {"t": "<f8", "truck": "<i4", "lon": "<f4", "lat": "<f4", "velocity": "<f4", "status": "i1"}
+STATUS_COUNT_COLUMNS = {"t": "<f8", **{status: "<i4" for status in STATUSES}}
+TRANSITION_COLUMNS = {"t": "<f8", "truck": "<i4", "status": "i1", "previous": "i1"}
+ARBITRAGE_COLUMNS = {"t": "<f8", "truck": "<i4", "contract": "<i4", "kind": "i1",
+                     "penalty": "<f8", "cost": "<f8", "savings": "<f8"}
+
+# Arbitrage row kinds
+OFFERED = 0
+EXECUTED = 1
+ARBITRAGE_KINDS = ("offered", "executed")
+
+
+class Segment:
+    """Fixed-size block of rows, one array per column; memory-mapped .npy files when it has a directory"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], first_t: float, path: Optional[str] = None):
+        self.columns = columns
+        self.first_t = first_t
+        self.path = path
+        t = columns["t"]
+        # Timestamps are written last and are never 0, so the first 0 marks the end of complete rows
+        empty = np.flatnonzero(t == 0)
+        self.count = int(empty[0]) if len(empty) else len(t)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.columns["t"])
+
+    @property
+    def last_t(self) -> float:
+        return float(self.columns["t"][self.count - 1]) if self.count else self.first_t
+
+    def flush(self):
+        for column in self.columns.values():
+            if isinstance(column, np.memmap):
+                column.flush()
+
+
+class TimeSeries:
+    """Append-only time series in fixed-size segments of one .npy column file each; in memory without a directory"""
+
+    def __init__(self, columns: Dict[str, str], directory: Optional[str] = None, segment_rows: int = SEGMENT_ROWS,
+                 segment_seconds: float = SEGMENT_SECONDS, retention_seconds: float = RETENTION_DAYS * 86400,
+                 cadence: Optional[float] = None):
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self.retention_seconds = retention_seconds
+        self.cadence = cadence
+        self.segments: List[Segment] = []
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._retired: List[Segment] = []
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            for name in sorted(os.listdir(directory)):
+                if name.isdigit():
+                    self.segments.append(self._open(os.path.join(directory, name), int(name) / 1000))
+            self.segments = [segment for segment in self.segments if segment.count]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(segment.count for segment in self.segments)
+
+    @contextmanager
+    def _snapshot(self) -> Iterator[List[Tuple[Segment, int]]]:
+        """The segments and their complete row counts as of now, kept on disk until the query is done"""
+        with self._lock:
+            self._readers += 1
+            segments = [(segment, segment.count) for segment in self.segments]
+        try:
+            yield segments
+        finally:
+            with self._lock:
+                self._readers -= 1
+                retired = self._retired if not self._readers else []
+                if retired:
+                    self._retired = []
+            for segment in retired:
+                shutil.rmtree(segment.path, ignore_errors=True)
+
+    def _open(self, path: str, first_t: float) -> Segment:
+        columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r+", allow_pickle=False)
+            for name in self.dtypes
+        }
+        return Segment(columns, first_t, path)
+
+    def _new_segment(self, first_t: float, batch: int) -> Segment:
+        rows = self.segment_rows
+        if self.cadence:
+            rows = min(rows, batch * int(np.ceil(self.segment_seconds / self.cadence)))
+        if not self.directory:
+            columns = {name: np.zeros(rows, dtype=dtype) for name, dtype in self.dtypes.items()}
+            return Segment(columns, first_t)
+
+        path = os.path.join(self.directory, f"{int(first_t * 1000):015d}")
+        os.makedirs(path, exist_ok=True)
+        # Preallocated files are sparse until written
+        columns = {
+            name: np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype,
+                                            shape=(rows,))
+            for name, dtype in self.dtypes.items()
+        }
+        return Segment(columns, first_t, path)
+
+    def append(self, t, **columns):
+        """Append rows; t is one timestamp for the whole batch or one per row, never earlier than the last row"""
+        count = len(next(iter(columns.values())))
+        if not count:
+            return
+        t = np.broadcast_to(np.asarray(t, dtype=np.float64), (count,))
+
+        done = 0
+        while done < count:
+            segment = self.segments[-1] if self.segments else None
+            if (segment is None or segment.count == segment.capacity
+                    or t[done] - segment.first_t >= self.segment_seconds):
+                if segment is not None:
+                    segment.flush()
+                segment = self._new_segment(float(t[done]), count)
+                with self._lock:
+                    self.segments.append(segment)
+
+            take = min(count - done, segment.capacity - segment.count)
+            rows = slice(segment.count, segment.count + take)
+            for name, values in columns.items():
+                segment.columns[name][rows] = values[done:done + take]
+            # Timestamps last: a crash mid-append leaves the rows unreadable rather than half-written
+            segment.columns["t"][rows] = t[done:done + take]
+            with self._lock:
+                segment.count += take
+            done += take
+
+    def range(self, start: float, end: float, columns: Optional[Sequence[str]] = None,
+              equal: Optional[Tuple[str, int]] = None) -> Dict[str, np.ndarray]:
+        """Rows with start <= t < end, as one array per column; equal=(column, value) keeps only matching rows"""
+        names = list(columns or self.dtypes)
+        if "t" not in names:
+            names.append("t")
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        with self._snapshot() as segments:
+            for segment, count in segments:
+                if not count or segment.first_t >= end:
+                    continue
+                t = segment.columns["t"][:count]
+                if t[-1] < start:
+                    continue
+                lo, hi = np.searchsorted(t, [start, end], side="left")
+                rows = slice(lo, hi)
+                if equal is not None:
+                    rows = lo + np.flatnonzero(segment.columns[equal[0]][lo:hi] == equal[1])
+                for name in names:
+                    parts[name].append(segment.columns[name][rows])
+            # Copied out before the snapshot closes and expired segments can be deleted
+            return {
+                name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=self.dtypes[name])
+                for name, chunks in parts.items()
+            }
+
+    def latest(self, limit: int) -> Dict[str, np.ndarray]:
+        """The last limit rows, oldest first"""
+        parts: List[Dict[str, np.ndarray]] = []
+        remaining = limit
+        with self._snapshot() as segments:
+            for segment, count in reversed(segments):
+                if remaining <= 0:
+                    break
+                take = min(remaining, count)
+                parts.append({name: column[count - take:count] for name, column in segment.columns.items()})
+                remaining -= take
+            return {
+                name: np.concatenate([part[name] for part in reversed(parts)]) if parts
+                else np.zeros(0, dtype=dtype)
+                for name, dtype in self.dtypes.items()
+            }
+
+    def expire(self, now: float):
+        """Drop whole segments whose newest row is past retention"""
+        while len(self.segments) > 1 and self.segments[0].last_t < now - self.retention_seconds:
+            with self._lock:
+                segment = self.segments.pop(0)
+                if segment.path and self._readers:
+                    # A query may still be reading its files
+                    self._retired.append(segment)
+                    continue
+            if segment.path:
+                shutil.rmtree(segment.path, ignore_errors=True)
+
+    def flush(self):
+        if self.segments:
+            self.segments[-1].flush()
+
+
+class StringTable:
+    """Truck and contract IDs interned as int32 codes; new strings are appended to a JSON-lines file"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.strings: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self._file = None
+        if path:
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.endswith("\n"):  # a torn final line from a crash is skipped
+                            self._intern(json.loads(line))
+            self._file = open(path, "a", encoding="utf-8")
+
+    def _intern(self, string: str) -> int:
+        code = self.codes[string] = len(self.strings)
+        self.strings.append(string)
+        return code
+
+    def code(self, string: Optional[str]) -> int:
+        """Code for a string, -1 for None"""
+        if string is None:
+            return -1
+        code = self.codes.get(string)
+        if code is None:
+            code = self._intern(string)
+            if self._file:
+                self._file.write(json.dumps(string) + "\n")
+                self._file.flush()
+        return code
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.strings[code] if code >= 0 else None
+
+
+def _iso(t: float) -> str:
+    return datetime.fromtimestamp(t).isoformat()
+
+
+def _buckets(start: float, end: float, bucket_seconds: float) -> Tuple[float, float, int]:
+    """Start, width and count of at most MAX_BUCKETS aligned buckets covering [start, end)"""
+    bucket_seconds = float(max(bucket_seconds, np.ceil((end - start) / MAX_BUCKETS), 1))
+    start -= start % bucket_seconds
+    return start, bucket_seconds, max(1, int(np.ceil((end - start) / bucket_seconds)))
+
+
+class FleetHistory:
+    """Per-minute positions and status counts, status transitions and arbitrage outcomes for one fleet"""
+
+    def __init__(self, directory: Optional[str] = None, detail_retention_days: float = DETAIL_RETENTION_DAYS,
+                 retention_days: float = RETENTION_DAYS, segment_rows: int = SEGMENT_ROWS):
+        def series(name: str, columns: Dict[str, str], days: float, cadence: Optional[float] = None) -> TimeSeries:
+            return TimeSeries(columns, os.path.join(directory, name) if directory else None,
+                              segment_rows=segment_rows if cadence else min(segment_rows, EVENT_SEGMENT_ROWS),
+                              retention_seconds=days * 86400, cadence=cadence)
+
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.strings = StringTable(os.path.join(directory, "strings.jsonl") if directory else None)
+        self.positions = series("positions-1m", POSITION_COLUMNS, detail_retention_days, ROLLUP_SECONDS)
+        self.hourly = series("positions-1h", POSITION_COLUMNS, retention_days, COARSE_ROLLUP_SECONDS)
+        self.status_counts = series("status-counts", STATUS_COUNT_COLUMNS, retention_days, ROLLUP_SECONDS)
+        self.transitions = series("transitions", TRANSITION_COLUMNS, retention_days)
+        self.arbitrage = series("arbitrage", ARBITRAGE_COLUMNS, retention_days)
+
+        # Per fleet row: truck code, last recorded status, and speed sums for the open minute and hour
+        self._codes = np.zeros(0, dtype=np.int32)
+        self._status = np.zeros(0, dtype=np.int8)
+        self._velocity_sum = np.zeros(0, dtype=np.float64)
+        self._samples = np.zeros(0, dtype=np.int32)
+        self._hour_velocity_sum = np.zeros(0, dtype=np.float64)
+        self._hour_minutes = np.zeros(0, dtype=np.int32)
+        self._minute: Optional[float] = None
+        self._status_rows: List[np.ndarray] = []
+        # Latest offer per truck, so an execution records what it saved
+        self._offers: Dict[str, Tuple[int, float, float, float]] = {}
+
+    def watch(self, simulator):
+        """Follow a simulator's change feed for status transitions"""
+        simulator.on_change(self._on_change)
+        self._sync(simulator.fleet)
+
+    def _on_change(self, changes: FleetChanges):
+        self._status_rows.append(changes.rows_with(CHANGED_STATUS | CHANGED_ADDED))
+
+    def _sync(self, fleet: FleetStore):
+        """Extend the per-row arrays to trucks added since the last tick"""
+        known, n = len(self._codes), fleet.size
+        if n <= known:
+            return
+        self._codes = np.concatenate((self._codes, [self.strings.code(fleet.ids[row]) for row in range(known, n)]))
+        self._codes = self._codes.astype(np.int32)
+        self._status = np.concatenate((self._status, fleet.status[known:n]))
+        self._velocity_sum = np.concatenate((self._velocity_sum, np.zeros(n - known)))
+        self._samples = np.concatenate((self._samples, np.zeros(n - known, dtype=np.int32)))
+        self._hour_velocity_sum = np.concatenate((self._hour_velocity_sum, np.zeros(n - known)))
+        self._hour_minutes = np.concatenate((self._hour_minutes, np.zeros(n - known, dtype=np.int32)))
+
+    def record_tick(self, fleet: FleetStore, now: Optional[float] = None):
+        """Record status transitions from the change feed and fold this tick into the minute's rollup"""
+        now = time.time() if now is None else now
+        known = len(self._codes)
+        self._sync(fleet)
+        n = fleet.size
+
+        if self._status_rows:
+            rows = np.unique(np.concatenate(self._status_rows))
+            self._status_rows = []
+            rows = rows[rows < known]  # trucks new this tick start from their current status
+            status = fleet.status[rows]
+            moved = status != self._status[rows]
+            if moved.any():
+                self.transitions.append(now, truck=self._codes[rows[moved]], status=status[moved],
+                                        previous=self._status[rows[moved]])
+                self._status[rows] = status
+
+        minute = now - now % ROLLUP_SECONDS
+        if self._minute is not None and minute > self._minute:
+            self._close_minute(fleet, now)
+        self._minute = minute
+        self._velocity_sum[:n] += fleet.velocity[:n]
+        self._samples[:n] += 1
+
+    def _close_minute(self, fleet: FleetStore, now: float):
+        """Write the finished minute: one row per truck, plus the fleet's status counts"""
+        n = fleet.size
+        seen = self._samples[:n] > 0
+        velocity = np.divide(self._velocity_sum[:n], self._samples[:n], out=np.zeros(n), where=seen)
+        status = fleet.status[:n]
+        self.positions.append(self._minute, truck=self._codes[:n], lon=fleet.positions[:n, 0],
+                              lat=fleet.positions[:n, 1], velocity=velocity, status=status)
+        counts = np.bincount(status, minlength=len(STATUSES))
+        self.status_counts.append(self._minute, **{name: counts[code:code + 1] for code, name in enumerate(STATUSES)})
+        self._hour_velocity_sum[:n] += velocity
+        self._hour_minutes[:n] += seen
+        self._velocity_sum[:n] = 0
+        self._samples[:n] = 0
+
+        hour = self._minute - self._minute % COARSE_ROLLUP_SECONDS
+        if now - now % COARSE_ROLLUP_SECONDS > hour:
+            self._close_hour(fleet, hour)
+            for series in (self.positions, self.hourly, self.status_counts, self.transitions, self.arbitrage):
+                series.expire(now)
+
+    def _close_hour(self, fleet: FleetStore, hour: float):
+        """Roll the hour's minutes up per truck: mean speed, last position and status"""
+        n = fleet.size
+        seen = self._hour_minutes[:n] > 0
+        velocity = np.divide(self._hour_velocity_sum[:n], self._hour_minutes[:n], out=np.zeros(n), where=seen)
+        self.hourly.append(hour, truck=self._codes[:n], lon=fleet.positions[:n, 0], lat=fleet.positions[:n, 1],
+                           velocity=velocity, status=fleet.status[:n])
+        self._hour_velocity_sum[:n] = 0
+        self._hour_minutes[:n] = 0
+
+    def record_arbitrage(self, opportunities: List[Dict], now: Optional[float] = None):
+        """Record the opportunities one scan offered"""
+        if not opportunities:
+            return
+        now = time.time() if now is None else now
+        trucks, contracts, penalty, cost, savings = [], [], [], [], []
+        for arbitrage in opportunities:
+            offer = (self.strings.code(arbitrage.get("contractId")), float(arbitrage["projectedPenalty"]),
+                     float(arbitrage["solutionCost"]), float(arbitrage["netSavings"]))
+            self._offers[arbitrage["truckId"]] = offer
+            trucks.append(self.strings.code(arbitrage["truckId"]))
+            for column, value in zip((contracts, penalty, cost, savings), offer):
+                column.append(value)
+        self.arbitrage.append(now, truck=np.array(trucks), contract=np.array(contracts),
+                              kind=np.full(len(trucks), OFFERED), penalty=np.array(penalty),
+                              cost=np.array(cost), savings=np.array(savings))
+
+    def record_execution(self, truck_id: str, now: Optional[float] = None):
+        """Record an executed arbitrage with the savings of the truck's latest offer"""
+        contract, penalty, cost, savings = self._offers.pop(truck_id, (-1, 0.0, 0.0, 0.0))
+        self.arbitrage.append(time.time() if now is None else now, truck=np.array([self.strings.code(truck_id)]),
+                              contract=np.array([contract]), kind=np.array([EXECUTED]), penalty=np.array([penalty]),
+                              cost=np.array([cost]), savings=np.array([savings]))
+
+    def flush(self):
+        for series in (self.positions, self.hourly, self.status_counts, self.transitions, self.arbitrage):
+            series.flush()
+
+    # Queries; every window is [start, end) in epoch seconds
+
+    def savings(self, start: float, end: float, bucket_seconds: float = 3600) -> Dict:
+        """Offered and executed arbitrage per bucket: counts, savings and the penalties at stake"""
+        start, bucket_seconds, count = _buckets(start, end, bucket_seconds)
+        rows = self.arbitrage.range(start, end, ("kind", "penalty", "savings"))
+        bucket = ((rows["t"] - start) // bucket_seconds).astype(np.int64)
+        executed = rows["kind"] == EXECUTED
+
+        def total(mask, weights=None):
+            return np.bincount(bucket[mask], weights=None if weights is None else weights[mask], minlength=count)
+
+        offers, done = total(~executed), total(executed)
+        potential, realized = total(~executed, rows["savings"]), total(executed, rows["savings"])
+        at_stake, avoided = total(~executed, rows["penalty"]), total(executed, rows["penalty"])
+        return {
+            "bucketSeconds": bucket_seconds,
+            "totals": {"offers": int(offers.sum()), "executed": int(done.sum()),
+                       "savings": round(float(realized.sum()), 2), "penaltiesAvoided": round(float(avoided.sum()), 2)},
+            "buckets": [
+                {
+                    "start": _iso(start + i * bucket_seconds),
+                    "offers": int(offers[i]),
+                    "executed": int(done[i]),
+                    "potentialSavings": round(float(potential[i]), 2),
+                    "savings": round(float(realized[i]), 2),
+                    "penaltiesAtStake": round(float(at_stake[i]), 2),
+                    "penaltiesAvoided": round(float(avoided[i]), 2)
+                }
+                for i in range(count)
+            ]
+        }
+
+    def status_history(self, start: float, end: float, bucket_seconds: float = 3600) -> Dict:
+        """Trucks in each status at the end of every bucket, and how many entered each status during it"""
+        start, bucket_seconds, count = _buckets(start, end, bucket_seconds)
+        samples = self.status_counts.range(start, end)
+        bucket = ((samples["t"] - start) // bucket_seconds).astype(np.int64)
+        # Last sample in each bucket that has one
+        filled, last = np.unique(bucket[::-1], return_index=True)
+        last = len(bucket) - 1 - last
+
+        changes = self.transitions.range(start, end, ("status",))
+        changed_bucket = ((changes["t"] - start) // bucket_seconds).astype(np.int64)
+        entered = np.zeros((count, len(STATUSES)), dtype=np.int64)
+        np.add.at(entered, (changed_bucket, changes["status"].astype(np.int64)), 1)
+
+        counts = np.full((count, len(STATUSES)), -1, dtype=np.int64)
+        for code, status in enumerate(STATUSES):
+            counts[filled, code] = samples[status][last]
+        return {
+            "bucketSeconds": bucket_seconds,
+            "buckets": [
+                {
+                    "start": _iso(start + i * bucket_seconds),
+                    # None when no minute closed in the bucket (the server was not running)
+                    "counts": dict(zip(STATUSES, counts[i].tolist())) if counts[i, 0] >= 0 else None,
+                    "entered": dict(zip(STATUSES, entered[i].tolist()))
+                }
+                for i in range(count)
+            ]
+        }
+
+    def arbitrage_log(self, limit: int = 50) -> List[Dict]:
+        """Most recent arbitrage offers and executions, newest first"""
+        rows = self.arbitrage.latest(limit)
+        return [
+            {
+                "timestamp": _iso(t),
+                "truckId": self.strings.decode(truck),
+                "contractId": self.strings.decode(contract),
+                "kind": ARBITRAGE_KINDS[kind],
+                "projectedPenalty": round(penalty, 2),
+                "solutionCost": round(cost, 2),
+                "netSavings": round(savings, 2)
+            }
+            for t, truck, contract, kind, penalty, cost, savings in reversed(list(zip(
+                rows["t"].tolist(), rows["truck"].tolist(), rows["contract"].tolist(), rows["kind"].tolist(),
+                rows["penalty"].tolist(), rows["cost"].tolist(), rows["savings"].tolist()
+            )))
+        ]
+
+    def track(self, truck_id: str, start: float, end: float) -> Optional[Dict]:
+        """A truck's rolled-up positions; longer windows, or ones past the detail retention, use hours"""
+        code = self.strings.codes.get(truck_id)
+        if code is None:
+            return None
+        coarse = end - start > DETAIL_TRACK_SECONDS or start < time.time() - self.positions.retention_seconds
+        rows = (self.hourly if coarse else self.positions).range(start, end, equal=("truck", code))
+        return {
+            "truckId": truck_id,
+            "resolutionSeconds": COARSE_ROLLUP_SECONDS if coarse else ROLLUP_SECONDS,
+            "timestamps": [_iso(t) for t in rows["t"].tolist()],
+            "path": np.column_stack((rows["lon"], rows["lat"])).astype(np.float64).round(6).tolist(),
+            "velocity": rows["velocity"].round(1).tolist(),
+            "status": [STATUSES[status] for status in rows["status"].tolist()]
+        }
+
+
+# Merging the same query answered by several shards' histories; every shard buckets one window alike
+
+def merge_savings(parts: List[Dict]) -> Dict:
+    """Sum offers, executions, savings and penalties bucket by bucket"""
+    merged = {"bucketSeconds": parts[0]["bucketSeconds"], "totals": {}, "buckets": []}
+    for key in parts[0]["totals"]:
+        merged["totals"][key] = round(sum(part["totals"][key] for part in parts), 2)
+    for buckets in zip(*(part["buckets"] for part in parts)):
+        merged["buckets"].append({
+            key: buckets[0][key] if key == "start" else round(sum(bucket[key] for bucket in buckets), 2)
+            for key in buckets[0]
+        })
+    return merged
+
+
+def merge_status_history(parts: List[Dict]) -> Dict:
+    """Sum status counts and entries bucket by bucket; counts stay None only where no shard had a sample"""
+    merged = {"bucketSeconds": parts[0]["bucketSeconds"], "buckets": []}
+    for buckets in zip(*(part["buckets"] for part in parts)):
+        sampled = [bucket["counts"] for bucket in buckets if bucket["counts"] is not None]
+        merged["buckets"].append({
+            "start": buckets[0]["start"],
+            "counts": {status: sum(counts[status] for counts in sampled) for status in STATUSES} if sampled else None,
+            "entered": {status: sum(bucket["entered"][status] for bucket in buckets) for status in STATUSES}
+        })
+    return merged
+
+
+def merge_arbitrage_logs(parts: List[List[Dict]], limit: int) -> List[Dict]:
+    """The newest limit entries across every log, newest first"""
+    return sorted((entry for part in parts for entry in part), key=lambda entry: entry["timestamp"],
+                  reverse=True)[:limit]
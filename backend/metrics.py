@@ -0,0 +1,139 @@
+"""
+Lightweight Metrics
+Counters, gauges and fixed-bucket histograms rendered in Prometheus text format
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond phases up to a badly overrun 1 s tick
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+class Counter:
+    """Monotonic count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labels)} {self.value}"]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram with running sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the wall time spent inside the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound containing the q-th observation (inf if beyond the last bucket)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = []
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            lines.append(f"{self.name}_bucket{_labels({**self.labels, 'le': str(bound)})} {running}")
+        lines.append(f"{self.name}_bucket{_labels({**self.labels, 'le': '+Inf'})} {self.count}")
+        lines.append(f"{self.name}_sum{_labels(self.labels)} {self.sum}")
+        lines.append(f"{self.name}_count{_labels(self.labels)} {self.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders the /metrics page"""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Tuple], object] = {}
+
+    def _get(self, cls, name: str, help_text: str, labels: Optional[Dict[str, str]], **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = cls(name, help_text, labels, **kwargs)
+            self._metrics[key] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        described = set()
+        # Series sharing a name must be adjacent in the exposition format
+        for (name, _), metric in sorted(self._metrics.items(), key=lambda item: item[0][0]):
+            if name not in described:
+                lines.append(f"# HELP {name} {metric.help_text}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                described.add(name)
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by server.py
+registry = MetricsRegistry()
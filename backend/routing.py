@@ -0,0 +1,368 @@
+"""
+Road-Network Routing
+Shortest and fastest paths over a local road graph, with routes cached by (origin cell, destination cell)
+
+Usage:
+    python routing.py convert extract.json data/roads/region.npz   # Overpass JSON export -> compact graph
+"""
+
+import heapq
+import json
+import math
+import os
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spatial_index import EARTH_RADIUS_KM, SpatialGrid, haversine_km
+
+DEFAULT_ROAD_GRAPH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "roads", "india_highways.json")
+
+# Routes are cached per pair of ~11 km cells
+ROUTE_CELL_DEGREES = 0.1
+ROUTE_CACHE_SIZE = 65536
+
+# Waypoints per generated route, matching the interpolated routes trucks used before
+ROUTE_WAYPOINTS = 21
+
+# Speed assumed between a point and the road node it snaps to
+LOCAL_ROAD_SPEED_KMH = 40.0
+
+# Road nodes this close to a stalled truck are treated as blocked when rerouting
+AVOID_RADIUS_KM = 15.0
+
+# Fallback speeds for OSM ways without a usable maxspeed tag
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 80, "trunk": 70, "primary": 60, "secondary": 50, "tertiary": 40,
+    "motorway_link": 50, "trunk_link": 45, "primary_link": 40, "unclassified": 30, "residential": 25
+}
+
+# Node IDs along a path, plus the km and hours of each edge between them
+CachedPath = Tuple[Tuple[int, ...], Tuple[float, ...], Tuple[float, ...]]
+
+
+def resample(coords: np.ndarray, count: int) -> np.ndarray:
+    """Evenly spaced points along a polyline, by great-circle distance"""
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) == 1:
+        return np.repeat(coords, count, axis=0)
+    legs = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    along = np.concatenate(([0.0], np.cumsum(legs)))
+    if along[-1] == 0:
+        return np.repeat(coords[:1], count, axis=0)
+    targets = np.linspace(0.0, along[-1], count)
+    return np.column_stack((np.interp(targets, along, coords[:, 0]), np.interp(targets, along, coords[:, 1])))
+
+
+class RoadGraph:
+    """Directed road graph in CSR form: node i's edges are targets[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, nodes: np.ndarray, edges: np.ndarray, speeds_kmh: np.ndarray,
+                 names: Optional[List[str]] = None):
+        self.nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 2)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        speeds = np.asarray(speeds_kmh, dtype=np.float64)
+        self.names = names
+
+        order = np.argsort(edges[:, 0], kind="stable")
+        edges, speeds = edges[order], speeds[order]
+        self.offsets = np.searchsorted(edges[:, 0], np.arange(len(self.nodes) + 1))
+        self.targets = edges[:, 1]
+        start, end = self.nodes[edges[:, 0]], self.nodes[edges[:, 1]]
+        self.length_km = haversine_km(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+        self.hours = self.length_km / speeds
+        self.max_speed_kmh = float(speeds.max()) if len(speeds) else LOCAL_ROAD_SPEED_KMH
+
+        # Python lists are much faster than array indexing in the search loop
+        self._targets = self.targets.tolist()
+        self._offsets = self.offsets.tolist()
+        self._radians = np.radians(self.nodes).tolist()
+
+        self.spatial = SpatialGrid(cell_degrees=0.5, capacity=len(self.nodes))
+        self.spatial.update_many(range(len(self.nodes)), self.nodes)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """Load a graph saved by save() (.npz) or a named-node JSON file like data/roads/india_highways.json"""
+        if path.endswith(".npz"):
+            data = np.load(path, allow_pickle=False)
+            names = data["names"].tolist() if "names" in data else None
+            return cls(data["nodes"], data["edges"], data["speeds"], names)
+
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        names = list(data["nodes"])
+        index = {name: i for i, name in enumerate(names)}
+        edges, speeds = [], []
+        for a, b, speed in data["edges"]:
+            # Highways in the JSON format are two-way
+            edges += [(index[a], index[b]), (index[b], index[a])]
+            speeds += [speed, speed]
+        return cls(np.array([data["nodes"][name] for name in names]), np.array(edges), np.array(speeds), names)
+
+    @classmethod
+    def from_overpass(cls, path: str) -> "RoadGraph":
+        """Convert an Overpass API JSON export (nodes plus highway ways) into a graph"""
+        with open(path, encoding="utf-8") as f:
+            elements = json.load(f)["elements"]
+
+        positions = {e["id"]: (e["lon"], e["lat"]) for e in elements if e["type"] == "node"}
+        index: Dict[int, int] = {}
+        edges, speeds = [], []
+        for way in elements:
+            tags = way.get("tags", {})
+            if way["type"] != "way" or tags.get("highway") not in HIGHWAY_SPEEDS_KMH:
+                continue
+            speed = HIGHWAY_SPEEDS_KMH[tags["highway"]]
+            if str(tags.get("maxspeed", "")).isdigit():
+                speed = int(tags["maxspeed"])
+            refs = [ref for ref in way["nodes"] if ref in positions]
+            for a, b in zip(refs, refs[1:]):
+                a, b = index.setdefault(a, len(index)), index.setdefault(b, len(index))
+                edges.append((a, b))
+                speeds.append(speed)
+                if tags.get("oneway") != "yes":
+                    edges.append((b, a))
+                    speeds.append(speed)
+
+        nodes = np.zeros((len(index), 2))
+        for osm_id, i in index.items():
+            nodes[i] = positions[osm_id]
+        return cls(nodes, np.array(edges), np.array(speeds))
+
+    def save(self, path: str):
+        edges = np.column_stack((np.repeat(np.arange(len(self.nodes)), np.diff(self.offsets)), self.targets))
+        arrays = {"nodes": self.nodes, "edges": edges, "speeds": self.length_km / self.hours}
+        if self.names:
+            arrays["names"] = np.array(self.names)
+        np.savez_compressed(path, **arrays)
+
+    def snap(self, lon: float, lat: float) -> Optional[int]:
+        """Nearest road node to a point"""
+        found = self.spatial.nearest(lon, lat)
+        return found[0][0] if found else None
+
+    def snap_many(self, positions: np.ndarray) -> np.ndarray:
+        """Nearest road node to each point; -1 where the graph has none"""
+        snapped = (self.snap(lon, lat) for lon, lat in positions.tolist())
+        return np.array([-1 if node is None else node for node in snapped], dtype=np.int64)
+
+
+class Router:
+    """A* over a RoadGraph with an LRU cache of node paths keyed by origin and destination cells"""
+
+    def __init__(self, graph: RoadGraph, weight: str = "time", cell_degrees: float = ROUTE_CELL_DEGREES,
+                 cache_size: int = ROUTE_CACHE_SIZE):
+        if weight not in ("time", "distance"):
+            raise ValueError(f"Unknown route weight: {weight}")
+        self.graph = graph
+        self.weight = weight
+        self.cell_degrees = cell_degrees
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[int, int, int, int], CachedPath]" = OrderedDict()
+        self._costs = (graph.hours if weight == "time" else graph.length_km).tolist()
+        self._km = graph.length_km.tolist()
+        self._hours = graph.hours.tolist()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, start: Sequence[float], end: Sequence[float]) -> Tuple[int, int, int, int]:
+        size = self.cell_degrees
+        return (int(start[0] // size), int(start[1] // size), int(end[0] // size), int(end[1] // size))
+
+    def _remember(self, key, path: CachedPath):
+        self._cache[key] = path
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _walk(self, source: int, target: int, previous: Dict[int, Tuple[int, int]]) -> CachedPath:
+        nodes, km, hours = [target], [], []
+        while nodes[-1] != source:
+            node, edge = previous[nodes[-1]]
+            km.append(self._km[edge])
+            hours.append(self._hours[edge])
+            nodes.append(node)
+        return tuple(reversed(nodes)), tuple(reversed(km)), tuple(reversed(hours))
+
+    def shortest_path(self, source: int, target: int, blocked: frozenset = frozenset()) -> Optional[CachedPath]:
+        """A* from source to target, never entering blocked nodes; None if unreachable"""
+        graph = self.graph
+        radians = graph._radians
+        goal_lon, goal_lat = radians[target]
+        cos_goal = math.cos(goal_lat)
+        # Admissible: nothing covers the straight line faster than the fastest road
+        scale = 2 * EARTH_RADIUS_KM / (graph.max_speed_kmh if self.weight == "time" else 1.0)
+        heuristic: Dict[int, float] = {}
+
+        def estimate(node: int) -> float:
+            # Only nodes the search reaches get a great-circle estimate
+            remaining = heuristic.get(node)
+            if remaining is None:
+                lon, lat = radians[node]
+                a = math.sin((goal_lat - lat) / 2) ** 2 + math.cos(lat) * cos_goal * math.sin((goal_lon - lon) / 2) ** 2
+                remaining = heuristic[node] = scale * math.asin(math.sqrt(min(a, 1.0)))
+            return remaining
+
+        offsets, targets, costs = graph._offsets, graph._targets, self._costs
+        best = {source: 0.0}
+        previous: Dict[int, Tuple[int, int]] = {}
+        frontier = [(estimate(source), 0.0, source)]
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == target:
+                return self._walk(source, target, previous)
+            if cost > best[node]:
+                continue
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = targets[edge]
+                if neighbor in blocked and neighbor != target:
+                    continue
+                candidate = cost + costs[edge]
+                if candidate < best.get(neighbor, float("inf")):
+                    best[neighbor] = candidate
+                    previous[neighbor] = (node, edge)
+                    heapq.heappush(frontier, (candidate + estimate(neighbor), candidate, neighbor))
+        return None
+
+    def shortest_paths(self, source: int, targets: Sequence[int]) -> Dict[int, CachedPath]:
+        """One Dijkstra from source until every target is settled; cheaper than A* per target for big groups"""
+        offsets, graph_targets, costs = self.graph._offsets, self.graph._targets, self._costs
+        pending = set(targets)
+        best = {source: 0.0}
+        previous: Dict[int, Tuple[int, int]] = {}
+        settled = set()
+        frontier = [(0.0, source)]
+        while frontier and pending:
+            cost, node = heapq.heappop(frontier)
+            if node in settled:
+                continue
+            settled.add(node)
+            pending.discard(node)
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = graph_targets[edge]
+                candidate = cost + costs[edge]
+                if candidate < best.get(neighbor, float("inf")):
+                    best[neighbor] = candidate
+                    previous[neighbor] = (node, edge)
+                    heapq.heappush(frontier, (candidate, neighbor))
+        return {target: self._walk(source, target, previous) for target in set(targets) if target in settled}
+
+    def _assemble(self, start: Sequence[float], end: Sequence[float], path: Optional[CachedPath],
+                  waypoints: int) -> Dict:
+        """Join the off-road legs to a node path and resample it into evenly spaced waypoints"""
+        if path is None or len(path[0]) < 2:
+            # Same road node at both ends, or no road connection: drive straight there
+            coords = np.array([start, end], dtype=np.float64)
+            km = float(haversine_km(start[0], start[1], end[0], end[1]))
+            return {"path": resample(coords, waypoints), "distanceKm": km, "durationHours": km / LOCAL_ROAD_SPEED_KMH}
+
+        nodes, km, hours = list(path[0]), list(path[1]), list(path[2])
+        points = self.graph.nodes
+
+        def closer(point: Sequence[float], node: int, neighbor: int) -> bool:
+            # The point already lies between two road nodes, so the end node is behind it
+            return haversine_km(point[0], point[1], *points[neighbor]) < haversine_km(*points[node], *points[neighbor])
+
+        if len(nodes) > 2 and closer(start, nodes[0], nodes[1]):
+            nodes, km, hours = nodes[1:], km[1:], hours[1:]
+        if len(nodes) > 2 and closer(end, nodes[-1], nodes[-2]):
+            nodes, km, hours = nodes[:-1], km[:-1], hours[:-1]
+
+        coords = np.vstack(([start], points[nodes], [end]))
+        first, last = coords[1], coords[-2]
+        local_km = float(haversine_km(start[0], start[1], first[0], first[1]) +
+                         haversine_km(last[0], last[1], end[0], end[1]))
+        return {
+            "path": resample(coords, waypoints),
+            "distanceKm": sum(km) + local_km,
+            "durationHours": sum(hours) + local_km / LOCAL_ROAD_SPEED_KMH
+        }
+
+    def route(self, start: Sequence[float], end: Sequence[float], waypoints: int = ROUTE_WAYPOINTS,
+              avoid: Optional[Sequence[Sequence[float]]] = None, avoid_radius_km: float = AVOID_RADIUS_KM) -> Dict:
+        """Road route as evenly spaced waypoints with distance and drive time; detours around avoid bypass the cache"""
+        graph = self.graph
+        source, target = graph.snap(*start), graph.snap(*end)
+        if source is None or target is None:
+            # No road node to start or finish on: drive straight there
+            return self._assemble(start, end, None, waypoints)
+
+        if avoid:
+            blocked = frozenset(
+                node for lon, lat in avoid for node, _ in graph.spatial.within_radius(lon, lat, avoid_radius_km)
+            )
+            return self._assemble(start, end, self.shortest_path(source, target, blocked), waypoints)
+
+        key = self._key(start, end)
+        path = self._cache.get(key)
+        if path is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            path = self.shortest_path(source, target)
+            if path is not None:
+                self._remember(key, path)
+        return self._assemble(start, end, path, waypoints)
+
+    def route_many(self, starts: np.ndarray, ends: np.ndarray,
+                   waypoints: int = ROUTE_WAYPOINTS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Routes for a whole fleet: (paths (n, waypoints, 2), distances_km, durations_hours)"""
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        keys = [self._key(s, e) for s, e in zip(starts.tolist(), ends.tolist())]
+
+        # Misses are grouped by origin node so each origin costs one search
+        missing = [i for i, key in enumerate(keys) if key not in self._cache]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            sources = self.graph.snap_many(starts[missing])
+            targets = self.graph.snap_many(ends[missing])
+            groups: Dict[int, List[int]] = {}
+            for i, source, target in zip(missing, sources.tolist(), targets.tolist()):
+                if source >= 0 and target >= 0:
+                    groups.setdefault(source, []).append(i)
+            target_of = dict(zip(missing, targets.tolist()))
+            for source, members in groups.items():
+                found = self.shortest_paths(source, [target_of[i] for i in members])
+                for i in members:
+                    if target_of[i] in found:
+                        self._remember(keys[i], found[target_of[i]])
+
+        paths = np.zeros((len(keys), waypoints, 2))
+        distances = np.zeros(len(keys))
+        durations = np.zeros(len(keys))
+        for i, (start, end, key) in enumerate(zip(starts, ends, keys)):
+            route = self._assemble(start, end, self._cache.get(key), waypoints)
+            paths[i], distances[i], durations[i] = route["path"], route["distanceKm"], route["durationHours"]
+        return paths, distances, durations
+
+
+_default_router: Optional[Router] = None
+
+
+def default_router() -> Optional[Router]:
+    """Process-wide router over ROAD_GRAPH_PATH (or the bundled highway graph); None if no graph file exists"""
+    global _default_router
+    if _default_router is None:
+        path = os.getenv("ROAD_GRAPH_PATH", DEFAULT_ROAD_GRAPH)
+        if not path or not os.path.exists(path):
+            return None
+        _default_router = Router(RoadGraph.load(path), weight=os.getenv("ROUTE_WEIGHT", "time"))
+    return _default_router
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "convert":
+        graph = RoadGraph.from_overpass(sys.argv[2])
+        graph.save(sys.argv[3])
+        print(f"🛣️  {len(graph):,} nodes, {len(graph.targets):,} edges -> {sys.argv[3]}")
+    else:
+        print("Usage: python routing.py convert extract.json graph.npz")
@@ -4,15 +4,31 @@ Broadcasts truck positions, events, and arbitrage opportunities
 """
 
 import asyncio
-import json
 import websockets
 import os
+import time
 from datetime import datetime
-from typing import Set
+from http import HTTPStatus
+from typing import Optional
 from dotenv import load_dotenv
 
-from simulation import TruckSimulator, create_demo_scenarios
+from simulation import DEFAULT_TIME_SCALE, DEMO_SCENARIO_PATH, ScenarioEngine, TruckSimulator, create_demo_scenarios
 from contract_analyzer import ContractAnalyzer
+from delta import DeltaEncoder
+from dispatcher import (DEFAULT_BURST, DEFAULT_MAX_IN_FLIGHT, DEFAULT_PROCESSES, DEFAULT_RATE, DEFAULT_THREADS, Dispatcher,
+                        RequestError)
+from event_log import DEFAULT_EVENT_DIR, EventLog
+from forecast import fleet_input
+from handlers import register_handlers
+from history import DEFAULT_HISTORY_DIR, DETAIL_RETENTION_DAYS, RETENTION_DAYS, FleetHistory
+from broadcaster import Broadcaster
+from codec import SUBPROTOCOLS, codec_for
+from shard import FleetShard
+from snapshot import SnapshotWriter, exists as snapshot_exists, restore as restore_snapshot
+from telemetry import listen_udp
+from subscriptions import SubscriptionIndex
+from clock import FixedTimestepClock
+from metrics import registry
 
 # Load environment variables
 load_dotenv()
@@ -20,128 +36,296 @@ load_dotenv()
 # Server configuration
 WS_HOST = os.getenv("WS_HOST", "localhost")
 WS_PORT = int(os.getenv("WS_PORT", 8080))
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", 64))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "coalesce")
+WS_COMPRESSION = os.getenv("WS_COMPRESSION", "deflate")
+
+# Per-connection request limits, and the pools CPU-heavy and blocking requests run in
+WS_RATE_LIMIT = float(os.getenv("WS_RATE_LIMIT", DEFAULT_RATE))
+WS_RATE_BURST = int(os.getenv("WS_RATE_BURST", DEFAULT_BURST))
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+REQUEST_THREADS = int(os.getenv("REQUEST_THREADS", DEFAULT_THREADS))
+REQUEST_PROCESSES = int(os.getenv("REQUEST_PROCESSES", DEFAULT_PROCESSES))
+
+# Simulation tick rate and what to do with ticks missed because the loop overran
+SIM_TICK_HZ = float(os.getenv("SIM_TICK_HZ", 1))
+SIM_MISSED_TICKS = os.getenv("SIM_MISSED_TICKS", "skip")
+# Simulated seconds per wall-clock second
+SIM_TIME_SCALE = float(os.getenv("SIM_TIME_SCALE", DEFAULT_TIME_SCALE))
+# Synthetic trucks on top of the demo fleet; a seed makes them the same every start
+SIM_FLEET_SIZE = int(os.getenv("SIM_FLEET_SIZE", 0))
+SIM_SEED = int(os.getenv("SIM_SEED")) if os.getenv("SIM_SEED") else None
+# Scenario script (.json or .jsonl) played against the simulation clock
+SCENARIO_FILE = os.getenv("SCENARIO_FILE", DEMO_SCENARIO_PATH)
+
+# Spot-market quote feed (.json or .jsonl), reloaded in the background; empty uses only the standing providers
+SPOT_QUOTES_PATH = os.getenv("SPOT_QUOTES_PATH", "")
+SPOT_REFRESH_SECONDS = float(os.getenv("SPOT_REFRESH_SECONDS", 30))
+SPOT_QUOTE_TTL = float(os.getenv("SPOT_QUOTE_TTL", 300))
+
+# Events kept in memory, and where the full history is appended (empty disables it)
+EVENT_LOG_CAPACITY = int(os.getenv("EVENT_LOG_CAPACITY", 4096))
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", DEFAULT_EVENT_DIR)
+
+# Analytics history: per-minute positions kept HISTORY_DETAIL_DAYS, everything else HISTORY_RETENTION_DAYS
+# (an empty HISTORY_DIR keeps it in memory only)
+HISTORY_DIR = os.getenv("HISTORY_DIR", DEFAULT_HISTORY_DIR)
+HISTORY_DETAIL_DAYS = float(os.getenv("HISTORY_DETAIL_DAYS", DETAIL_RETENTION_DAYS))
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", RETENTION_DAYS))
+
+# UDP port for binary/JSON telemetry datagrams (0 disables; the telemetry WebSocket message always works)
+TELEMETRY_UDP_PORT = int(os.getenv("TELEMETRY_UDP_PORT", 0))
+
+# Periodic snapshots of the whole simulation; on start the last one is restored instead of a fresh fleet
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshot"))
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", 60))
+SNAPSHOT_RESTORE = os.getenv("SNAPSHOT_RESTORE", "true").lower() == "true"
+
+# Delayed trucks are offered an arbitrage once they have been stalled this many seconds
+ARBITRAGE_MIN_DELAY_SECONDS = float(os.getenv("ARBITRAGE_MIN_DELAY_SECONDS", 7))
+
+# Simulation subsystems, built by build_simulation() once the socket is listening
+analyzer: Optional[ContractAnalyzer] = None
+shard: Optional[FleetShard] = None
+simulator: Optional[TruckSimulator] = None
+scenario_engine: Optional[ScenarioEngine] = None
+delta_encoder: Optional[DeltaEncoder] = None
+snapshots: Optional[SnapshotWriter] = None
+history: Optional[FleetHistory] = None
+restored = False
+start_elapsed = 0.0
+# Set once the subsystems exist; clients that connect earlier wait for it
+ready = asyncio.Event()
+subscriptions = SubscriptionIndex()
+
+
+def build_simulation():
+    """Restore the last snapshot or start the demo fleet; runs in a worker thread while the server binds"""
+    global analyzer, shard, simulator, scenario_engine, delta_encoder, snapshots, history, restored, start_elapsed
+    event_log = EventLog(EVENT_LOG_CAPACITY, EVENT_LOG_DIR or None)
+    analyzer = ContractAnalyzer()
+    restored = bool(SNAPSHOT_DIR and SNAPSHOT_RESTORE and snapshot_exists(SNAPSHOT_DIR))
+    if restored:
+        # The whole fleet as one shard; cluster.py splits it across processes instead
+        shard, start_elapsed = restore_snapshot(SNAPSHOT_DIR, analyzer, event_log, SIM_TIME_SCALE,
+                                                min_delay_seconds=ARBITRAGE_MIN_DELAY_SECONDS)
+    else:
+        fleet_simulator = TruckSimulator(SIM_FLEET_SIZE, SIM_SEED, events=event_log, time_scale=SIM_TIME_SCALE)
+        shard = FleetShard(fleet_simulator, analyzer, create_demo_scenarios(fleet_simulator, SCENARIO_FILE),
+                           ARBITRAGE_MIN_DELAY_SECONDS)
+    simulator = shard.simulator
+    scenario_engine = shard.scenario_engine
+    delta_encoder = shard.delta_encoder
+    snapshots = SnapshotWriter(SNAPSHOT_DIR, SNAPSHOT_INTERVAL_SECONDS if SNAPSHOT_DIR else 0)
+    history = FleetHistory(HISTORY_DIR or None, HISTORY_DETAIL_DAYS, HISTORY_RETENTION_DAYS)
+    history.watch(simulator)
+
+
+def client_snapshot(websocket) -> dict:
+    """Full state for one client, narrowed to its subscription if it has one"""
+    return subscriptions.filter_snapshot(websocket, delta_encoder.snapshot(), simulator.fleet)
+
+
+# Connected clients, each with its own bounded send queue
+clients = Broadcaster(client_snapshot, max_queue=WS_SEND_QUEUE, policy=WS_SLOW_CLIENT_POLICY)
+
+# Tick instrumentation, served at http://WS_HOST:WS_PORT/metrics
+TICK_PHASES = ("update", "analysis", "history", "serialize", "send")
+phase_seconds = {
+    phase: registry.histogram("sim_tick_phase_seconds", "Time spent in each simulation tick phase", {"phase": phase})
+    for phase in TICK_PHASES
+}
+tick_seconds = registry.histogram("sim_tick_seconds", "Total work per simulation tick")
+tick_lateness = registry.histogram("sim_tick_lateness_seconds", "How late each tick started against its schedule")
+ticks_skipped = registry.counter("sim_ticks_skipped_total", "Ticks dropped because the loop fell behind")
+connected_clients = registry.gauge("ws_connected_clients", "Open WebSocket connections")
+
+
+async def broadcast(message: dict, truck_id: str = None):
+    """Broadcast message to all connected clients"""
+    clients.publish(message, skip=subscriptions)
+    if truck_id and subscriptions.subscriptions:
+        clients.publish_to(
+            [ws for ws in subscriptions.subscriptions if subscriptions.wants(ws, truck_id)],
+            message
+        )
 
-# Connected clients
-clients: Set[websockets.WebSocketServerProtocol] = set()
 
-# Initialize systems
-simulator = TruckSimulator()
-analyzer = ContractAnalyzer()
-scenario_engine = create_demo_scenarios(simulator)
+async def broadcast_delta():
+    """Broadcast the tick's state_delta, routed per subscription"""
+    with phase_seconds["serialize"].time():
+        delta = delta_encoder.delta()
+        routed = subscriptions.route_delta(delta, simulator.fleet)
 
+    with phase_seconds["send"].time():
+        clients.publish(delta, skip=subscriptions)
+        for websocket, message in routed.items():
+            clients.send(websocket, message)
 
-async def broadcast(message: dict):
-    """Broadcast message to all connected clients"""
-    if clients:
-        message_json = json.dumps(message)
-        await asyncio.gather(
-            *[client.send(message_json) for client in clients],
-            return_exceptions=True
-        )
+
+async def serve_http(path, request_headers):
+    """Answer plain HTTP requests on the WebSocket port; None continues the handshake"""
+    if path == "/metrics":
+        connected_clients.set(len(clients))
+        return HTTPStatus.OK, [("Content-Type", "text/plain; version=0.0.4")], registry.render().encode()
+    return None
 
 
 async def handle_client(websocket):
     """Handle individual client connection"""
+    await ready.wait()
     clients.add(websocket)
     client_id = id(websocket)
-    print(f"✅ Client connected: {client_id} | Total clients: {len(clients)}")
+    print(f"✅ Client connected: {client_id} ({codec_for(websocket.subprotocol).name}) | Total clients: {len(clients)}")
 
     try:
-        # Send initial state
-        await websocket.send(json.dumps({
-            "type": "initial_state",
-            "data": simulator.get_state()
-        }))
+        # Send initial state; state_delta frames continue from its seq
+        clients.send(websocket, client_snapshot(websocket))
 
         # Handle incoming messages
+        codec = codec_for(websocket.subprotocol)
         async for message in websocket:
             try:
-                data = json.loads(message)
-                await process_client_message(data, websocket)
-            except json.JSONDecodeError:
-                await websocket.send(json.dumps({
+                data = codec.decode(message)
+            except ValueError:
+                clients.send(websocket, {
                     "type": "error",
-                    "message": "Invalid JSON"
-                }))
+                    "message": f"Invalid {codec.name} message"
+                })
+                continue
+            dispatcher.dispatch(websocket, data)
 
     except websockets.exceptions.ConnectionClosed:
         print(f"❌ Client disconnected: {client_id}")
     finally:
         clients.remove(websocket)
+        dispatcher.close(websocket)
+        subscriptions.unsubscribe(websocket)
+
+
+# Client requests: quick ones and anything that touches the simulation run on the loop,
+# blocking lookups and history scans in threads, Monte Carlo forecasts in a process pool
+dispatcher = Dispatcher(clients.send, WS_RATE_LIMIT, WS_RATE_BURST, WS_MAX_IN_FLIGHT, REQUEST_THREADS,
+                        REQUEST_PROCESSES)
+
+
+@dispatcher.handler("execute_arbitrage")
+async def execute_arbitrage(data: dict, websocket):
+    truck_id = data.get("truckId")
+    shard.execute_arbitrage(truck_id)
+    history.record_execution(truck_id)
+
+    await broadcast({
+        "type": "arbitrage_executed",
+        "truckId": truck_id,
+        "timestamp": datetime.now().isoformat()
+    }, truck_id)
+
+
+@dispatcher.handler("reroute")
+def reroute(data: dict, websocket):
+    # New road route around stalled trucks; the change goes out with the next delta
+    truck_id = data.get("truckId")
+    if not shard.reroute(truck_id, data.get("avoidTruckIds")):
+        raise RequestError(f"Cannot reroute {truck_id}")
 
 
-async def process_client_message(data: dict, websocket):
-    """Process messages from clients"""
-    msg_type = data.get("type")
+@dispatcher.handler("telemetry")
+def telemetry(data: dict, websocket):
+    # Batched position reports from real trucks, applied on the next tick
+    try:
+        ack = shard.telemetry.submit_message(data)
+    except (TypeError, ValueError) as e:
+        raise RequestError(f"Invalid telemetry: {e}")
+
+    return {
+        "type": "telemetry_ack",
+        **ack
+    }
+
+
+class LocalFleet:
+    """This process's simulation as the shared request handlers see it"""
 
-    if msg_type == "execute_arbitrage":
-        truck_id = data.get("truckId")
-        simulator.resolve_delay(truck_id)
-        simulator.add_event("success", f"✅ Arbitrage executed for {truck_id}", truck_id)
+    subscriptions = subscriptions
+    client_snapshot = staticmethod(client_snapshot)
 
-        await broadcast({
-            "type": "arbitrage_executed",
-            "truckId": truck_id,
-            "timestamp": datetime.now().isoformat()
-        })
+    @property
+    def analyzer(self) -> ContractAnalyzer:
+        return analyzer
 
-    elif msg_type == "request_contract":
-        contract_id = data.get("contractId")
-        contract = analyzer.get_contract(contract_id)
+    @property
+    def events(self) -> EventLog:
+        return simulator.events
 
-        await websocket.send(json.dumps({
-            "type": "contract_data",
-            "data": contract
-        }))
+    @property
+    def history(self) -> FleetHistory:
+        return history
 
-    elif msg_type == "ping":
-        await websocket.send(json.dumps({
-            "type": "pong",
-            "timestamp": datetime.now().isoformat()
-        }))
+    async def forecast_input(self) -> dict:
+        return fleet_input(simulator.fleet)
+
+
+# Lookups, history and forecasts, subscriptions and ping: the same for a cluster gateway
+register_handlers(dispatcher, LocalFleet())
 
 
 async def simulation_loop():
-    """Main simulation loop - updates every second"""
+    """Main simulation loop - fixed-rate ticks on a monotonic clock"""
     await asyncio.sleep(2)  # Initial delay
 
-    time_elapsed = 0
-    arbitrage_sent = False
+    clock = FixedTimestepClock(SIM_TICK_HZ, SIM_MISSED_TICKS)
+    # A restored simulation carries on with the tick after the one it was snapshotted at
+    base = start_elapsed + clock.period if restored else 0.0
+
+    try:
+        await run_ticks(clock, base)
+    finally:
+        # Whatever stops the loop, the next start resumes from the last completed tick
+        snapshots.save_now(shard, scenario_engine.elapsed)
+        history.flush()
+        simulator.events.close()
+        dispatcher.shutdown()
 
-    while True:
-        # Update truck positions
-        simulator.update_positions()
 
-        # Check for demo scenario triggers
-        if time_elapsed == 5:
-            simulator.simulate_delay("TRK-402", "critical")
+async def run_ticks(clock: FixedTimestepClock, base: float):
+    """Tick forever; simulation time is base plus the clock's elapsed time"""
+    last_elapsed = base - clock.period
+    async for _ in clock.ticks():
+        tick_start = time.perf_counter()
+        tick_lateness.observe(clock.lateness)
+        ticks_skipped.value = clock.skipped
+        time_elapsed = base + clock.elapsed
 
-        if time_elapsed == 8:
-            simulator.add_event("alert", "⚠️ TRK-402 CRITICAL - SLA threshold exceeded", "TRK-402")
+        with phase_seconds["update"].time():
+            # Update truck positions and fire scenario events, including any a skipped tick passed over
+            shard.update(time_elapsed, time_elapsed - last_elapsed)
 
-        if time_elapsed == 12 and not arbitrage_sent:
-            # Analyze and send arbitrage opportunity
-            arbitrage = analyzer.analyze_arbitrage_opportunity("TRK-402", "CNT-2024-001", 2.5)
+        # Analyze and send arbitrage opportunities, best savings first
+        with phase_seconds["analysis"].time():
+            opportunities = shard.scan_arbitrage(time_elapsed)
 
-            if arbitrage.get("recommendation") == "EXECUTE":
-                simulator.add_event("arbitrage", f"💎 ARBITRAGE OPPORTUNITY - Net Savings: ${arbitrage['netSavings']}",
-                                    "TRK-402")
+        # Record status changes, the minute's positions and the opportunities for analytics
+        with phase_seconds["history"].time():
+            history.record_tick(simulator.fleet)
+            history.record_arbitrage(opportunities)
 
-                await broadcast({
-                    "type": "arbitrage_opportunity",
-                    "data": arbitrage
-                })
+        for arbitrage in opportunities:
+            await broadcast({
+                "type": "arbitrage_opportunity",
+                "data": arbitrage
+            }, arbitrage["truckId"])
 
-                arbitrage_sent = True
+        # Broadcast only what changed since the last tick
+        await broadcast_delta()
 
-        # Broadcast state update
-        await broadcast({
-            "type": "state_update",
-            "data": simulator.get_state()
-        })
+        # The tick's events go to their segment files off the loop
+        if simulator.events.pending:
+            await asyncio.to_thread(simulator.events.flush)
 
-        time_elapsed += 1
-        await asyncio.sleep(1)  # Update every second
+        tick_seconds.observe(time.perf_counter() - tick_start)
+        last_elapsed = time_elapsed
+        snapshots.maybe_save(shard, time_elapsed)
 
 
 async def main():
@@ -157,16 +341,32 @@ async def main():
     else:
         print("⚠️  OpenAI API key not found - using mock responses")
 
-    print(f"🚛 Initialized {len(simulator.trucks)} trucks")
-    print("=" * 60)
-
-    # Start WebSocket server
-    async with websockets.serve(handle_client, WS_HOST, WS_PORT):
+    # Bind first, then build the simulation off the loop: /metrics answers and clients can
+    # connect (their initial state waits for it) while a large fleet is generated or restored
+    compression = None if WS_COMPRESSION == "none" else WS_COMPRESSION
+    async with websockets.serve(handle_client, WS_HOST, WS_PORT, compression=compression,
+                                subprotocols=SUBPROTOCOLS, process_request=serve_http):
         print(f"✅ Server listening on ws://{WS_HOST}:{WS_PORT}")
-        print("📊 Broadcasting simulation updates every 1 second")
+        await asyncio.to_thread(build_simulation)
+        ready.set()
+        if restored:
+            print(f"📸 Restored {simulator.fleet.size} trucks from {SNAPSHOT_DIR} at t={start_elapsed:g}s")
+        else:
+            print(f"🚛 Initialized {simulator.fleet.size} trucks")
+        print(f"📊 Broadcasting simulation updates at {SIM_TICK_HZ:g} Hz")
+        print(f"📈 Tick metrics at http://{WS_HOST}:{WS_PORT}/metrics")
         print("🎬 Demo scenario will run automatically")
         print("\nPress Ctrl+C to stop\n")
 
+        if SPOT_QUOTES_PATH:
+            print(f"💱 Refreshing spot quotes from {SPOT_QUOTES_PATH} every {SPOT_REFRESH_SECONDS:g}s")
+            asyncio.create_task(analyzer.spot_market.refresh_forever(SPOT_QUOTES_PATH, SPOT_REFRESH_SECONDS,
+                                                                      SPOT_QUOTE_TTL))
+
+        if TELEMETRY_UDP_PORT:
+            await listen_udp(shard.telemetry, WS_HOST, TELEMETRY_UDP_PORT)
+            print(f"🛰️  Telemetry datagrams on udp://{WS_HOST}:{TELEMETRY_UDP_PORT}")
+
         # Run simulation loop
         await simulation_loop()
 
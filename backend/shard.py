@@ -0,0 +1,316 @@
+"""
+Fleet Shards
+One partition of the fleet per process: simulation, scenarios and arbitrage analysis,
+streamed to gateways as length-prefixed frames over a Unix socket
+"""
+
+import asyncio
+import heapq
+import os
+import struct
+from typing import Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from analysis_cache import AnalysisCache
+from clock import FixedTimestepClock
+from codec import JSON
+from contract_analyzer import ContractAnalyzer
+from delta import DeltaEncoder
+from event_log import DEFAULT_EVENT_DIR, EventLog
+from fleet_store import CHANGED_ADDED, CHANGED_STATUS, CRITICAL, DELAYED, FleetChanges
+from forecast import fleet_input
+from history import DEFAULT_HISTORY_DIR, DETAIL_RETENTION_DAYS, RETENTION_DAYS, FleetHistory
+from simulation import DEFAULT_TIME_SCALE, DEMO_SCENARIO_PATH, ScenarioEngine, TruckSimulator, create_demo_scenarios
+from telemetry import TelemetryIngest
+
+load_dotenv()
+
+SIM_TICK_HZ = float(os.getenv("SIM_TICK_HZ", 1))
+SIM_MISSED_TICKS = os.getenv("SIM_MISSED_TICKS", "skip")
+SIM_TIME_SCALE = float(os.getenv("SIM_TIME_SCALE", DEFAULT_TIME_SCALE))
+SCENARIO_FILE = os.getenv("SCENARIO_FILE", DEMO_SCENARIO_PATH)
+EVENT_LOG_CAPACITY = int(os.getenv("EVENT_LOG_CAPACITY", 4096))
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", DEFAULT_EVENT_DIR)
+SPOT_QUOTES_PATH = os.getenv("SPOT_QUOTES_PATH", "")
+SPOT_REFRESH_SECONDS = float(os.getenv("SPOT_REFRESH_SECONDS", 30))
+SPOT_QUOTE_TTL = float(os.getenv("SPOT_QUOTE_TTL", 300))
+HISTORY_DIR = os.getenv("HISTORY_DIR", DEFAULT_HISTORY_DIR)
+HISTORY_DETAIL_DAYS = float(os.getenv("HISTORY_DETAIL_DAYS", DETAIL_RETENTION_DAYS))
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", RETENTION_DAYS))
+
+# FleetHistory queries a gateway may ask a shard for; each shard answers for its own trucks
+HISTORY_QUERIES = ("savings", "status_history", "arbitrage_log", "track")
+
+# Delayed trucks are offered an arbitrage once they have been stalled this many seconds
+ARBITRAGE_MIN_DELAY_SECONDS = float(os.getenv("ARBITRAGE_MIN_DELAY_SECONDS", 7))
+
+# A gateway whose unread frames exceed this many bytes is dropped; it reconnects and gets a fresh snapshot
+SHARD_MAX_BACKLOG_BYTES = int(os.getenv("SHARD_MAX_BACKLOG_BYTES", 64 * 1024 * 1024))
+
+_LENGTH = struct.Struct(">I")
+
+
+def encode_frame(message: Dict) -> bytes:
+    """Length-prefixed JSON frame for the shard <-> gateway link"""
+    payload = JSON.encode(message).encode()
+    return _LENGTH.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict:
+    """Read one frame; raises asyncio.IncompleteReadError when the peer goes away"""
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return JSON.decode(await reader.readexactly(length))
+
+
+class FleetShard:
+    """Per-tick work for one partition of the fleet"""
+
+    def __init__(self, simulator: TruckSimulator, analyzer: ContractAnalyzer, scenario_engine: ScenarioEngine,
+                 min_delay_seconds: float = ARBITRAGE_MIN_DELAY_SECONDS):
+        self.simulator = simulator
+        self.analyzer = analyzer
+        self.scenario_engine = scenario_engine
+        self.delta_encoder = DeltaEncoder(simulator)
+        self.telemetry = TelemetryIngest(simulator)
+        self.min_delay_seconds = min_delay_seconds
+        self.delayed_since: Dict[str, float] = {}
+        self.alerted: Set[str] = set()
+        # Rows whose status changed since the last scan; every delayed truck is examined once at start
+        self._recheck: Set[int] = set(simulator.fleet.delayed_rows().tolist())
+        # (due time, row, delayed since) for trucks still serving their minimum delay
+        self._waiting: List[Tuple[float, int, float]] = []
+        # Rows past their minimum delay that have not produced an opportunity yet
+        self._due: Set[int] = set()
+        simulator.on_change(self._track_status)
+
+    def _track_status(self, changes: FleetChanges):
+        self._recheck.update(changes.rows_with(CHANGED_STATUS | CHANGED_ADDED).tolist())
+
+    def update(self, time_elapsed: float, dt_seconds: float):
+        """Apply reported telemetry, move the other trucks and fire every scenario event due by now"""
+        self.telemetry.apply()
+        # Skipped ticks still happened on the road: move by all the time they covered
+        self.simulator.update_positions(dt_seconds)
+        self.scenario_engine.advance(time_elapsed)
+
+    def scan_arbitrage(self, time_elapsed: float) -> List[dict]:
+        """
+        Analyze every truck that has been delayed long enough, in one batch; best savings first.
+        Work follows the change feed: only trucks whose status changed are re-examined.
+        """
+        self.simulator.publish_changes()
+        fleet = self.simulator.fleet
+
+        for row in self._recheck:
+            truck_id = fleet.ids[row]
+            if fleet.status[row] in (DELAYED, CRITICAL):
+                since = self.delayed_since.setdefault(truck_id, time_elapsed)
+                if truck_id not in self.alerted and fleet.contract_ids[row]:
+                    heapq.heappush(self._waiting, (since + self.min_delay_seconds, row, since))
+            elif truck_id in self.delayed_since:
+                # Recovered: a later incident is analyzed afresh
+                del self.delayed_since[truck_id]
+                self.alerted.discard(truck_id)
+                self._due.discard(row)
+        self._recheck.clear()
+
+        while self._waiting and self._waiting[0][0] <= time_elapsed:
+            _, row, since = heapq.heappop(self._waiting)
+            truck_id = fleet.ids[row]
+            # Entries for incidents that ended, or trucks already alerted, are stale
+            if self.delayed_since.get(truck_id) == since and truck_id not in self.alerted:
+                self._due.add(row)
+        if not self._due:
+            return []
+
+        due = sorted(self._due)
+        opportunities = self.analyzer.analyze_fleet(
+            [fleet.ids[row] for row in due],
+            [fleet.contract_ids[row] for row in due],
+            fleet.lateness_hours[due],
+            fleet.positions[due]
+        )
+        for arbitrage in opportunities:
+            truck_id = arbitrage["truckId"]
+            self.simulator.add_event("arbitrage",
+                                     f"💎 ARBITRAGE OPPORTUNITY - Net Savings: ${arbitrage['netSavings']}", truck_id)
+            self.alerted.add(truck_id)
+            self._due.discard(fleet.row(truck_id))
+        return opportunities
+
+    def execute_arbitrage(self, truck_id: str):
+        self.simulator.resolve_delay(truck_id)
+        self.simulator.add_event("success", f"✅ Arbitrage executed for {truck_id}", truck_id)
+
+    def reroute(self, truck_id: str, avoid_truck_ids: Optional[List[str]] = None) -> bool:
+        """New road route around stalled trucks; the change goes out with the next delta"""
+        if not self.simulator.reroute(truck_id, avoid_truck_ids):
+            return False
+        self.simulator.add_event("system", f"🛣️ {truck_id} rerouted around stalled traffic", truck_id)
+        return True
+
+
+class ShardPublisher:
+    """
+    Unix-socket server for one shard. Each connected gateway gets a snapshot, then every
+    tick's delta, encoded once and written to all of them; gateways send truck commands
+    and history queries back.
+    """
+
+    def __init__(self, shard: FleetShard, index: int, path: str, history: Optional[FleetHistory] = None,
+                 max_backlog_bytes: int = SHARD_MAX_BACKLOG_BYTES):
+        self.shard = shard
+        self.index = index
+        self.path = path
+        self.history = history
+        self.max_backlog_bytes = max_backlog_bytes
+        self.gateways: Set[asyncio.StreamWriter] = set()
+        self._queries: Set[asyncio.Task] = set()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        return await asyncio.start_unix_server(self._handle, self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(encode_frame({
+            "type": "hello",
+            "shard": self.index,
+            "snapshot": self.shard.delta_encoder.snapshot()
+        }))
+        self.gateways.add(writer)
+        try:
+            while True:
+                command = await read_frame(reader)
+                if command.get("type") == "history":
+                    task = asyncio.create_task(self._query(command, writer))
+                    self._queries.add(task)
+                    task.add_done_callback(self._queries.discard)
+                    continue
+                reply = self.execute(command)
+                # Always answered, so the gateway can forget the request
+                if command.get("requestId") is not None:
+                    writer.write(encode_frame({"type": "reply", "requestId": command["requestId"], "message": reply}))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.gateways.discard(writer)
+            writer.close()
+
+    async def _query(self, command: Dict, writer: asyncio.StreamWriter):
+        """Answer a history query from a worker thread, so a long scan does not hold up ticks or commands"""
+        query = command.get("query")
+        if self.history is None or query not in HISTORY_QUERIES:
+            reply = {"type": "error", "message": f"Shard {self.index} has no {query} history"}
+        else:
+            try:
+                reply = await asyncio.to_thread(getattr(self.history, query), *command.get("args", ()))
+            except (TypeError, ValueError) as e:
+                reply = {"type": "error", "message": f"Invalid {query} query: {e}"}
+        if not writer.is_closing():
+            writer.write(encode_frame({"type": "reply", "requestId": command["requestId"], "message": reply}))
+
+    def execute(self, command: Dict) -> Optional[Dict]:
+        """Apply a command a gateway forwarded for one of this shard's trucks; returns an optional reply"""
+        msg_type = command.get("type")
+        truck_id = command.get("truckId")
+
+        if msg_type == "execute_arbitrage":
+            self.shard.execute_arbitrage(truck_id)
+            if self.history is not None:
+                self.history.record_execution(truck_id)
+            self.publish({"type": "broadcast", "truckId": truck_id, "message": {
+                "type": "arbitrage_executed",
+                "truckId": truck_id,
+                "timestamp": command.get("timestamp")
+            }})
+
+        elif msg_type == "reroute":
+            if not self.shard.reroute(truck_id, command.get("avoidTruckIds")):
+                return {"type": "error", "message": f"Cannot reroute {truck_id}"}
+
+        elif msg_type == "forecast_input":
+            return {"type": "forecast_input", **fleet_input(self.shard.simulator.fleet)}
+
+        elif msg_type == "telemetry":
+            try:
+                return {"type": "telemetry_ack", **self.shard.telemetry.submit_message(command)}
+            except (TypeError, ValueError) as e:
+                return {"type": "error", "message": f"Invalid telemetry: {e}"}
+        return None
+
+    def publish(self, message: Dict):
+        """Encode once and queue for every gateway, dropping any that stopped reading"""
+        if not self.gateways:
+            return
+        frame = encode_frame(message)
+        for writer in list(self.gateways):
+            if writer.transport.get_write_buffer_size() > self.max_backlog_bytes:
+                print(f"🐢 Shard {self.index}: dropping gateway that fell {self.max_backlog_bytes:,} bytes behind")
+                self.gateways.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+
+def build_shard(index: int, fleet_size: int, seed: Optional[int] = None,
+                first_truck_number: int = 1000) -> FleetShard:
+    """Shard 0 carries the demo trucks and scenario; every shard gets its own slice of synthetic trucks"""
+    event_dir = os.path.join(EVENT_LOG_DIR, f"shard-{index}") if EVENT_LOG_DIR else None
+    simulator = TruckSimulator(fleet_size, seed, events=EventLog(EVENT_LOG_CAPACITY, event_dir),
+                               time_scale=SIM_TIME_SCALE, demo_trucks=index == 0,
+                               first_truck_number=first_truck_number)
+    scenario_engine = create_demo_scenarios(simulator, SCENARIO_FILE) if index == 0 else ScenarioEngine(simulator)
+    # Shards share the contract database, seeded by the cluster, not an analysis cache file
+    analyzer = ContractAnalyzer(cache=AnalysisCache(path=None), seed_contracts=False)
+    return FleetShard(simulator, analyzer, scenario_engine)
+
+
+async def serve_shard(index: int, path: str, fleet_size: int, seed: Optional[int] = None,
+                      first_truck_number: int = 1000):
+    """Simulate one shard at the tick rate and stream its deltas to connected gateways"""
+    shard = build_shard(index, fleet_size, seed, first_truck_number)
+    history = FleetHistory(os.path.join(HISTORY_DIR, f"shard-{index}") if HISTORY_DIR else None,
+                           HISTORY_DETAIL_DAYS, HISTORY_RETENTION_DAYS)
+    history.watch(shard.simulator)
+    publisher = ShardPublisher(shard, index, path, history)
+    await publisher.start()
+    print(f"🧩 Shard {index}: {shard.simulator.fleet.size:,} trucks on {path}")
+
+    if SPOT_QUOTES_PATH:
+        asyncio.create_task(shard.analyzer.spot_market.refresh_forever(SPOT_QUOTES_PATH, SPOT_REFRESH_SECONDS,
+                                                                        SPOT_QUOTE_TTL))
+
+    await asyncio.sleep(2)  # Let gateways connect before the scenario starts
+    clock = FixedTimestepClock(SIM_TICK_HZ, SIM_MISSED_TICKS)
+    last_elapsed = -clock.period
+    try:
+        async for _ in clock.ticks():
+            time_elapsed = clock.elapsed
+            shard.update(time_elapsed, time_elapsed - last_elapsed)
+
+            opportunities = shard.scan_arbitrage(time_elapsed)
+            history.record_tick(shard.simulator.fleet)
+            history.record_arbitrage(opportunities)
+            for arbitrage in opportunities:
+                publisher.publish({"type": "broadcast", "truckId": arbitrage["truckId"], "message": {
+                    "type": "arbitrage_opportunity",
+                    "data": arbitrage
+                }})
+
+            publisher.publish({"shard": index, **shard.delta_encoder.delta()})
+            if shard.simulator.events.pending:
+                await asyncio.to_thread(shard.simulator.events.flush)
+            last_elapsed = time_elapsed
+    finally:
+        history.flush()
+        shard.simulator.events.close()
+
+
+def run_shard(index: int, path: str, fleet_size: int, seed: Optional[int] = None, first_truck_number: int = 1000):
+    """Process entry point"""
+    try:
+        asyncio.run(serve_shard(index, path, fleet_size, seed, first_truck_number))
+    except KeyboardInterrupt:
+        pass
@@ -4,21 +4,70 @@ Generates realistic truck movements, delays, and events
 """
 
 import asyncio
+import heapq
+import itertools
+import os
 import random
 import json
+import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+from event_log import EventLog
+from fleet_store import FleetChanges, FleetStore, ON_TIME
+from routing import Router, default_router
+from spatial_index import SpatialGrid
+
+# Rough bounding box of the Indian road network used for synthetic fleets
+FLEET_LON_RANGE = (72.5, 88.5)
+FLEET_LAT_RANGE = (12.5, 28.5)
+
+# Simulated seconds per wall-clock second: one 1 Hz tick is six minutes on the road
+DEFAULT_TIME_SCALE = 360.0
+
+DEMO_SCENARIO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "scenarios", "demo.json")
 
 
 class TruckSimulator:
     """Simulates realistic truck movements and events"""
 
-    def __init__(self):
-        self.trucks = self._initialize_trucks()
-        self.events = []
-
-    def _initialize_trucks(self) -> List[Dict]:
-        """Initialize truck fleet with realistic data"""
+    def __init__(self, fleet_size: int = 0, seed: Optional[int] = None, events: Optional[EventLog] = None,
+                 router: Optional[Router] = None, time_scale: float = DEFAULT_TIME_SCALE,
+                 demo_trucks: bool = True, first_truck_number: Optional[int] = None,
+                 fleet: Optional[FleetStore] = None, epoch: Optional[datetime] = None):
+        self.time_scale = time_scale
+        # Road routing when a graph is available, straight-line interpolation otherwise
+        self.router = router if router is not None else default_router()
+        self.events = events if events is not None else EventLog()
+        self._observers: List[Callable[[FleetChanges], None]] = []
+        if fleet is not None:
+            # Restored from a snapshot: the fleet comes back as it was, only the spatial index is rebuilt
+            self.fleet = fleet
+            self.spatial = SpatialGrid(capacity=fleet.size)
+            self._index_rows(list(range(fleet.size)))
+            return
+
+        # Only one shard of a cluster carries the demo trucks
+        # A fixed epoch makes the fleet's deadlines the same on every run
+        now = datetime.now() if epoch is None else epoch
+        demo_trucks = self._initialize_trucks(now) if demo_trucks else []
+        self.fleet = FleetStore(capacity=len(demo_trucks) + fleet_size, epoch=now)
+        self.spatial = SpatialGrid(capacity=len(demo_trucks) + fleet_size)
+        self._index_rows(self.fleet.add_trucks(demo_trucks, now))
+        if fleet_size:
+            self.add_synthetic_trucks(fleet_size, seed, first_truck_number, now=epoch)
+
+    def _index_rows(self, rows: List[int]):
+        """Put newly added trucks into the spatial index"""
+        self.spatial.update_many(rows, self.fleet.positions[rows])
+
+    @property
+    def trucks(self) -> List[Dict]:
+        """Dict view of the fleet, materialized on demand"""
+        return self.fleet.to_dicts()
+
+    def _initialize_trucks(self, now: datetime) -> List[Dict]:
+        """Initialize truck fleet with realistic data, due from now"""
         return [
             {
                 "id": "TRK-402",
@@ -31,7 +80,7 @@ class TruckSimulator:
                 "route": self._generate_route([73.7567, 18.4704], [72.8777, 19.0760]),
                 "currentRouteIndex": 0,
                 "contractId": "CNT-2024-001",
-                "eta": (datetime.now() + timedelta(hours=3)).isoformat(),
+                "eta": (now + timedelta(hours=3)).isoformat(),
             },
             {
                 "id": "TRK-305",
@@ -44,7 +93,7 @@ class TruckSimulator:
                 "route": self._generate_route([77.5946, 12.9716], [78.4867, 17.3850]),
                 "currentRouteIndex": 0,
                 "contractId": "CNT-2024-002",
-                "eta": (datetime.now() + timedelta(hours=4)).isoformat(),
+                "eta": (now + timedelta(hours=4)).isoformat(),
             },
             {
                 "id": "TRK-518",
@@ -57,12 +106,15 @@ class TruckSimulator:
                 "route": self._generate_route([88.3639, 22.5726], [85.8245, 20.2961]),
                 "currentRouteIndex": 0,
                 "contractId": "CNT-2024-003",
-                "eta": (datetime.now() + timedelta(hours=5)).isoformat(),
+                "eta": (now + timedelta(hours=5)).isoformat(),
             }
         ]
 
     def _generate_route(self, start: List[float], end: List[float]) -> List[List[float]]:
-        """Generate interpolated route points between start and end"""
+        """Generate route points between start and end, along roads when a router is available"""
+        if self.router:
+            return self.router.route(start, end)["path"].tolist()
+
         points = []
         steps = 20  # Number of waypoints
 
@@ -77,128 +129,324 @@ class TruckSimulator:
 
         return points
 
-    def update_positions(self):
-        """Update truck positions along their routes"""
-        for truck in self.trucks:
-            if truck["status"] == "on-time" and truck["velocity"] > 0:
-                # Move truck along route
-                if truck["currentRouteIndex"] < len(truck["route"]) - 1:
-                    truck["currentRouteIndex"] += 1
-                    truck["position"] = truck["route"][truck["currentRouteIndex"]]
-                else:
-                    # Reached destination, reset
-                    truck["currentRouteIndex"] = 0
-                    truck["position"] = truck["route"][0]
+    def add_synthetic_trucks(self, count: int, seed: Optional[int] = None, first_number: Optional[int] = None,
+                             now: Optional[datetime] = None):
+        """Bulk-generate random trucks for load testing large fleets, numbered from first_number, due from now"""
+        rng = np.random.default_rng(seed)
+        steps = 20
+
+        starts = np.column_stack((rng.uniform(*FLEET_LON_RANGE, count), rng.uniform(*FLEET_LAT_RANGE, count)))
+        ends = np.column_stack((rng.uniform(*FLEET_LON_RANGE, count), rng.uniform(*FLEET_LAT_RANGE, count)))
+        velocities = rng.integers(60, 76, count)
+        hours = rng.uniform(2, 8, count)
+        if self.router:
+            routes, _, hours = self.router.route_many(starts, ends, steps + 1)
+        else:
+            t = np.linspace(0.0, 1.0, steps + 1)[None, :, None]
+            routes = starts[:, None, :] + (ends - starts)[:, None, :] * t
+            routes += rng.uniform(-0.01, 0.01, routes.shape)
+        now = datetime.now() if now is None else now
+        first = self.fleet.size + 1000 if first_number is None else first_number
+
+        rows = self.fleet.add_trucks([
+            {
+                "id": f"TRK-{first + i:06d}",
+                "driver": f"Driver {first + i}",
+                "cargoValue": int(rng.integers(20000, 150000)),
+                "status": "on-time",
+                "velocity": int(velocities[i]),
+                "position": routes[i, 0],
+                "destination": ends[i],
+                "route": routes[i],
+                "currentRouteIndex": 0,
+                "contractId": None,
+                "eta": (now + timedelta(hours=float(hours[i]))).isoformat(),
+            }
+            for i in range(count)
+        ], now)
+        self._index_rows(rows)
+
+    def on_change(self, callback: Callable[[FleetChanges], None]):
+        """Register an observer for the change feed; it gets every batch publish_changes() collects"""
+        self._observers.append(callback)
+
+    def publish_changes(self) -> FleetChanges:
+        """
+        Collect the trucks changed since the last call and hand them to every observer.
+        Consumers call this before reading the feed, so nothing mutated in between is missed.
+        """
+        changes = self.fleet.collect_changes()
+        if len(changes):
+            for callback in self._observers:
+                callback(changes)
+        return changes
+
+    def update_positions(self, dt_seconds: float = 1.0):
+        """Move trucks along their routes by velocity over dt_seconds of wall time, scaled to road time"""
+        moved = self.fleet.advance(dt_seconds * self.time_scale / 3600)
+        self.spatial.update_many(moved, self.fleet.positions[moved])
+
+    def trucks_near(self, position: List[float], radius_km: float) -> List[Tuple[str, float]]:
+        """IDs and distances of every truck within radius_km of a point, nearest first"""
+        found = self.spatial.within_radius(position[0], position[1], radius_km)
+        return [(self.fleet.ids[row], distance) for row, distance in found]
+
+    def find_relief_trucks(self, truck_id: str, k: int = 3, max_radius_km: float = 300.0) -> List[Dict]:
+        """Nearest moving on-time trucks that could take over a stalled truck's load"""
+        row = self.fleet.row(truck_id)
+        if row is None:
+            return []
+
+        lon, lat = self.fleet.positions[row]
+        relief = []
+        for _, found in self.spatial.expanding(lon, lat, max_radius_km):
+            relief = [
+                {
+                    "truckId": self.fleet.ids[candidate],
+                    "distanceKm": round(distance, 1),
+                    "velocity": int(self.fleet.velocity[candidate])
+                }
+                for candidate, distance in found
+                if candidate != row and self.fleet.status[candidate] == ON_TIME and self.fleet.velocity[candidate] > 0
+            ][:k]
+            if len(relief) == k:
+                break
+
+        if self.router:
+            # Arrival along roads rather than as the crow flies
+            for candidate in relief:
+                start = self.fleet.positions[self.fleet.row(candidate["truckId"])].tolist()
+                leg = self.router.route(start, [lon, lat])
+                candidate["roadKm"] = round(leg["distanceKm"], 1)
+                candidate["etaHours"] = round(leg["durationHours"], 2)
+        return relief
+
+    def reroute(self, truck_id: str, avoid_truck_ids: Optional[List[str]] = None) -> bool:
+        """
+        Route a truck from where it is to its destination, around stalled trucks.
+        Without explicit IDs every other delayed or critical truck is avoided.
+        """
+        row = self.fleet.row(truck_id)
+        if row is None or not self.router:
+            return False
+
+        if avoid_truck_ids is None:
+            avoid_rows = [r for r in self.fleet.delayed_rows().tolist() if r != row]
+        else:
+            avoid_rows = [self.fleet.row(t) for t in avoid_truck_ids if self.fleet.row(t) is not None]
+        route = self.router.route(self.fleet.positions[row].tolist(), self.fleet.destinations[row].tolist(),
+                                  avoid=self.fleet.positions[avoid_rows].tolist())
+        self.fleet.set_route(row, route["path"])
+        return True
 
     def simulate_delay(self, truck_id: str, severity: str = "minor"):
         """Simulate a delay event for a specific truck"""
-        for truck in self.trucks:
-            if truck["id"] == truck_id:
-                if severity == "critical":
-                    truck["velocity"] = 0
-                    truck["status"] = "critical"
-                elif severity == "major":
-                    truck["velocity"] = max(20, truck["velocity"] - 40)
-                    truck["status"] = "delayed"
-                else:
-                    truck["velocity"] = max(40, truck["velocity"] - 20)
-                    truck["status"] = "delayed"
-
-                self.events.append({
-                    "id": f"evt-{datetime.now().timestamp()}",
-                    "timestamp": datetime.now().isoformat(),
-                    "type": "alert",
-                    "severity": severity,
-                    "message": f"{truck_id} - Delay detected. Speed: {truck['velocity']} km/h",
-                    "truckId": truck_id
-                })
-                break
+        row = self.fleet.row(truck_id)
+        if row is None:
+            return
+
+        velocity = int(self.fleet.velocity[row])
+        if severity == "critical":
+            velocity = 0
+            self.fleet.set_status(row, "critical")
+        elif severity == "major":
+            velocity = max(20, velocity - 40)
+            self.fleet.set_status(row, "delayed")
+        else:
+            velocity = max(40, velocity - 20)
+            self.fleet.set_status(row, "delayed")
+        self.fleet.set_velocity(row, velocity)
+        self.fleet.project(np.array([row]))
+
+        self.events.append("alert", f"{truck_id} - Delay detected. Speed: {velocity} km/h", truck_id, severity)
 
     def resolve_delay(self, truck_id: str):
         """Resolve a delay for a specific truck"""
-        for truck in self.trucks:
-            if truck["id"] == truck_id:
-                truck["velocity"] = random.randint(60, 75)
-                truck["status"] = "on-time"
-
-                self.events.append({
-                    "id": f"evt-{datetime.now().timestamp()}",
-                    "timestamp": datetime.now().isoformat(),
-                    "type": "success",
-                    "severity": "info",
-                    "message": f"{truck_id} - Issue resolved. Resuming normal speed.",
-                    "truckId": truck_id
-                })
-                break
+        row = self.fleet.row(truck_id)
+        if row is None:
+            return
+
+        self.fleet.set_velocity(row, random.randint(60, 75))
+        self.fleet.set_status(row, "on-time")
+        self.fleet.project(np.array([row]))
+
+        self.events.append("success", f"{truck_id} - Issue resolved. Resuming normal speed.", truck_id)
 
     def get_state(self) -> Dict:
         """Get current simulation state"""
         return {
             "trucks": self.trucks,
-            "events": self.events[-10:],  # Last 10 events
+            "events": self.events.latest(10),  # Last 10 events
             "timestamp": datetime.now().isoformat()
         }
 
     def add_event(self, event_type: str, message: str, truck_id: str = None):
         """Add a custom event to the event log"""
-        self.events.append({
-            "id": f"evt-{datetime.now().timestamp()}",
-            "timestamp": datetime.now().isoformat(),
-            "type": event_type,
-            "severity": "info",
-            "message": message,
-            "truckId": truck_id
-        })
+        self.events.append(event_type, message, truck_id)
 
 
 class ScenarioEngine:
-    """Orchestrates predefined scenarios for demo purposes"""
+    """Orchestrates timed and conditional scenarios from a timer heap"""
 
     def __init__(self, simulator: TruckSimulator):
         self.simulator = simulator
-        self.scenarios = []
-
-    def add_scenario(self, delay: float, action: callable):
-        """Add a timed scenario"""
-        self.scenarios.append({
-            "delay": delay,
+        # Heap of (due_seconds, order, action, interval, remaining_repeats)
+        self._timers: List[Tuple[float, int, object, Optional[float], Optional[int]]] = []
+        self._order = itertools.count()
+        self.conditions: List[Dict] = []
+        self.elapsed = 0.0
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def add_scenario(self, delay: float, action, interval: Optional[float] = None,
+                     repeat: Optional[int] = None):
+        """Add a timed scenario; with an interval it recurs, forever unless repeat caps it"""
+        heapq.heappush(self._timers, (float(delay), next(self._order), action, interval, repeat))
+
+    def add_condition(self, predicate: Callable[[TruckSimulator], bool], action, for_ticks: int = 1,
+                      once: bool = True, source: Optional[Dict] = None):
+        """Run action once predicate has held for for_ticks consecutive ticks"""
+        self.conditions.append({
+            "predicate": predicate,
             "action": action,
-            "executed": False
+            "forTicks": for_ticks,
+            "once": once,
+            "streak": 0,
+            "source": source
         })
 
-    async def run_scenarios(self):
-        """Execute scenarios based on timing"""
-        start_time = datetime.now()
+    def when_stopped(self, truck_id: str, ticks: int, action, once: bool = True):
+        """Run action once a truck has had velocity 0 for the given number of ticks"""
+        def stopped(simulator: TruckSimulator) -> bool:
+            row = simulator.fleet.row(truck_id)
+            return row is not None and simulator.fleet.velocity[row] == 0
+
+        source = {"when": "stopped", "truckId": truck_id, "ticks": ticks, "then": action, "once": once}
+        self.add_condition(stopped, action, ticks, once, source)
+
+    def _run(self, action):
+        """Actions are callables or scenario-file dicts"""
+        if callable(action):
+            action()
+            return
+
+        name = action["action"]
+        if name == "simulate_delay":
+            self.simulator.simulate_delay(action["truckId"], action.get("severity", "minor"))
+        elif name == "resolve_delay":
+            self.simulator.resolve_delay(action["truckId"])
+        elif name == "add_event":
+            self.simulator.add_event(action.get("eventType", "system"), action["message"], action.get("truckId"))
+        else:
+            raise ValueError(f"Unknown scenario action: {name}")
+
+    def advance(self, elapsed: float) -> int:
+        """Fire everything due by elapsed seconds, then check conditions; returns the number fired"""
+        self.elapsed = elapsed
+        fired = 0
+
+        while self._timers and self._timers[0][0] <= elapsed:
+            due, _, action, interval, repeat = heapq.heappop(self._timers)
+            self._run(action)
+            fired += 1
+            if interval and (repeat is None or repeat > 1):
+                self.add_scenario(due + interval, action, interval, None if repeat is None else repeat - 1)
+
+        for condition in list(self.conditions):
+            if not condition["predicate"](self.simulator):
+                condition["streak"] = 0
+                continue
+            condition["streak"] += 1
+            if condition["streak"] == condition["forTicks"]:
+                self._run(condition["action"])
+                fired += 1
+                if condition["once"]:
+                    self.conditions.remove(condition)
+
+        self.fired += fired
+        return fired
+
+    def state(self) -> Dict:
+        """
+        Pending timers and conditions for a snapshot. Only scenario-file entries can be
+        saved; ones registered with Python callables are left out.
+        """
+        return {
+            "elapsed": self.elapsed,
+            "fired": self.fired,
+            "timers": [
+                [due, action, interval, repeat]
+                for due, _, action, interval, repeat in sorted(self._timers, key=lambda timer: timer[:2])
+                if not callable(action)
+            ],
+            "conditions": [
+                {"source": condition["source"], "streak": condition["streak"]}
+                for condition in self.conditions
+                if condition["source"] is not None and not callable(condition["action"])
+            ]
+        }
 
-        while True:
-            current_time = datetime.now()
-            elapsed = (current_time - start_time).total_seconds()
+    def restore(self, state: Dict):
+        """Pick up a state() where it left off"""
+        self.elapsed = state["elapsed"]
+        self.fired = state["fired"]
+        for due, action, interval, repeat in state["timers"]:
+            self.add_scenario(due, action, interval, repeat)
+        for condition in state["conditions"]:
+            source = condition["source"]
+            self.when_stopped(source["truckId"], source["ticks"], source["then"], source["once"])
+            self.conditions[-1]["streak"] = condition["streak"]
+
+    def next_due(self) -> Optional[float]:
+        """Seconds at which the next timed scenario is due"""
+        return self._timers[0][0] if self._timers else None
+
+    def load(self, path: str) -> int:
+        """
+        Load a scenario script from disk; returns the number of entries
+        .json: {"events": [...], "conditions": [...]}  .jsonl: one event per line, streamed
+        """
+        count = 0
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        self._load_event(json.loads(line))
+                        count += 1
+                return count
+            script = json.load(f)
+
+        for event in script.get("events", []):
+            self._load_event(event)
+            count += 1
+        for condition in script.get("conditions", []):
+            if condition.get("when") != "stopped":
+                raise ValueError(f"Unknown scenario condition: {condition.get('when')}")
+            self.when_stopped(condition["truckId"], condition.get("ticks", 1), condition["then"],
+                              condition.get("once", True))
+            count += 1
+        return count
+
+    def _load_event(self, event: Dict):
+        self.add_scenario(event["at"], event, event.get("every"), event.get("repeat"))
 
-            for scenario in self.scenarios:
-                if not scenario["executed"] and elapsed >= scenario["delay"]:
-                    scenario["action"]()
-                    scenario["executed"] = True
+    async def run_scenarios(self):
+        """Execute timed scenarios in real time, waking only when the next one is due"""
+        start = asyncio.get_running_loop().time()
 
-            await asyncio.sleep(1)
+        while self._timers:
+            wait = self._timers[0][0] - (asyncio.get_running_loop().time() - start)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.advance(asyncio.get_running_loop().time() - start)
 
 
-def create_demo_scenarios(simulator: TruckSimulator) -> ScenarioEngine:
+def create_demo_scenarios(simulator: TruckSimulator, path: str = DEMO_SCENARIO_PATH) -> ScenarioEngine:
     """Create the demo scenario timeline"""
     engine = ScenarioEngine(simulator)
-
-    # T+0s: Initialize
-    engine.add_scenario(0, lambda: simulator.add_event(
-        "system", "🚀 Supply Chain Agent initialized", None
-    ))
-
-    # T+5s: TRK-402 stops
-    engine.add_scenario(5, lambda: simulator.simulate_delay("TRK-402", "critical"))
-
-    # T+8s: Escalate to critical
-    engine.add_scenario(8, lambda: simulator.add_event(
-        "alert", "⚠️ TRK-402 CRITICAL - SLA threshold exceeded", "TRK-402"
-    ))
-
+    engine.load(path)
     return engine
 
 
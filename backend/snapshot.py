@@ -0,0 +1,211 @@
+"""
+Simulation Snapshots
+Point-in-time copies of a shard (fleet columns, events, scenario timers, the contracts
+its trucks carry and cached analyses) written as .npy columns plus one JSON document,
+and loaded back through memory maps for warm restarts and reproducible benchmark fixtures
+
+Usage:
+    python snapshot.py create data/fixtures/fleet-100k --fleet-size 100000 --seed 42
+    python snapshot.py info data/snapshot
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from contract_analyzer import ContractAnalyzer
+from contract_store import InMemoryContractStore
+from event_log import EventLog
+from fleet_store import FleetStore
+from shard import FleetShard
+from simulation import DEFAULT_TIME_SCALE, ScenarioEngine, TruckSimulator
+
+SNAPSHOT_VERSION = 1
+STATE_FILE = "state.json"
+COLUMNS_DIR = "columns"
+
+# Fixtures are dated from this instead of the clock, so a seed gives the same deadlines and files every time
+FIXTURE_EPOCH = datetime(2025, 1, 1)
+
+
+class Snapshot:
+    """Captured state, detached from the live shard so it can be written off the event loop"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], state: Dict):
+        self.arrays = arrays
+        self.state = state
+
+
+def capture(shard: FleetShard, elapsed: float, created_at: Optional[datetime] = None) -> Snapshot:
+    """Copy everything a restart needs; the copies are what make writing it later safe"""
+    simulator = shard.simulator
+    arrays, fleet = simulator.fleet.state()
+    contract_ids = sorted({contract_id for contract_id in fleet["contractIds"] if contract_id})
+    contracts = shard.analyzer.contracts.get_many(contract_ids)
+
+    return Snapshot(arrays, {
+        "version": SNAPSHOT_VERSION,
+        "createdAt": (created_at or datetime.now()).isoformat(),
+        "elapsed": elapsed,
+        "timeScale": simulator.time_scale,
+        "fleet": fleet,
+        "events": simulator.events.state(),
+        "scenario": shard.scenario_engine.state(),
+        "arbitrage": {"delayedSince": dict(shard.delayed_since), "alerted": sorted(shard.alerted)},
+        "contracts": [contract for contract in contracts.values() if contract],
+        "analyses": shard.analyzer.analysis_cache.state()
+    })
+
+
+def _readable(path: str) -> Optional[str]:
+    """path, or the copy a write moved aside if it was interrupted before swapping the new one in"""
+    for candidate in (path, path + ".old"):
+        if os.path.isfile(os.path.join(candidate, STATE_FILE)):
+            return candidate
+    return None
+
+
+def write(snapshot: Snapshot, path: str):
+    """
+    Write to a sibling directory and swap it in, so a crash mid-write never leaves a torn snapshot.
+    Between the two renames only path + ".old" exists; exists() and load() fall back to it.
+    """
+    previous = path + ".old"
+    if _readable(path) == previous:
+        # The last write stopped mid-swap: put its predecessor back before anything is deleted
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(previous, path)
+
+    staging = path + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(os.path.join(staging, COLUMNS_DIR))
+
+    for name, column in snapshot.arrays.items():
+        np.save(os.path.join(staging, COLUMNS_DIR, f"{name}.npy"), column, allow_pickle=False)
+    with open(os.path.join(staging, STATE_FILE), "w", encoding="utf-8") as f:
+        json.dump(snapshot.state, f)
+
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def save(shard: FleetShard, path: str, elapsed: float = 0.0, created_at: Optional[datetime] = None):
+    write(capture(shard, elapsed, created_at), path)
+
+
+def exists(path: str) -> bool:
+    return _readable(path) is not None
+
+
+def load(path: str) -> Snapshot:
+    """Read a snapshot with its columns memory-mapped copy-on-write: pages load when first touched"""
+    path = _readable(path) or path
+    with open(os.path.join(path, STATE_FILE), encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {state.get('version')}")
+
+    columns = os.path.join(path, COLUMNS_DIR)
+    arrays = {
+        name[:-4]: np.load(os.path.join(columns, name), mmap_mode="c", allow_pickle=False)
+        for name in os.listdir(columns) if name.endswith(".npy")
+    }
+    return Snapshot(arrays, state)
+
+
+def restore(path: str, analyzer: ContractAnalyzer, events: Optional[EventLog] = None,
+            time_scale: Optional[float] = None, **shard_options) -> Tuple[FleetShard, float]:
+    """Rebuild a shard from a snapshot; returns it with the simulation seconds it had reached"""
+    snapshot = load(path)
+    state = snapshot.state
+
+    events = events if events is not None else EventLog()
+    events.restore(state["events"])
+    simulator = TruckSimulator(events=events, fleet=FleetStore.from_state(snapshot.arrays, state["fleet"]),
+                               time_scale=state["timeScale"] if time_scale is None else time_scale)
+
+    scenario_engine = ScenarioEngine(simulator)
+    scenario_engine.restore(state["scenario"])
+
+    # The analyzer re-seeds the demo contracts with fresh deadlines; put back the ones the fleet was running on
+    analyzer.contracts.put_many(state["contracts"])
+    analyzer.analysis_cache.restore(state["analyses"])
+
+    shard = FleetShard(simulator, analyzer, scenario_engine, **shard_options)
+    shard.delayed_since.update(state["arbitrage"]["delayedSince"])
+    shard.alerted.update(state["arbitrage"]["alerted"])
+    return shard, state["elapsed"]
+
+
+class SnapshotWriter:
+    """Saves a shard every interval seconds of simulation time, writing in a worker thread"""
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self._last = None
+        self._task: Optional[asyncio.Task] = None
+
+    def maybe_save(self, shard: FleetShard, elapsed: float):
+        """Call once per tick; capture is a memcpy of the columns, the disk write happens off the loop"""
+        if self.interval <= 0 or (self._task and not self._task.done()):
+            return
+        if self._last is None:
+            self._last = elapsed
+        if elapsed - self._last < self.interval:
+            return
+        self._last = elapsed
+        self._task = asyncio.create_task(asyncio.to_thread(write, capture(shard, elapsed), self.path))
+
+    def save_now(self, shard: FleetShard, elapsed: float):
+        """Blocking save, for shutdown"""
+        if self.interval > 0:
+            save(shard, self.path, elapsed)
+
+
+def create_fixture(path: str, fleet_size: int, seed: int, time_scale: float = DEFAULT_TIME_SCALE):
+    """Build a seeded fleet and save it; the same arguments always give the same files"""
+    epoch = FIXTURE_EPOCH + timedelta(days=seed % 365)
+    simulator = TruckSimulator(fleet_size, seed, events=EventLog(), time_scale=time_scale, demo_trucks=False,
+                               epoch=epoch)
+    analyzer = ContractAnalyzer(cache=AnalysisCache(path=None), contracts=InMemoryContractStore())
+    save(FleetShard(simulator, analyzer, ScenarioEngine(simulator)), path, created_at=epoch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or inspect simulation snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Save a seeded synthetic fleet as a benchmark fixture")
+    create.add_argument("path")
+    create.add_argument("--fleet-size", type=int, default=10000)
+    create.add_argument("--seed", type=int, default=0)
+    info = commands.add_parser("info", help="Load a snapshot and report what is in it")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        started = time.perf_counter()
+        create_fixture(args.path, args.fleet_size, args.seed)
+        print(f"📸 {args.fleet_size:,} trucks (seed {args.seed}) -> {args.path} "
+              f"in {time.perf_counter() - started:.2f}s")
+    else:
+        started = time.perf_counter()
+        shard, elapsed = restore(args.path, ContractAnalyzer(cache=AnalysisCache(path=None),
+                                                             contracts=InMemoryContractStore()))
+        seconds = time.perf_counter() - started
+        state = load(args.path).state
+        print(f"📸 {args.path}: taken {state['createdAt']}, t={elapsed:g}s")
+        print(f"   {shard.simulator.fleet.size:,} trucks, {len(shard.simulator.events)} events, "
+              f"{len(shard.scenario_engine)} pending timers, {len(state['contracts'])} contracts")
+        print(f"   restored in {seconds * 1000:.0f} ms")
@@ -0,0 +1,180 @@
+"""
+Spatial Grid Index
+Uniform lon/lat grid over live positions for radius and k-nearest queries
+"""
+
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+# ~28 km cells: a city-scale radius query touches a handful of cells
+DEFAULT_CELL_DEGREES = 0.25
+
+# Up to this fraction of keys changing cell, they are merged into the cell ordering instead of re-sorting it
+INCREMENTAL_FRACTION = 0.25
+
+# Cell coordinates are packed into one int64 so whole columns compare at once
+_CELL_STRIDE = 1 << 20
+_CELL_OFFSET = _CELL_STRIDE // 2
+
+
+def _pack_cell(x, y):
+    return (x + _CELL_OFFSET) * _CELL_STRIDE + (y + _CELL_OFFSET)
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """Great-circle distance in km; works on scalars and NumPy arrays"""
+    lon1, lat1, lon2, lat2 = (np.radians(v) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialGrid:
+    """Grid-bucketed positions keyed by integer row, updated incrementally"""
+
+    def __init__(self, cell_degrees: float = DEFAULT_CELL_DEGREES, capacity: int = 16):
+        self.cell_degrees = cell_degrees
+        self.positions = np.zeros((max(1, capacity), 2), dtype=np.float64)
+        self.cell_of = np.full(max(1, capacity), -1, dtype=np.int64)
+        self.size = 0
+
+        # Keys sorted by cell; a cell's keys are one contiguous slice of _order
+        self._order = np.zeros(0, dtype=np.int64)
+        self._sorted_cells = np.zeros(0, dtype=np.int64)
+        self._dirty = False
+        # Keys that changed cell since the ordering was last brought up to date
+        self._moved: List[np.ndarray] = []
+        self._moved_count = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.cell_of[:self.size] != -1))
+
+    def _cell_ids(self, positions: np.ndarray) -> np.ndarray:
+        cells = np.floor(positions / self.cell_degrees).astype(np.int64)
+        return _pack_cell(cells[:, 0], cells[:, 1])
+
+    def _ensure(self, max_key: int):
+        if max_key < len(self.cell_of):
+            return
+        capacity = len(self.cell_of)
+        while capacity <= max_key:
+            capacity *= 2
+        positions = np.zeros((capacity, 2), dtype=np.float64)
+        positions[:len(self.positions)] = self.positions
+        cell_of = np.full(capacity, -1, dtype=np.int64)
+        cell_of[:len(self.cell_of)] = self.cell_of
+        self.positions, self.cell_of = positions, cell_of
+
+    def update_many(self, keys: Sequence[int], positions):
+        """Insert or move many keys; the cell ordering is only updated, before the next query, if a key changed cell"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(keys):
+            return
+        self._ensure(int(keys.max()))
+        self.size = max(self.size, int(keys.max()) + 1)
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.positions[keys] = positions
+        new_cells = self._cell_ids(positions)
+        changed = new_cells != self.cell_of[keys]
+        if changed.any():
+            self.cell_of[keys[changed]] = new_cells[changed]
+            self._mark_moved(keys[changed])
+
+    def update(self, key: int, lon: float, lat: float):
+        """Insert or move one key"""
+        self.update_many([key], np.array([[lon, lat]]))
+
+    def remove(self, key: int):
+        """Drop a key from the index"""
+        if key < len(self.cell_of) and self.cell_of[key] != -1:
+            self.cell_of[key] = -1
+            self._mark_moved(np.array([key], dtype=np.int64))
+
+    def _mark_moved(self, keys: np.ndarray):
+        self._moved.append(keys)
+        self._moved_count += len(keys)
+        self._dirty = True
+
+    def _rebuild(self):
+        """
+        Bring the cell ordering up to date, lazily before a query. Moved keys are taken out and
+        merged back in at their new cells, linear in the index; when many moved, re-sorting is cheaper.
+        """
+        if self._moved_count > self.size * INCREMENTAL_FRACTION:
+            cells = self.cell_of[:self.size]
+            self._order = np.argsort(cells, kind="stable")
+            self._sorted_cells = cells[self._order]
+        else:
+            moved = np.unique(np.concatenate(self._moved))
+            stale = np.zeros(self.size, dtype=bool)
+            stale[moved] = True
+            keep = ~stale[self._order]
+            order, cells = self._order[keep], self._sorted_cells[keep]
+
+            moved = moved[self.cell_of[moved] != -1]
+            moved_cells = self.cell_of[moved]
+            by_cell = np.argsort(moved_cells, kind="stable")
+            moved, moved_cells = moved[by_cell], moved_cells[by_cell]
+            at = np.searchsorted(cells, moved_cells, side="right")
+            self._order = np.insert(order, at, moved)
+            self._sorted_cells = np.insert(cells, at, moved_cells)
+        self._moved = []
+        self._moved_count = 0
+        self._dirty = False
+
+    def _candidates(self, lon: float, lat: float, radius_km: float) -> np.ndarray:
+        """Keys in every cell overlapping the query circle's bounding box"""
+        if self._dirty:
+            self._rebuild()
+
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lon_span = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        x0 = math.floor((lon - lon_span) / self.cell_degrees)
+        x1 = math.floor((lon + lon_span) / self.cell_degrees)
+        y0 = math.floor((lat - lat_span) / self.cell_degrees)
+        y1 = math.floor((lat + lat_span) / self.cell_degrees)
+
+        # Within one grid column the cells y0..y1 are adjacent in the sort order
+        columns = np.arange(x0, x1 + 1, dtype=np.int64)
+        lows = np.searchsorted(self._sorted_cells, _pack_cell(columns, y0), side="left")
+        highs = np.searchsorted(self._sorted_cells, _pack_cell(columns, y1), side="right")
+        slices = [self._order[low:high] for low, high in zip(lows.tolist(), highs.tolist()) if high > low]
+        if not slices:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def within_radius(self, lon: float, lat: float, radius_km: float) -> List[Tuple[int, float]]:
+        """All keys within radius_km, nearest first, as (key, distance_km)"""
+        keys = self._candidates(lon, lat, radius_km)
+        if not len(keys):
+            return []
+        points = self.positions[keys]
+        distances = haversine_km(lon, lat, points[:, 0], points[:, 1])
+        inside = distances <= radius_km
+        keys, distances = keys[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return list(zip(keys[order].tolist(), distances[order].tolist()))
+
+    def expanding(self, lon: float, lat: float, max_radius_km: float = 2000.0):
+        """Yield (radius_km, hits) for radii doubling from one cell up to max_radius_km"""
+        radius = self.cell_degrees * KM_PER_DEGREE_LAT
+        while True:
+            radius = min(radius, max_radius_km)
+            yield radius, self.within_radius(lon, lat, radius)
+            if radius >= max_radius_km:
+                return
+            radius *= 2
+
+    def nearest(self, lon: float, lat: float, k: int = 1, max_radius_km: float = 2000.0) -> List[Tuple[int, float]]:
+        """The k nearest keys within max_radius_km, as (key, distance_km)"""
+        found: List[Tuple[int, float]] = []
+        for _, found in self.expanding(lon, lat, max_radius_km):
+            # Everything within the radius was found, so the closest k are exact
+            if len(found) >= k:
+                break
+        return found[:k]
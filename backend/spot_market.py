@@ -0,0 +1,357 @@
+"""
+Spot Market Quote Engine
+Provider quotes indexed by region and kept sorted by cost and by ETA, with TTL expiry and top-k selection
+
+Usage:
+    python spot_market.py generate 5000 data/spot_quotes.json   # synthetic feed for load testing
+"""
+
+import asyncio
+import bisect
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spatial_index import KM_PER_DEGREE_LAT, haversine_km
+
+# ~111 km regions: a 250 km search touches a few dozen of them
+REGION_DEGREES = 1.0
+
+# Quotes without their own expiresAt or ttlSeconds stay valid this long
+DEFAULT_QUOTE_TTL = 300.0
+
+# Expired quotes are dropped from the live book at least this often between feed refreshes
+PURGE_SECONDS = 10.0
+
+# Selection trades cost against time and reliability: score = cost + minutes * price + availability risk
+COST_PER_MINUTE = 2.0
+AVAILABILITY_PENALTY = {"high": 0.0, "medium": 100.0, "low": 300.0}
+
+# Depots used when generating a synthetic feed
+FEED_HUBS = [
+    [72.8777, 19.0760], [73.8567, 18.5204], [77.5946, 12.9716], [78.4867, 17.3850], [80.2707, 13.0827],
+    [88.3639, 22.5726], [85.8245, 20.2961], [77.1025, 28.7041], [72.5714, 23.0225], [79.0882, 21.1458]
+]
+
+_ETA_MINUTES = re.compile(r"(\d+(?:\.\d+)?)\s*(min|minute|minutes|h|hr|hrs|hour|hours)\b", re.IGNORECASE)
+
+# Sorted index entries: (sort key, tie-break key, quote id)
+Entry = Tuple[float, float, str]
+
+
+def _eta_minutes(quote: Dict) -> float:
+    if "etaMinutes" in quote:
+        return float(quote["etaMinutes"])
+    match = _ETA_MINUTES.search(str(quote.get("eta", "")))
+    if not match:
+        return math.inf
+    value = float(match.group(1))
+    return value * 60 if match.group(2).lower().startswith("h") else value
+
+
+def _timestamp(value) -> Optional[float]:
+    """Epoch seconds from a feed timestamp: epoch seconds or milliseconds, or an ISO 8601 string"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def _expires_at(quote: Dict, now: float, ttl: Optional[float]) -> Optional[float]:
+    """The feed's own expiresAt, else quotedAt (or now) plus the quote's or the default TTL"""
+    expires_at = _timestamp(quote.get("expiresAt"))
+    if expires_at is not None:
+        return expires_at
+    ttl = quote.get("ttlSeconds", ttl)
+    if ttl is None:
+        return None
+    quoted_at = _timestamp(quote.get("quotedAt"))
+    return (quoted_at if quoted_at is not None else now) + float(ttl)
+
+
+def normalize_quote(quote: Dict, now: Optional[float] = None, ttl: Optional[float] = DEFAULT_QUOTE_TTL) -> Dict:
+    """Validate a feed or legacy provider quote and fill in id, ETA minutes and expiry; raises ValueError"""
+    now = time.time() if now is None else now
+    cost = quote.get("cost", quote.get("baseCost"))
+    location = quote.get("location")
+    try:
+        cost = cost if isinstance(cost, (int, float)) else float(cost)
+        lon, lat = float(location[0]), float(location[1])
+        minutes = _eta_minutes(quote)
+    except (TypeError, ValueError, IndexError) as e:
+        raise ValueError(f"Malformed quote {quote.get('id')!r}: {e}")
+    if not quote.get("provider") or math.isnan(cost) or len(location) != 2:
+        raise ValueError(f"Malformed quote {quote.get('id')!r}: needs a provider, a cost and a [lon, lat] location")
+
+    normalized = {
+        "id": quote.get("id") or f"{quote['provider']}@{lon:.4f},{lat:.4f}",
+        "provider": quote["provider"],
+        "cost": cost,
+        "etaMinutes": minutes,
+        "eta": quote.get("eta") or f"{minutes:g} minutes",
+        "availability": quote.get("availability", "medium"),
+        "location": [lon, lat],
+        "expiresAt": _expires_at(quote, now, ttl)
+    }
+    return normalized
+
+
+class QuoteBook:
+    """One consistent generation of quotes with its region and global sorted indexes"""
+
+    def __init__(self, region_degrees: float = REGION_DEGREES):
+        self.region_degrees = region_degrees
+        self.quotes: Dict[str, Dict] = {}
+        self.by_cost: Dict[Tuple[int, int], List[Entry]] = {}
+        self.by_eta: Dict[Tuple[int, int], List[Entry]] = {}
+        self.all_by_cost: List[Entry] = []
+        self.all_by_eta: List[Entry] = []
+
+    @classmethod
+    def build(cls, quotes: Iterable[Dict], region_degrees: float = REGION_DEGREES) -> "QuoteBook":
+        """Bulk-build sorted indexes: one sort per list instead of an insert per quote"""
+        book = cls(region_degrees)
+        for quote in quotes:
+            book.quotes[quote["id"]] = quote
+        for quote in book.quotes.values():
+            region = book.region(quote["location"])
+            book.by_cost.setdefault(region, []).append((quote["cost"], quote["etaMinutes"], quote["id"]))
+            book.by_eta.setdefault(region, []).append((quote["etaMinutes"], quote["cost"], quote["id"]))
+        for index in (book.by_cost, book.by_eta):
+            for entries in index.values():
+                entries.sort()
+        book.all_by_cost = sorted(entry for entries in book.by_cost.values() for entry in entries)
+        book.all_by_eta = sorted(entry for entries in book.by_eta.values() for entry in entries)
+        return book
+
+    def region(self, location: Sequence[float]) -> Tuple[int, int]:
+        return (int(location[0] // self.region_degrees), int(location[1] // self.region_degrees))
+
+    def regions_near(self, location: Sequence[float], radius_km: float) -> List[Tuple[int, int]]:
+        """Regions overlapping the bounding box of a radius around location"""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(location[1])), 0.01))
+        x0, y0 = self.region((location[0] - dlon, location[1] - dlat))
+        x1, y1 = self.region((location[0] + dlon, location[1] + dlat))
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if (x, y) in self.by_cost]
+
+    def add(self, quote: Dict):
+        if quote["id"] in self.quotes:
+            self.remove(quote["id"])
+        self.quotes[quote["id"]] = quote
+        region = self.region(quote["location"])
+        cost_entry = (quote["cost"], quote["etaMinutes"], quote["id"])
+        eta_entry = (quote["etaMinutes"], quote["cost"], quote["id"])
+        bisect.insort(self.by_cost.setdefault(region, []), cost_entry)
+        bisect.insort(self.by_eta.setdefault(region, []), eta_entry)
+        bisect.insort(self.all_by_cost, cost_entry)
+        bisect.insort(self.all_by_eta, eta_entry)
+
+    def remove(self, quote_id: str):
+        quote = self.quotes.pop(quote_id, None)
+        if quote is None:
+            return
+        region = self.region(quote["location"])
+        for entries, entry in (
+            (self.by_cost[region], (quote["cost"], quote["etaMinutes"], quote_id)),
+            (self.by_eta[region], (quote["etaMinutes"], quote["cost"], quote_id)),
+            (self.all_by_cost, (quote["cost"], quote["etaMinutes"], quote_id)),
+            (self.all_by_eta, (quote["etaMinutes"], quote["cost"], quote_id)),
+        ):
+            at = bisect.bisect_left(entries, entry)
+            if at < len(entries) and entries[at] == entry:
+                del entries[at]
+
+
+class SpotMarket:
+    """Spot-market quotes from pinned providers plus a refreshable feed"""
+
+    def __init__(self, region_degrees: float = REGION_DEGREES, cost_per_minute: float = COST_PER_MINUTE,
+                 availability_penalty: Optional[Dict[str, float]] = None):
+        self.region_degrees = region_degrees
+        self.cost_per_minute = cost_per_minute
+        self.availability_penalty = availability_penalty or AVAILABILITY_PENALTY
+        self._pinned: List[Dict] = []
+        self._added: Dict[str, Dict] = {}
+        self.book = QuoteBook(region_degrees)
+        self.refreshed_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.book.quotes)
+
+    def add_quotes(self, quotes: Iterable[Dict], ttl: Optional[float] = DEFAULT_QUOTE_TTL, pinned: bool = False):
+        """Insert quotes into the live book; unpinned ones survive refreshes until they expire"""
+        now = time.time()
+        for quote in quotes:
+            quote = normalize_quote(quote, now, None if pinned else ttl)
+            if pinned:
+                quote["expiresAt"] = None
+                self._pinned.append(quote)
+            else:
+                self._added[quote["id"]] = quote
+            self.book.add(quote)
+
+    def score(self, quote: Dict) -> float:
+        return (quote["cost"] + quote["etaMinutes"] * self.cost_per_minute +
+                self.availability_penalty.get(quote["availability"], max(self.availability_penalty.values())))
+
+    def _live(self, quote: Optional[Dict], now: float) -> bool:
+        return quote is not None and (quote["expiresAt"] is None or quote["expiresAt"] > now)
+
+    def top(self, location: Optional[Sequence[float]] = None, k: int = 3,
+            radius_km: Optional[float] = None) -> List[Dict]:
+        """The k best live quotes by score, optionally only those within radius_km of location"""
+        book = self.book
+        now = time.time()
+        if location is not None and radius_km is not None:
+            regions = book.regions_near(location, radius_km)
+            cost_stream: Iterator[Entry] = heapq.merge(*(book.by_cost[r] for r in regions))
+            eta_stream: Iterator[Entry] = heapq.merge(*(book.by_eta[r] for r in regions))
+        else:
+            cost_stream, eta_stream = iter(book.all_by_cost), iter(book.all_by_eta)
+
+        best_penalty = min(self.availability_penalty.values())
+        best: List[Tuple[float, int, Dict]] = []  # max-heap of the k best by negated score
+        order = itertools.count()
+        seen = set()
+        last_cost = last_minutes = 0.0
+
+        while True:
+            cost_entry = next(cost_stream, None)
+            eta_entry = next(eta_stream, None)
+            if cost_entry is None or eta_entry is None:
+                # Each list holds every candidate, so one running dry means all have been seen
+                break
+            last_cost, last_minutes = cost_entry[0], eta_entry[0]
+
+            for _, _, quote_id in (cost_entry, eta_entry):
+                if quote_id in seen:
+                    continue
+                seen.add(quote_id)
+                quote = book.quotes.get(quote_id)
+                if not self._live(quote, now):
+                    continue
+                distance = None
+                if location is not None:
+                    distance = float(haversine_km(location[0], location[1], *quote["location"]))
+                    if radius_km is not None and distance > radius_km:
+                        continue
+                candidate = (-self.score(quote), next(order), {**quote, "distanceKm": distance})
+                if len(best) < k:
+                    heapq.heappush(best, candidate)
+                elif candidate[0] > best[0][0]:
+                    heapq.heapreplace(best, candidate)
+
+            # No unseen quote can score below the last cost and ETA read from the two lists
+            threshold = last_cost + last_minutes * self.cost_per_minute + best_penalty
+            if len(best) == k and -best[0][0] <= threshold:
+                break
+
+        return [quote for _, _, quote in sorted(best, key=lambda item: (-item[0], item[1]))]
+
+    def best(self, location: Optional[Sequence[float]] = None, radius_km: Optional[float] = None) -> Optional[Dict]:
+        """Best quote near location, or the best anywhere when nothing nearby is live"""
+        found = self.top(location, 1, radius_km)
+        if not found and radius_km is not None:
+            found = self.top(location, 1)
+        return found[0] if found else None
+
+    def purge(self) -> int:
+        """Drop expired quotes from the live book; returns how many were removed"""
+        now = time.time()
+        expired = [quote_id for quote_id, quote in self.book.quotes.items() if not self._live(quote, now)]
+        for quote_id in expired:
+            self.book.remove(quote_id)
+        return len(expired)
+
+    def load_feed(self, path: str, ttl: float = DEFAULT_QUOTE_TTL) -> QuoteBook:
+        """Read a feed (.json list or .jsonl) and build a complete book off to the side"""
+        now = time.time()
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                feed = [line for line in f if line.strip()]
+            else:
+                feed = json.load(f)
+                if isinstance(feed, dict):
+                    feed = feed.get("quotes", [])
+
+        quotes = []
+        dropped = 0
+        for quote in feed:
+            try:
+                quotes.append(normalize_quote(json.loads(quote) if isinstance(quote, str) else quote, now, ttl))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                dropped += 1
+        if dropped:
+            print(f"⚠️  Dropped {dropped:,} malformed spot quotes from {path}")
+        # Quotes the feed still lists after they expired never enter the book
+        live = [quote for quote in quotes if quote["expiresAt"] is None or quote["expiresAt"] > now]
+        return QuoteBook.build(self._pinned + live, self.region_degrees)
+
+    async def refresh(self, path: str, ttl: float = DEFAULT_QUOTE_TTL) -> int:
+        """Rebuild from the feed in a worker thread, then swap the book in one assignment"""
+        book = await asyncio.to_thread(self.load_feed, path, ttl)
+        # Quotes added to the old book since it was built carry over until they expire
+        now = time.time()
+        for quote_id, quote in list(self._added.items()):
+            if not self._live(quote, now):
+                del self._added[quote_id]
+            elif quote_id not in book.quotes:
+                book.add(quote)
+        self.book = book
+        self.refreshed_at = time.time()
+        return len(self.book.quotes)
+
+    async def refresh_forever(self, path: str, interval: float, ttl: float = DEFAULT_QUOTE_TTL):
+        """Background task: reload the feed every interval seconds, keeping the last good book on errors"""
+        next_refresh = 0.0
+        while True:
+            if time.monotonic() >= next_refresh:
+                next_refresh = time.monotonic() + interval
+                try:
+                    await self.refresh(path, ttl)
+                except Exception as e:
+                    print(f"⚠️  Spot quote refresh failed: {e}")
+            else:
+                self.purge()
+            await asyncio.sleep(min(PURGE_SECONDS, max(next_refresh - time.monotonic(), 0.0)))
+
+
+def generate_feed(count: int, seed: int = 0) -> List[Dict]:
+    """Synthetic provider quotes scattered around freight hubs"""
+    rng = np.random.default_rng(seed)
+    hubs = np.array(FEED_HUBS)[rng.integers(0, len(FEED_HUBS), count)]
+    locations = hubs + rng.normal(0.0, 0.6, (count, 2))
+    availability = np.array(list(AVAILABILITY_PENALTY))[rng.integers(0, len(AVAILABILITY_PENALTY), count)]
+    return [
+        {
+            "id": f"Q-{i:06d}",
+            "provider": f"Carrier {i % 997:03d}",
+            "cost": int(rng.integers(600, 2000)),
+            "etaMinutes": int(rng.integers(15, 240)),
+            "availability": str(availability[i]),
+            "location": locations[i].round(4).tolist(),
+            "ttlSeconds": int(rng.integers(120, 900))
+        }
+        for i in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "generate":
+        os.makedirs(os.path.dirname(sys.argv[3]) or ".", exist_ok=True)
+        with open(sys.argv[3], "w", encoding="utf-8") as f:
+            json.dump(generate_feed(int(sys.argv[2])), f)
+        print(f"💱 Wrote {int(sys.argv[2]):,} quotes to {sys.argv[3]}")
+    else:
+        print("Usage: python spot_market.py generate COUNT feed.json")
@@ -0,0 +1,63 @@
+"""
+Local Stub for the OpenAI Chat Completions API
+Lets ai_contract_analysis run end-to-end without network access or an API key
+
+Usage:
+    python stub_openai_server.py --port 8089 --latency 0.5
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://localhost:8089/v1 python server.py
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+STUB_ANALYSIS = {
+    "penalty": 1250,
+    "alternatives": ["Relief truck via spot market", "Pay penalty"],
+    "recommendation": "Book alternative truck"
+}
+
+
+def create_app(latency: float = 0.0) -> web.Application:
+    """Build the stub app; latency simulates a slow completion"""
+    app = web.Application()
+    app["requests"] = 0
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        app["requests"] += 1
+        await asyncio.sleep(latency)
+
+        return web.json_response({
+            "id": f"chatcmpl-stub-{app['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(STUB_ANALYSIS)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response({"requests": app["requests"]})
+
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI API server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to wait before each response")
+    args = parser.parse_args()
+
+    print(f"🧪 Stub OpenAI API on http://{args.host}:{args.port}/v1 (latency {args.latency}s)")
+    web.run_app(create_app(args.latency), host=args.host, port=args.port, print=None)
@@ -0,0 +1,230 @@
+"""
+Client Subscriptions
+Routes truck updates and events only to the clients watching them
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from fleet_store import FleetStore
+
+# Bounding boxes are indexed on a lon/lat grid of this many degrees per cell
+SUBSCRIPTION_CELL_DEGREES = 1.0
+
+BBox = Tuple[float, float, float, float]  # (minLon, minLat, maxLon, maxLat)
+
+
+class Subscription:
+    """What one client asked to watch, plus what it has been sent so far"""
+
+    def __init__(self, truck_ids: Iterable[str], contract_ids: Iterable[str], bbox: Optional[BBox]):
+        self.truck_ids: Set[str] = set(truck_ids)
+        self.contract_ids: Set[str] = set(contract_ids)
+        self.bbox = bbox
+        self.visible: Set[str] = set()
+        self.last_seq = 0
+
+    def matches(self, truck_id: str, contract_id: Optional[str], position) -> bool:
+        if truck_id in self.truck_ids or contract_id in self.contract_ids:
+            return True
+        if self.bbox:
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            return min_lon <= position[0] <= max_lon and min_lat <= position[1] <= max_lat
+        return False
+
+
+def parse_bbox(value) -> Optional[BBox]:
+    """Validate a [minLon, minLat, maxLon, maxLat] list from a client message"""
+    if value is None:
+        return None
+    if len(value) != 4:
+        raise ValueError("bbox must be [minLon, minLat, maxLon, maxLat]")
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in value)
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+class SubscriptionIndex:
+    """Inverted indexes from truck, contract and map cell to subscribed clients"""
+
+    def __init__(self, cell_degrees: float = SUBSCRIPTION_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.subscriptions: Dict[object, Subscription] = {}
+        self.by_truck: Dict[str, Set[object]] = defaultdict(set)
+        self.by_contract: Dict[str, Set[object]] = defaultdict(set)
+        self.by_cell: Dict[Tuple[int, int], Set[object]] = defaultdict(set)
+        # Clients currently holding a copy of each truck, so they can be told when it leaves
+        self.visible_by_truck: Dict[str, Set[object]] = defaultdict(set)
+
+    def __contains__(self, websocket) -> bool:
+        return websocket in self.subscriptions
+
+    def _cell(self, position) -> Tuple[int, int]:
+        return (math.floor(position[0] / self.cell_degrees), math.floor(position[1] / self.cell_degrees))
+
+    def _cells(self, bbox: BBox) -> List[Tuple[int, int]]:
+        low = self._cell(bbox[:2])
+        high = self._cell(bbox[2:])
+        return [(x, y) for x in range(low[0], high[0] + 1) for y in range(low[1], high[1] + 1)]
+
+    def subscribe(self, websocket, truck_ids: Iterable[str] = (), contract_ids: Iterable[str] = (),
+                  bbox: Optional[BBox] = None) -> Subscription:
+        """Replace a client's subscription"""
+        self.unsubscribe(websocket)
+        subscription = Subscription(truck_ids, contract_ids, bbox)
+        self.subscriptions[websocket] = subscription
+
+        for truck_id in subscription.truck_ids:
+            self.by_truck[truck_id].add(websocket)
+        for contract_id in subscription.contract_ids:
+            self.by_contract[contract_id].add(websocket)
+        if bbox:
+            for cell in self._cells(bbox):
+                self.by_cell[cell].add(websocket)
+        return subscription
+
+    def unsubscribe(self, websocket):
+        """Return a client to receiving the whole fleet"""
+        subscription = self.subscriptions.pop(websocket, None)
+        if not subscription:
+            return
+
+        for truck_id in subscription.truck_ids:
+            self._discard(self.by_truck, truck_id, websocket)
+        for contract_id in subscription.contract_ids:
+            self._discard(self.by_contract, contract_id, websocket)
+        if subscription.bbox:
+            for cell in self._cells(subscription.bbox):
+                self._discard(self.by_cell, cell, websocket)
+        for truck_id in subscription.visible:
+            self._discard(self.visible_by_truck, truck_id, websocket)
+
+    @staticmethod
+    def _discard(index: Dict, key, websocket):
+        watchers = index.get(key)
+        if watchers is not None:
+            watchers.discard(websocket)
+            if not watchers:
+                del index[key]
+
+    def _watchers(self, truck_id: str, contract_id: Optional[str], position) -> Set[object]:
+        watchers = set(self.visible_by_truck.get(truck_id, ()))
+        watchers.update(self.by_truck.get(truck_id, ()))
+        if contract_id:
+            watchers.update(self.by_contract.get(contract_id, ()))
+        watchers.update(self.by_cell.get(self._cell(position), ()))
+        return watchers
+
+    def matching_rows(self, websocket, fleet: FleetStore) -> np.ndarray:
+        """Rows of every truck a client's subscription currently matches"""
+        subscription = self.subscriptions[websocket]
+        n = fleet.size
+        mask = np.zeros(n, dtype=bool)
+
+        rows = [fleet.row(truck_id) for truck_id in subscription.truck_ids]
+        mask[[row for row in rows if row is not None]] = True
+        for contract_id in subscription.contract_ids:
+            mask[fleet.rows_for_contract(contract_id)] = True
+        if subscription.bbox:
+            min_lon, min_lat, max_lon, max_lat = subscription.bbox
+            lon = fleet.positions[:n, 0]
+            lat = fleet.positions[:n, 1]
+            mask |= (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        return np.flatnonzero(mask)
+
+    def filter_snapshot(self, websocket, snapshot: Dict, fleet: FleetStore) -> Dict:
+        """Narrow a full snapshot to one client's subscription and reset its baseline"""
+        subscription = self.subscriptions.get(websocket)
+        if not subscription:
+            return snapshot
+
+        for truck_id in subscription.visible:
+            self._discard(self.visible_by_truck, truck_id, websocket)
+        rows = self.matching_rows(websocket, fleet).tolist()
+        trucks = [fleet.to_dict(row) for row in rows]
+        subscription.visible = {truck["id"] for truck in trucks}
+        for truck_id in subscription.visible:
+            self.visible_by_truck[truck_id].add(websocket)
+        subscription.last_seq = snapshot["seq"]
+
+        data = snapshot["data"]
+        return {
+            **snapshot,
+            "data": {
+                **data,
+                "trucks": trucks,
+                "events": self._visible_events(subscription, data["events"]),
+            }
+        }
+
+    def filter_events(self, websocket, events: List[Dict]) -> List[Dict]:
+        """Drop events about trucks a subscribed client cannot see"""
+        subscription = self.subscriptions.get(websocket)
+        return self._visible_events(subscription, events) if subscription else events
+
+    @staticmethod
+    def _visible_events(subscription: Subscription, events: List[Dict]) -> List[Dict]:
+        return [
+            event for event in events
+            if event.get("truckId") is None or event["truckId"] in subscription.visible
+        ]
+
+    def route_delta(self, delta: Dict, fleet: FleetStore) -> Dict[object, Dict]:
+        """Split a fleet-wide state_delta into per-client deltas for subscribed clients"""
+        if not self.subscriptions:
+            return {}
+
+        updates: Dict[object, List[Dict]] = defaultdict(list)
+        removed: Dict[object, List[str]] = defaultdict(list)
+
+        for update in delta["data"]["trucks"]:
+            truck_id = update["id"]
+            row = fleet.row(truck_id)
+            contract_id = fleet.contract_ids[row]
+            position = fleet.positions[row]
+
+            for websocket in self._watchers(truck_id, contract_id, position):
+                subscription = self.subscriptions[websocket]
+                if subscription.matches(truck_id, contract_id, position):
+                    if truck_id in subscription.visible:
+                        updates[websocket].append(update)
+                    else:
+                        # Newly in view: the client has never seen this truck's route
+                        subscription.visible.add(truck_id)
+                        self.visible_by_truck[truck_id].add(websocket)
+                        updates[websocket].append(fleet.to_dict(row))
+                elif truck_id in subscription.visible:
+                    subscription.visible.discard(truck_id)
+                    self._discard(self.visible_by_truck, truck_id, websocket)
+                    removed[websocket].append(truck_id)
+
+        events = delta["data"]["events"]
+        # Without new events only clients that had truck changes can need a frame
+        targets = self.subscriptions if events else set(updates) | set(removed)
+        routed = {}
+        for websocket in targets:
+            subscription = self.subscriptions[websocket]
+            client_events = self._visible_events(subscription, events) if events else []
+            if not (updates.get(websocket) or removed.get(websocket) or client_events):
+                continue
+
+            data = {
+                "trucks": updates.get(websocket, []),
+                "events": client_events,
+                "timestamp": delta["data"]["timestamp"]
+            }
+            if websocket in removed:
+                data["removed"] = removed[websocket]
+            # baseSeq is the last frame this client received, so skipped ticks are not gaps
+            routed[websocket] = {**delta, "baseSeq": subscription.last_seq, "data": data}
+            subscription.last_seq = delta["seq"]
+        return routed
+
+    def wants(self, websocket, truck_id: Optional[str]) -> bool:
+        """Whether a client should receive a message about one truck"""
+        subscription = self.subscriptions.get(websocket)
+        return subscription is None or truck_id is None or truck_id in subscription.visible
@@ -0,0 +1,307 @@
+"""
+Telemetry Ingest
+Batched GPS position/speed reports from real trucks, validated in bulk, buffered between
+ticks and applied to the fleet once per tick, with incremental stop/slowdown detection
+"""
+
+import asyncio
+import socket
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from codec import JSON
+from fleet_store import CRITICAL, DELAYED, ON_TIME
+from metrics import registry
+from simulation import TruckSimulator
+from spatial_index import haversine_km
+
+# Binary report layout for UDP datagrams: a datagram is any number of these, back to back
+REPORT_DTYPE = np.dtype([
+    ("truck_id", "S16"),    # ASCII, NUL-padded
+    ("lon", "<f8"),
+    ("lat", "<f8"),
+    ("velocity", "<f4"),    # km/h
+    ("timestamp", "<f8"),   # Unix seconds; 0 means "when received"
+])
+
+# Faster than this is a bad report, not a truck
+MAX_SPEED_KMH = 160.0
+# Reports from further in the future than this are rejected
+MAX_CLOCK_SKEW_SECONDS = 5.0
+# Reports buffered between ticks; beyond this, batches are refused rather than queued
+MAX_PENDING_REPORTS = 1_000_000
+# A live truck with no report for this long goes back to being dead-reckoned along its route
+STALE_SECONDS = 120.0
+
+# Incremental anomaly detection over each truck's reports
+SPEED_EWMA_ALPHA = 0.3
+STOPPED_KMH = 3.0
+STOPPED_SECONDS = 300.0       # stopped this long: critical
+SLOWING_RATIO = 0.5           # smoothed speed under half of cruise: delayed
+
+# Kernel receive buffer asked for on the UDP socket, so bursts between event-loop turns are not dropped
+UDP_RECEIVE_BUFFER_BYTES = 8 * 1024 * 1024
+
+REJECT_REASONS = ("unknown", "invalid", "stale", "jump", "backpressure")
+
+reports_total = {
+    result: registry.counter("telemetry_reports_total", "Telemetry reports received", {"result": result})
+    for result in ("accepted",) + REJECT_REASONS
+}
+apply_seconds = registry.histogram("telemetry_apply_seconds", "Time spent applying buffered reports each tick")
+
+
+class TelemetryIngest:
+    """Validates report batches as they arrive and folds them into the fleet on apply()"""
+
+    def __init__(self, simulator: TruckSimulator, max_pending: int = MAX_PENDING_REPORTS,
+                 stale_seconds: float = STALE_SECONDS):
+        self.simulator = simulator
+        self.max_pending = max_pending
+        self.stale_seconds = stale_seconds
+        self._pending = []
+        self._pending_count = 0
+
+        # Per-row tracking, grown with the fleet
+        self.last_timestamp = np.zeros(0)
+        self.last_position = np.zeros((0, 2))
+        self.speed_ewma = np.zeros(0)
+        self.stopped_since = np.zeros(0)
+
+    def _ensure(self, size: int):
+        grow = size - len(self.last_timestamp)
+        if grow <= 0:
+            return
+        self.last_timestamp = np.concatenate((self.last_timestamp, np.full(grow, -np.inf)))
+        self.last_position = np.concatenate((self.last_position, np.zeros((grow, 2))))
+        self.speed_ewma = np.concatenate((self.speed_ewma, np.full(grow, np.nan)))
+        self.stopped_since = np.concatenate((self.stopped_since, np.full(grow, np.nan)))
+
+    def _rows(self, truck_ids) -> np.ndarray:
+        """Fleet rows for a batch of IDs (str or bytes), -1 where unknown; one dict lookup per distinct ID"""
+        if not isinstance(truck_ids, np.ndarray):
+            # A report without an ID is rejected as unknown; None cannot be sorted with strings
+            truck_ids = ["" if truck_id is None else truck_id for truck_id in truck_ids]
+        unique, inverse = np.unique(np.asarray(truck_ids), return_inverse=True)
+        index = self.simulator.fleet.index
+        rows = np.array([
+            index.get(truck_id.decode("ascii", "replace") if isinstance(truck_id, bytes) else str(truck_id), -1)
+            for truck_id in unique.tolist()
+        ], dtype=np.int64)
+        return rows[inverse] if len(rows) else np.zeros(0, dtype=np.int64)
+
+    def submit(self, truck_ids: Sequence, lon, lat, velocity, timestamps=None) -> Dict:
+        """Validate one batch and buffer what passes; returns accepted and per-reason rejected counts"""
+        now = time.time()
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        velocity = np.asarray(velocity, dtype=np.float64)
+        count = len(lon)
+        if not (len(truck_ids) == len(lat) == len(velocity) == count):
+            raise ValueError("telemetry columns must all be the same length")
+        timestamps = np.full(count, now) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+        timestamps = np.where(timestamps > 0, timestamps, now)
+
+        self._ensure(self.simulator.fleet.size)
+        rows = self._rows(truck_ids)
+        rejected = {reason: 0 for reason in REJECT_REASONS}
+
+        def reject(mask: np.ndarray, reason: str) -> np.ndarray:
+            rejected[reason] += int(mask.sum())
+            return ~mask
+
+        keep = reject(rows < 0, "unknown")
+        keep &= reject(keep & ~(
+            np.isfinite(lon) & np.isfinite(lat) & np.isfinite(velocity) & np.isfinite(timestamps)
+            & (np.abs(lon) <= 180) & (np.abs(lat) <= 90)
+            & (velocity >= 0) & (velocity <= MAX_SPEED_KMH) & (timestamps <= now + MAX_CLOCK_SKEW_SECONDS)
+        ), "invalid")
+
+        # Order by truck then time, so reports can be checked against the one before them
+        candidates = np.flatnonzero(keep)
+        order = candidates[np.lexsort((timestamps[candidates], rows[candidates]))]
+        rows, lon, lat, velocity, timestamps = rows[order], lon[order], lat[order], velocity[order], timestamps[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+
+        # Each report's predecessor: the previous one in the batch, or the last one accepted for the truck
+        prev_time = np.where(first, self.last_timestamp[rows], np.roll(timestamps, 1))
+        prev_lon = np.where(first, self.last_position[rows, 0], np.roll(lon, 1))
+        prev_lat = np.where(first, self.last_position[rows, 1], np.roll(lat, 1))
+        stale = timestamps <= prev_time
+        known = np.isfinite(prev_time) & ~stale
+        hours = np.maximum(timestamps - prev_time, 1.0) / 3600
+        implied = np.where(known, haversine_km(prev_lon, prev_lat, lon, lat) / np.where(known, hours, 1.0), 0.0)
+        jump = implied > MAX_SPEED_KMH * 1.5
+
+        # That holds until a report is rejected: the ones after it must be checked against the last
+        # accepted report instead, so trucks with a rejection mid-batch are rechecked one report at a time
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = first[1:]
+        for row in np.unique(rows[(stale | jump) & ~last]).tolist():
+            self._recheck(np.flatnonzero(rows == row), row, lon, lat, timestamps, stale, jump)
+        ok = reject(stale, "stale") & reject(jump, "jump")
+
+        accepted = int(ok.sum())
+        if self._pending_count + accepted > self.max_pending:
+            rejected["backpressure"] += accepted
+            accepted = 0
+            ok[:] = False
+
+        if accepted:
+            batch = (rows[ok], lon[ok], lat[ok], velocity[ok], timestamps[ok])
+            self._pending.append(batch)
+            self._pending_count += accepted
+            # Rows ascend within the batch, so fancy assignment leaves each truck's newest report
+            self.last_timestamp[batch[0]] = batch[4]
+            self.last_position[batch[0], 0] = batch[1]
+            self.last_position[batch[0], 1] = batch[2]
+
+        reports_total["accepted"].inc(accepted)
+        for reason, rejects in rejected.items():
+            reports_total[reason].inc(rejects)
+        return {"accepted": accepted, "rejected": {reason: n for reason, n in rejected.items() if n}}
+
+    def _recheck(self, reports: np.ndarray, row: int, lon: np.ndarray, lat: np.ndarray, timestamps: np.ndarray,
+                 stale: np.ndarray, jump: np.ndarray):
+        """Redo the stale and jump checks for one truck's reports in time order, each against the last accepted"""
+        prev_time = self.last_timestamp[row]
+        prev_lon, prev_lat = self.last_position[row]
+        for i in reports.tolist():
+            stale[i] = timestamps[i] <= prev_time
+            jump[i] = False
+            if stale[i]:
+                continue
+            if np.isfinite(prev_time):
+                hours = max(timestamps[i] - prev_time, 1.0) / 3600
+                jump[i] = haversine_km(prev_lon, prev_lat, lon[i], lat[i]) / hours > MAX_SPEED_KMH * 1.5
+            if not jump[i]:
+                prev_time, prev_lon, prev_lat = timestamps[i], lon[i], lat[i]
+
+    def submit_records(self, records: np.ndarray) -> Dict:
+        """Batch of REPORT_DTYPE records, as parsed from a binary datagram"""
+        return self.submit(records["truck_id"], records["lon"], records["lat"], records["velocity"],
+                           records["timestamp"])
+
+    def submit_message(self, data: Dict) -> Dict:
+        """
+        Telemetry from a JSON message, either columnar
+            {"truckIds": [...], "positions": [[lon, lat], ...], "velocities": [...], "timestamps": [...]}
+        or one object per report
+            {"reports": [{"truckId", "position", "velocity", "timestamp"}, ...]}
+        """
+        if "reports" in data:
+            reports = data["reports"]
+            truck_ids = [report.get("truckId") for report in reports]
+            positions = [report.get("position") or (None, None) for report in reports]
+            velocities = [report.get("velocity") for report in reports]
+            timestamps = [report.get("timestamp") or 0 for report in reports]
+        else:
+            truck_ids = data.get("truckIds") or []
+            positions = data.get("positions") or []
+            velocities = data.get("velocities") or []
+            timestamps = data.get("timestamps")
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        return self.submit(truck_ids, positions[:, 0], positions[:, 1],
+                           np.asarray(velocities, dtype=np.float64), timestamps)
+
+    def apply(self, now: Optional[float] = None) -> int:
+        """Fold buffered reports into the fleet and update statuses; returns the number of trucks updated"""
+        now = time.time() if now is None else now
+        with apply_seconds.time():
+            self._expire(now)
+            if not self._pending:
+                return 0
+
+            rows, lon, lat, velocity, timestamps = (np.concatenate(column) for column in zip(*self._pending))
+            self._pending = []
+            self._pending_count = 0
+
+            # Later chunks are newer, so the last report per truck wins
+            last = len(rows) - 1 - np.unique(rows[::-1], return_index=True)[1]
+            rows, velocity, timestamps = rows[last], velocity[last], timestamps[last]
+            self.simulator.fleet.observe(rows, np.column_stack((lon[last], lat[last])), velocity)
+            self.simulator.spatial.update_many(rows, self.simulator.fleet.positions[rows])
+            self._detect(rows, velocity, timestamps)
+            return len(rows)
+
+    def _expire(self, now: float):
+        fleet = self.simulator.fleet
+        live = np.flatnonzero(fleet.live[:fleet.size])
+        if len(live):
+            stale = live[now - self.last_timestamp[live] > self.stale_seconds]
+            fleet.live[stale] = False
+            self.speed_ewma[stale] = np.nan
+            self.stopped_since[stale] = np.nan
+
+    def _detect(self, rows: np.ndarray, velocity: np.ndarray, timestamps: np.ndarray):
+        """Smoothed speed and time stopped per truck, turned into status changes and events"""
+        fleet = self.simulator.fleet
+        ewma = self.speed_ewma[rows]
+        ewma = np.where(np.isnan(ewma), velocity, SPEED_EWMA_ALPHA * velocity + (1 - SPEED_EWMA_ALPHA) * ewma)
+        self.speed_ewma[rows] = ewma
+
+        stopped = velocity < STOPPED_KMH
+        since = self.stopped_since[rows]
+        since = np.where(stopped, np.where(np.isnan(since), timestamps, since), np.nan)
+        self.stopped_since[rows] = since
+
+        status = np.full(len(rows), ON_TIME, dtype=np.int8)
+        status[ewma < SLOWING_RATIO * fleet.cruise_velocity[rows]] = DELAYED
+        status[stopped & (timestamps - since >= STOPPED_SECONDS)] = CRITICAL
+
+        changed = status != fleet.status[rows]
+        for row, code, speed in zip(rows[changed].tolist(), status[changed].tolist(), ewma[changed].tolist()):
+            truck_id = fleet.ids[row]
+            if code == CRITICAL:
+                self.simulator.events.append("alert", f"{truck_id} - Stopped for {STOPPED_SECONDS / 60:g}+ minutes",
+                                             truck_id, "critical")
+            elif code == DELAYED:
+                self.simulator.events.append("alert", f"{truck_id} - Slowing down. Speed: {speed:.0f} km/h",
+                                             truck_id, "major")
+            elif fleet.status[row] != ON_TIME:
+                self.simulator.events.append("success", f"{truck_id} - Back to normal speed", truck_id)
+        fleet.set_status_codes(rows[changed], status[changed])
+
+
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    """UDP listener: binary REPORT_DTYPE datagrams, or JSON telemetry messages starting with '{'"""
+
+    def __init__(self, ingest: TelemetryIngest):
+        self.ingest = ingest
+
+    def datagram_received(self, data: bytes, addr: Tuple):
+        try:
+            if data[:1] == b"{":
+                self.ingest.submit_message(JSON.decode(data))
+            else:
+                usable = len(data) - len(data) % REPORT_DTYPE.itemsize
+                self.ingest.submit_records(np.frombuffer(data[:usable], dtype=REPORT_DTYPE))
+        except (ValueError, TypeError, KeyError):
+            reports_total["invalid"].inc()
+
+
+async def listen_udp(ingest: TelemetryIngest, host: str, port: int):
+    """Start the UDP listener; returns the transport"""
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: TelemetryProtocol(ingest), local_addr=(host, port)
+    )
+    transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER_BYTES)
+    return transport
+
+
+def pack_reports(truck_ids: Sequence[str], positions, velocities, timestamps=None) -> bytes:
+    """Encode reports in the binary datagram layout, for load generators and device gateways"""
+    records = np.zeros(len(truck_ids), dtype=REPORT_DTYPE)
+    records["truck_id"] = [truck_id.encode("ascii") for truck_id in truck_ids]
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    records["lon"] = positions[:, 0]
+    records["lat"] = positions[:, 1]
+    records["velocity"] = velocities
+    if timestamps is not None:
+        records["timestamp"] = timestamps
+    return records.tobytes()
+
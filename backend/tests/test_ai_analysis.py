@@ -0,0 +1,80 @@
+import asyncio
+
+import contract_analyzer
+from analysis_cache import AnalysisCache
+from contract_analyzer import ContractAnalyzer
+from contract_store import InMemoryContractStore
+
+
+class StubCompletion:
+    """Stands in for the chat completion: counts calls and the most running at once"""
+
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.most_running = 0
+
+    async def __call__(self, contract_text, delay_scenario, request):
+        self.calls.append((contract_text, delay_scenario, request))
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+        return {"penalty": len(self.calls), "request": request}
+
+
+def analyzer_with_stub(cache):
+    analyzer = ContractAnalyzer(api_key="test-key", cache=cache, contracts=InMemoryContractStore())
+    analyzer._complete = StubCompletion()
+    return analyzer
+
+
+def test_identical_requests_share_one_completion():
+    analyzer = analyzer_with_stub(AnalysisCache(path=None))
+
+    async def run():
+        return await asyncio.gather(*(analyzer.ai_contract_analysis("terms", "2h delay") for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert len(analyzer._complete.calls) == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_completions_are_bounded_by_the_semaphore():
+    analyzer = analyzer_with_stub(AnalysisCache(path=None))
+
+    async def run():
+        await asyncio.gather(*(analyzer.ai_contract_analysis("terms", f"{hours}h delay") for hours in range(12)))
+
+    asyncio.run(run())
+    assert len(analyzer._complete.calls) == 12
+    assert analyzer._complete.most_running == contract_analyzer.LLM_MAX_CONCURRENCY
+
+
+def test_cached_answers_are_keyed_by_request(tmp_path):
+    path = str(tmp_path / "analyses.db")
+    analyzer = analyzer_with_stub(AnalysisCache(path=path))
+
+    async def run():
+        first = await analyzer.ai_contract_analysis("terms", "2h delay")
+        again = await analyzer.ai_contract_analysis("terms", "2h delay")
+        other = await analyzer.ai_contract_analysis("terms", "2h delay", "Respond with the deadline")
+        return first, again, other
+
+    first, again, other = asyncio.run(run())
+    assert again == first and analyzer.analysis_cache.hits == 1
+    assert other["request"] == "Respond with the deadline"
+    assert len(analyzer._complete.calls) == 2
+
+    # Flushed to disk off the event loop, so a new process starts warm
+    analyzer.analysis_cache.close()
+    assert len(AnalysisCache(path=path)) == 2
+
+
+def test_evictions_are_flushed(tmp_path):
+    path = str(tmp_path / "analyses.db")
+    cache = AnalysisCache(path=path, max_entries=2)
+    for key in "abc":
+        cache.put(key, {"key": key})
+    cache.flush()
+    assert [row[0] for row in AnalysisCache(path=path).state()] == ["b", "c"]
@@ -0,0 +1,93 @@
+import asyncio
+
+from broadcaster import COALESCE, DISCONNECT, DROP, Broadcaster
+
+
+class StalledSocket:
+    """A client that never finishes reading its first frame"""
+
+    subprotocol = None
+
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def send(self, frame):
+        self.sent.append(frame)
+        await asyncio.Event().wait()
+
+    async def close(self, code, reason):
+        self.closed = code
+
+
+def fill(policy, max_queue=3):
+    broadcaster = Broadcaster(lambda websocket: {"type": "initial_state", "seq": 99}, max_queue, policy)
+    websocket = StalledSocket()
+    channel = broadcaster.add(websocket)
+    return broadcaster, websocket, channel
+
+
+def queued(channel):
+    return [(seq, reply) for seq, _, reply in channel.queue]
+
+
+def test_drop_keeps_replies():
+    async def run():
+        broadcaster, websocket, channel = fill(DROP)
+        broadcaster.send(websocket, {"type": "pong"})
+        await asyncio.sleep(0)  # the writer takes the first frame and stalls on it
+        broadcaster.send(websocket, {"type": "pong"})
+        for seq in (1, 2, 3, 4):
+            broadcaster.publish({"type": "state_delta", "seq": seq})
+        broadcaster.send(websocket, {"type": "contract_data"})
+        assert queued(channel) == [(None, True), (4, False), (None, True)]
+        await broadcaster.close()
+
+    asyncio.run(run())
+
+
+def test_drop_queues_a_reply_when_only_replies_are_queued():
+    async def run():
+        broadcaster, websocket, channel = fill(DROP, max_queue=2)
+        broadcaster.send(websocket, {"type": "pong"})
+        await asyncio.sleep(0)
+        for _ in range(3):
+            broadcaster.send(websocket, {"type": "pong"})
+        broadcaster.publish({"type": "state_delta", "seq": 1})
+        assert queued(channel) == [(None, True)] * 3
+        assert channel.dropped == 1
+        await broadcaster.close()
+
+    asyncio.run(run())
+
+
+def test_coalesce_reply_into_a_full_queue_resyncs_instead_of_evicting():
+    async def run():
+        broadcaster, websocket, channel = fill(COALESCE)
+        broadcaster.send(websocket, {"type": "pong"})
+        await asyncio.sleep(0)
+        broadcaster.send(websocket, {"type": "pong"})
+        broadcaster.publish({"type": "state_delta", "seq": 1})
+        broadcaster.publish({"type": "state_delta", "seq": 2})
+        broadcaster.send(websocket, {"type": "due_contracts"})
+        assert queued(channel) == [(None, True), (None, True)]
+        assert channel.needs_resync
+        await broadcaster.close()
+
+    asyncio.run(run())
+
+
+def test_disconnect_keeps_the_close_task():
+    async def run():
+        broadcaster, websocket, channel = fill(DISCONNECT, max_queue=1)
+        broadcaster.send(websocket, {"type": "pong"})
+        await asyncio.sleep(0)
+        broadcaster.publish({"type": "state_delta", "seq": 1})
+        broadcaster.publish({"type": "state_delta", "seq": 2})
+        assert len(broadcaster._closing) == 1
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert websocket.closed == 1013
+        assert not broadcaster._closing
+
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from contract_analyzer import ContractAnalyzer
+from contract_store import InMemoryContractStore
+from event_log import EventLog
+from fleet_store import (CHANGED_ADDED, CHANGED_POSITION, CHANGED_ROUTE, CHANGED_STATUS, CHANGED_VELOCITY,
+                         STATUS_CODES, FleetChanges)
+from shard import FleetShard
+from simulation import ScenarioEngine, TruckSimulator
+
+
+def test_rows_with_selects_by_any_field_bit():
+    changes = FleetChanges(np.array([1, 3, 5]),
+                           np.array([CHANGED_POSITION, CHANGED_STATUS | CHANGED_VELOCITY, CHANGED_ADDED],
+                                    dtype=np.uint8))
+    assert changes.rows_with(CHANGED_STATUS).tolist() == [3]
+    assert changes.rows_with(CHANGED_STATUS | CHANGED_ADDED).tolist() == [3, 5]
+    assert changes.rows_with(CHANGED_POSITION | CHANGED_VELOCITY).tolist() == [1, 3]
+    assert changes.rows_with(CHANGED_ROUTE).tolist() == []
+
+
+def test_merge_ors_the_fields_of_repeated_rows():
+    merged = FleetChanges.merge([
+        FleetChanges(np.array([4, 2]), np.array([CHANGED_POSITION, CHANGED_STATUS], dtype=np.uint8)),
+        FleetChanges(np.array([2]), np.array([CHANGED_VELOCITY], dtype=np.uint8)),
+    ])
+    assert merged.rows.tolist() == [2, 4]
+    assert merged.fields.tolist() == [CHANGED_STATUS | CHANGED_VELOCITY, CHANGED_POSITION]
+    assert len(FleetChanges.merge([])) == 0
+
+
+def test_only_real_changes_are_marked_and_collection_resets():
+    fleet = TruckSimulator(10, seed=2, demo_trucks=False).fleet
+    fleet.collect_changes()
+
+    fleet.set_velocity(0, float(fleet.velocity[0]))
+    fleet.set_status_codes(np.array([1, 2]), np.array([fleet.status[1], STATUS_CODES["critical"]], dtype=np.int8))
+    fleet.set_velocity(3, 0)
+    changes = fleet.collect_changes()
+    assert changes.rows.tolist() == [2, 3]
+    assert changes.fields.tolist() == [CHANGED_STATUS, CHANGED_VELOCITY]
+    assert len(fleet.collect_changes()) == 0
+
+
+def test_dense_changes_are_collected_from_the_mask():
+    fleet = TruckSimulator(16, seed=2, demo_trucks=False).fleet
+    fleet.collect_changes()
+    # More marks than trucks: the feed stops keeping them and scans the mask instead
+    for _ in range(3):
+        fleet.mark(np.arange(fleet.size), CHANGED_POSITION)
+    fleet.mark([5], CHANGED_STATUS)
+    changes = fleet.collect_changes()
+    assert changes.rows.tolist() == list(range(16))
+    assert changes.rows_with(CHANGED_STATUS).tolist() == [5]
+    assert not fleet.changes[:fleet.size].any()
+
+
+def test_every_observer_gets_each_batch_once():
+    simulator = TruckSimulator(4, seed=1, demo_trucks=False, events=EventLog(capacity=16))
+    batches = ([], [])
+    simulator.on_change(batches[0].append)
+    simulator.on_change(batches[1].append)
+    simulator.publish_changes()  # the trucks' addition
+
+    simulator.update_positions(1.0)
+    simulator.publish_changes()
+    simulator.publish_changes()  # nothing new: no batch
+    assert [len(batch) for batch in batches] == [2, 2]
+    assert batches[0][0].rows_with(CHANGED_ADDED).tolist() == [0, 1, 2, 3]
+    assert batches[0][1] is batches[1][1]
+    assert batches[0][1].rows_with(CHANGED_ADDED).tolist() == []
+
+
+def test_shard_rechecks_only_trucks_whose_status_changed():
+    simulator = TruckSimulator(20, seed=4, events=EventLog(capacity=64))
+    analyzer = ContractAnalyzer(cache=AnalysisCache(path=None), contracts=InMemoryContractStore())
+    shard = FleetShard(simulator, analyzer, ScenarioEngine(simulator), min_delay_seconds=10)
+    shard.scan_arbitrage(0.0)
+
+    simulator.update_positions(1.0)
+    simulator.publish_changes()
+    assert shard._recheck == set()
+
+    simulator.simulate_delay("TRK-402", "critical")
+    simulator.publish_changes()
+    assert shard._recheck == {simulator.fleet.row("TRK-402")}
+    shard.scan_arbitrage(1.0)
+    assert shard.delayed_since == {"TRK-402": 1.0}
+    assert shard._recheck == set()
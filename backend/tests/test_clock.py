@@ -0,0 +1,109 @@
+import asyncio
+import types
+
+import pytest
+
+import clock
+from clock import CATCH_UP, SKIP, FixedTimestepClock
+from metrics import Histogram, MetricsRegistry
+
+
+class FakeTime:
+    """Monotonic time that only moves when the clock sleeps or a tick does work"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def run_ticks(monkeypatch, fake_clock: FixedTimestepClock, costs, count: int = 8):
+    """Tick numbers yielded, and the lateness of each, with tick i taking costs.get(i, 0.1) seconds"""
+    fake = FakeTime()
+    monkeypatch.setattr(clock, "time", types.SimpleNamespace(monotonic=fake.monotonic))
+    monkeypatch.setattr(clock, "asyncio", types.SimpleNamespace(sleep=fake.sleep))
+
+    async def consume():
+        ticks, lateness = [], []
+        async for tick in fake_clock.ticks():
+            ticks.append(tick)
+            lateness.append(round(fake_clock.lateness, 6))
+            fake.now += costs.get(len(ticks) - 1, 0.1)
+            if len(ticks) == count:
+                return ticks, lateness
+
+    return asyncio.run(consume())
+
+
+def test_skip_drops_missed_ticks(monkeypatch):
+    fake_clock = FixedTimestepClock(1.0, SKIP)
+    ticks, lateness = run_ticks(monkeypatch, fake_clock, {2: 3.5}, count=6)
+    assert ticks == [0, 1, 2, 5, 6, 7]
+    assert fake_clock.skipped == 2
+    # Realigned to tick 5's schedule, only the part of a period it is late by remains
+    assert lateness == [0.0, 0.0, 0.0, 0.5, 0.0, 0.0]
+    # Simulation time of the tick being run, skipped ticks included
+    assert fake_clock.elapsed == 7.0
+
+
+def test_catch_up_runs_missed_ticks_back_to_back(monkeypatch):
+    fake_clock = FixedTimestepClock(1.0, CATCH_UP)
+    ticks, lateness = run_ticks(monkeypatch, fake_clock, {2: 3.5})
+    assert ticks == list(range(8))
+    assert fake_clock.skipped == 0
+    assert lateness[3:6] == [2.5, 1.6, 0.7]
+
+
+def test_catch_up_gives_up_after_max_catch_up(monkeypatch):
+    fake_clock = FixedTimestepClock(1.0, CATCH_UP, max_catch_up=1)
+    ticks, _ = run_ticks(monkeypatch, fake_clock, {2: 3.5}, count=7)
+    assert ticks == [0, 1, 2, 3, 5, 6, 7]
+    assert fake_clock.skipped == 1
+
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        FixedTimestepClock(0)
+    with pytest.raises(ValueError):
+        FixedTimestepClock(1.0, "rewind")
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram("tick_seconds", "Tick time", {"phase": "update"}, buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.render() == [
+        'tick_seconds_bucket{le="0.1",phase="update"} 2',
+        'tick_seconds_bucket{le="1.0",phase="update"} 3',
+        'tick_seconds_bucket{le="+Inf",phase="update"} 4',
+        'tick_seconds_sum{phase="update"} 2.65',
+        'tick_seconds_count{phase="update"} 4',
+    ]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == float("inf")
+
+
+def test_registry_renders_each_name_once():
+    registry = MetricsRegistry()
+    for phase in ("update", "send"):
+        registry.histogram("phase_seconds", "Phase time", {"phase": phase}, buckets=(1.0,)).observe(0.5)
+    registry.gauge("ticks_skipped", "Ticks skipped").set(3)
+    registry.counter("frames", "Frames sent").inc()
+    # The same name and labels give back the same metric
+    assert registry.counter("frames", "Frames sent").value == 1.0
+
+    text = registry.render()
+    assert text.count("# HELP phase_seconds Phase time") == 1
+    assert text.count("# TYPE phase_seconds histogram") == 1
+    assert "# TYPE ticks_skipped gauge\nticks_skipped 3\n" in text
+    assert "# TYPE frames counter\nframes 1.0\n" in text
+    # Both label sets sit under the one header
+    lines = text.splitlines()
+    header, next_header = lines.index("# TYPE phase_seconds histogram"), lines.index("# HELP ticks_skipped Ticks skipped")
+    for phase in ("update", "send"):
+        assert header < lines.index(f'phase_seconds_count{{phase="{phase}"}} 1') < next_header
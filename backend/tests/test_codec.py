@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from analysis_cache import AnalysisCache
+from codec import JSON, MsgPackCodec, msgpack
+from contract_analyzer import ContractAnalyzer
+from contract_store import InMemoryContractStore
+
+pytestmark = pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return ContractAnalyzer(cache=AnalysisCache(path=None), contracts=InMemoryContractStore())
+
+
+def test_contract_round_trip_keeps_route_name(analyzer):
+    contract = analyzer.get_contract("CNT-2024-001")
+    message = {"type": "contract_data", "data": contract, "requestId": 7}
+
+    decoded = MsgPackCodec().decode(MsgPackCodec().encode(message))
+
+    assert decoded == JSON.decode(JSON.encode(message))
+    assert decoded["data"]["route"] == "Pune to Mumbai"
+
+
+def test_due_contracts_round_trip(analyzer):
+    message = {"type": "due_contracts", "hours": 24, "data": analyzer.contracts.due_within(24, 10)}
+
+    assert MsgPackCodec().decode(MsgPackCodec().encode(message)) == message
+
+
+def test_coordinates_are_packed_as_float32():
+    codec = MsgPackCodec()
+    message = {"position": [73.5, 18.25], "route": [[73.5, 18.25], [72.75, 19.0]], "path": []}
+
+    packed = codec._pack(message)
+    assert isinstance(packed["position"], bytes) and isinstance(packed["route"], bytes)
+    assert codec.decode(codec.encode(message)) == message
+
+
+def test_empty_coordinate_bytes_decode():
+    codec = MsgPackCodec()
+    frame = msgpack.packb({"position": b"", "route": b""}, use_bin_type=True)
+
+    assert codec.decode(frame) == {"position": None, "route": []}
+
+
+def test_numpy_coordinates_are_packed():
+    codec = MsgPackCodec()
+    message = {
+        "position": np.array([73.5, 18.25]),
+        "route": np.array([[73.5, 18.25], [72.75, 19.0]]),
+        "path": [np.array([73.5, 18.25]), np.array([72.75, 19.0])],
+        "location": np.array([73.5, 18.25], dtype=np.float32)
+    }
+
+    assert codec.decode(codec.encode(message)) == {
+        "position": [73.5, 18.25],
+        "route": [[73.5, 18.25], [72.75, 19.0]],
+        "path": [[73.5, 18.25], [72.75, 19.0]],
+        "location": [73.5, 18.25]
+    }
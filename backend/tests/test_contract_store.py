@@ -0,0 +1,67 @@
+import math
+import threading
+
+from analysis_cache import AnalysisCache
+from contract_analyzer import ContractAnalyzer
+from contract_store import SQLiteContractStore
+
+CSV = """id,client,route,deliveryDeadline,cargoValue,penaltyPerHour,maxPenalty,terms
+CSV-1,Acme,Pune to Mumbai,2030-01-01T10:00:00,50000,400,,Uncapped
+CSV-2,Acme,Pune to Mumbai,2030-01-01T12:00:00,,250,1000,Capped
+"""
+
+
+def test_blank_csv_cells_import_as_missing(tmp_path):
+    source = tmp_path / "contracts.csv"
+    source.write_text(CSV)
+    store = SQLiteContractStore(":memory:")
+
+    assert store.bulk_import(str(source)) == 2
+    assert store.get("CSV-1")["maxPenalty"] is None
+    assert store.get("CSV-2")["cargoValue"] is None
+    assert store.get("CSV-2")["maxPenalty"] == 1000
+
+    analyzer = ContractAnalyzer(cache=AnalysisCache(path=None), contracts=store)
+    assert analyzer.calculate_penalty("CSV-1", 10)["calculatedPenalty"] == 4000
+    assert analyzer.calculate_penalty("CSV-2", 10)["calculatedPenalty"] == 1000
+
+    [uncapped] = analyzer.analyze_fleet(["TRK-1"], ["CSV-1"], [10])
+    assert math.isclose(uncapped["projectedPenalty"], 4000)
+
+
+def test_replaced_contract_is_never_cached_stale():
+    store = SQLiteContractStore(":memory:")
+    store.put_many([{"id": "C-1", "version": 1}, {"id": "C-2", "version": 1}])
+    db = store._db
+    writers = []
+
+    class Connection:
+        # Starts a writer while a lookup sits between its read and its cache insert
+        def execute(self, sql, params=()):
+            cursor = db.execute(sql, params)
+            if sql.startswith("SELECT data"):
+                replaced = [{"id": contract_id, "version": 2} for contract_id in params]
+                writer = threading.Thread(target=store.put_many, args=(replaced,))
+                writer.start()
+                writer.join(0.05)
+                writers.append(writer)
+            return cursor
+
+        def __getattr__(self, name):
+            return getattr(db, name)
+
+        def __enter__(self):
+            return db.__enter__()
+
+        def __exit__(self, *exc):
+            return db.__exit__(*exc)
+
+    store._db = Connection()
+    assert store.get("C-1")["version"] == 1
+    assert store.get_many(["C-2"])["C-2"]["version"] == 1
+    for writer in writers:
+        writer.join()
+    store._db = db
+
+    assert store.get("C-1")["version"] == 2
+    assert store.get_many(["C-1", "C-2"]) == {"C-1": {"id": "C-1", "version": 2}, "C-2": {"id": "C-2", "version": 2}}
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from analysis_cache import AnalysisCache
+from contract_analyzer import ContractAnalyzer
+from contract_parser import terms_from_llm
+from contract_store import InMemoryContractStore
+
+SAMPLE_CONTRACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sample_contract.json")
+
+VAGUE_TERMS = "Late deliveries are charged per hour of delay as agreed with the carrier."
+
+
+def make_analyzer(api_key=None):
+    return ContractAnalyzer(api_key=api_key, cache=AnalysisCache(path=None), contracts=InMemoryContractStore())
+
+
+def test_uncapped_contract_penalty_keeps_accruing():
+    analyzer = make_analyzer()
+    analyzer.contracts.put({"id": "X-1", "penaltyPerHour": 300, "maxPenalty": None, "tiers": [], "terms": ""})
+
+    assert analyzer.calculate_penalty("X-1", 2)["calculatedPenalty"] == 600
+
+
+def test_ingested_contract_without_cap():
+    analyzer = make_analyzer()
+    contract = asyncio.run(analyzer.ingest_contract_text(
+        "X-2", "Delivery within 4 hours. Penalty of $200 per hour of delay.", client="Acme"
+    ))
+
+    assert contract["maxPenalty"] is None
+    assert analyzer.calculate_penalty("X-2", 3)["calculatedPenalty"] == 600
+
+
+def test_llm_fills_in_terms_the_parser_missed():
+    analyzer = make_analyzer(api_key="test-key")
+
+    async def complete(contract_text, delay_scenario, request):
+        return {"penaltyPerHour": "$250", "maxPenalty": 1500, "deadlineHours": 6,
+                "tiers": [{"fromHour": 0, "toHour": None, "ratePerHour": 250}], "forceMajeure": ["flood"]}
+    analyzer._complete = complete
+
+    terms = asyncio.run(analyzer.extract_terms(VAGUE_TERMS))
+
+    assert terms["source"] == "llm"
+    assert (terms["penaltyPerHour"], terms["maxPenalty"], terms["deadlineHours"]) == (250, 1500, 6)
+    assert terms["forceMajeure"] == ["flood"]
+    assert "needsReview" not in terms
+
+
+def test_unusable_terms_are_flagged_for_review():
+    terms = asyncio.run(make_analyzer().extract_terms(VAGUE_TERMS))
+    assert terms["needsReview"] is True
+
+    analyzer = make_analyzer(api_key="test-key")
+
+    async def complete(contract_text, delay_scenario, request):
+        return {"penalty": 1250, "recommendation": "Pay penalty"}
+    analyzer._complete = complete
+
+    assert asyncio.run(analyzer.extract_terms(VAGUE_TERMS))["needsReview"] is True
+
+
+@pytest.mark.parametrize("answer, rate", [
+    ({"tiers": [{"toHour": 2, "ratePerHour": 100}, {"ratePerHour": 300}]}, 100),
+    ({"penaltyPerHour": "1,200.5"}, 1200.5),
+    ({"penaltyPerHour": "unknown"}, None),
+    ({"penaltyPerHour": -5}, None),
+])
+def test_terms_from_llm(answer, rate):
+    terms = terms_from_llm(answer)
+    assert (terms["penaltyPerHour"] if terms else None) == rate
+    if terms and len(terms["tiers"]) == 2:
+        assert terms["tiers"][1]["fromHour"] == 2
+
+
+def test_fleet_analysis_prices_like_calculate_penalty():
+    analyzer = make_analyzer()
+    analyzer.contracts.bulk_import(SAMPLE_CONTRACT)
+    analyzer.contracts.put_many([
+        {"id": "X-late-tier", "penaltyPerHour": 300, "maxPenalty": None, "terms": "",
+         "tiers": [{"fromHour": 1, "toHour": None, "ratePerHour": 300}]},
+        {"id": "X-no-rate", "penaltyPerHour": None, "maxPenalty": None, "tiers": [], "terms": ""},
+    ])
+    # A free relief truck, so every positive penalty comes back as a recommendation
+    analyzer.add_spot_providers([
+        {"provider": "Free", "cost": 0, "eta": "5 minutes", "availability": "high", "location": [73.8, 18.5]}
+    ])
+
+    with open(SAMPLE_CONTRACT, encoding="utf-8") as f:
+        sample_id = json.load(f)["contractId"]
+    contract_ids = ["CNT-2024-001", "CNT-2024-002", "CNT-2024-003", "X-late-tier", "X-no-rate", sample_id]
+    for delay in (0.5, 2.5, 7.0):
+        recommended = {
+            row["contractId"]: row["projectedPenalty"]
+            for row in analyzer.analyze_fleet([f"TRK-{i}" for i in range(len(contract_ids))], contract_ids, delay)
+        }
+        for contract_id in contract_ids:
+            expected = analyzer.calculate_penalty(contract_id, delay)["calculatedPenalty"]
+            assert recommended.get(contract_id, 0.0) == pytest.approx(expected)
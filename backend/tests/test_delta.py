@@ -0,0 +1,56 @@
+import pytest
+
+from delta import DeltaEncoder
+from event_log import EventLog
+from simulation import TruckSimulator
+
+
+def apply(trucks, delta):
+    for update in delta["data"]["trucks"]:
+        trucks.setdefault(update["id"], {}).update(update)
+
+
+def test_deltas_applied_to_a_snapshot_match_a_fresh_snapshot():
+    simulator = TruckSimulator(20, seed=5, events=EventLog(capacity=64))
+    encoder = DeltaEncoder(simulator)
+    snapshot = encoder.snapshot()
+    assert snapshot["seq"] == 0
+    trucks = {truck["id"]: truck for truck in snapshot["data"]["trucks"]}
+    seen_events = [event["seq"] for event in snapshot["data"]["events"]]
+
+    ids = simulator.fleet.ids[:simulator.fleet.size]
+    for tick in range(6):
+        simulator.update_positions(1.0)
+        if tick == 1:
+            simulator.simulate_delay(ids[3], "critical")
+        if tick == 2:
+            simulator.add_synthetic_trucks(2, seed=9, first_number=5000)
+        if tick == 4:
+            simulator.resolve_delay(ids[3])
+        delta = encoder.delta()
+        assert delta["type"] == "state_delta"
+        assert (delta["baseSeq"], delta["seq"]) == (tick, tick + 1)
+        apply(trucks, delta)
+        seen_events.extend(event["seq"] for event in delta["data"]["events"])
+
+    fresh = encoder.snapshot()
+    assert fresh["seq"] == 6
+    assert set(trucks) == {truck["id"] for truck in fresh["data"]["trucks"]}
+    for truck in fresh["data"]["trucks"]:
+        client = trucks[truck["id"]]
+        # ETA and lateness are only resent once they drift by more than a minute
+        assert client["latenessHours"] == pytest.approx(truck["latenessHours"], abs=0.03)
+        for field in truck:
+            if field not in ("eta", "latenessHours"):
+                assert client[field] == truck[field], (truck["id"], field)
+    # Every event reached the client once, in order
+    assert seen_events == list(range(seen_events[0], simulator.events.last_seq + 1))
+
+
+def test_quiet_tick_sends_no_trucks():
+    simulator = TruckSimulator(5, seed=1, demo_trucks=False, events=EventLog(capacity=16))
+    encoder = DeltaEncoder(simulator)
+    delta = encoder.delta()
+    assert delta["seq"] == 1
+    assert delta["data"]["trucks"] == []
+    assert delta["data"]["events"] == []
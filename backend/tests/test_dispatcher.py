@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from dispatcher import PROCESS, THREAD, Dispatcher, RequestError
+
+
+def process_id(data):
+    return {"type": "pid", "pid": os.getpid()}
+
+
+def run_with(dispatcher, requests, sent, replies):
+    """Dispatch requests from one client and wait, up to a few seconds, for that many replies"""
+    async def run():
+        for data in requests:
+            dispatcher.dispatch("client", data)
+        for _ in range(1000):
+            if len(sent) >= replies:
+                return
+            await asyncio.sleep(0.01)
+    asyncio.run(run())
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+@pytest.fixture
+def dispatcher(sent):
+    # Generous limits: these tests are not about rate limiting
+    dispatcher = Dispatcher(lambda websocket, message: sent.append(message), rate=1000, burst=1000)
+    yield dispatcher
+    dispatcher.shutdown()
+
+
+def test_unknown_type_is_refused(dispatcher, sent):
+    run_with(dispatcher, [{"type": "launch_rockets", "requestId": 1}], sent, 1)
+    assert sent == [{"type": "error", "code": "unknown_type", "message": "Unknown message type: launch_rockets",
+                     "requestId": 1}]
+
+
+def test_token_bucket_refuses_bursts(sent):
+    dispatcher = Dispatcher(lambda websocket, message: sent.append(message), rate=1, burst=3)
+    dispatcher.handler("ping")(lambda data, websocket: {"type": "pong"})
+    run_with(dispatcher, [{"type": "ping", "requestId": i} for i in range(5)], sent, 5)
+    dispatcher.shutdown()
+
+    assert [message["type"] for message in sent] == ["pong"] * 3 + ["error"] * 2
+    assert sent[3]["code"] == "rate_limited" and sent[3]["retryAfterMs"] > 0
+    assert [message["requestId"] for message in sent] == list(range(5))
+
+
+def test_handlers_run_where_registered(dispatcher, sent):
+    dispatcher.handler("on_loop")(lambda data, websocket: {"type": "loop", "thread": threading.get_ident()})
+    dispatcher.handler("on_thread", THREAD)(lambda data, websocket: {"type": "thread", "thread": threading.get_ident()})
+    dispatcher.handler("on_process", PROCESS)(process_id)
+
+    run_with(dispatcher, [{"type": "on_loop"}, {"type": "on_thread"}, {"type": "on_process"}], sent, 3)
+
+    replies = {message["type"]: message for message in sent}
+    assert replies["loop"]["thread"] == threading.get_ident()
+    assert replies["thread"]["thread"] != threading.get_ident()
+    assert replies["pid"]["pid"] != os.getpid()
+
+
+def test_errors_and_acks(dispatcher, sent):
+    def fail(data, websocket):
+        raise RequestError("No such truck")
+
+    dispatcher.handler("fail", THREAD)(fail)
+    dispatcher.handler("quiet")(lambda data, websocket: None)
+    # Quick handlers answer inline, so the unanswered request has run by the time the others are back
+    run_with(dispatcher, [{"type": "fail", "requestId": "a"}, {"type": "quiet", "requestId": "b"}, {"type": "quiet"}],
+             sent, 2)
+
+    assert sorted(sent, key=lambda message: message["requestId"]) == [
+        {"type": "error", "message": "No such truck", "requestId": "a"},
+        {"type": "ack", "requestId": "b"}
+    ]
+
+
+def test_in_flight_limit(sent):
+    dispatcher = Dispatcher(lambda websocket, message: sent.append(message), rate=1000, burst=1000, max_in_flight=2)
+
+    async def slow(data, websocket):
+        await asyncio.sleep(0.05)
+        return {"type": "done"}
+
+    dispatcher.handler("slow")(slow)
+    run_with(dispatcher, [{"type": "slow"} for _ in range(3)], sent, 3)
+    dispatcher.shutdown()
+
+    assert sorted(message["type"] for message in sent) == ["done", "done", "error"]
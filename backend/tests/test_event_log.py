@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from event_log import EventLog
+
+
+def test_rejects_empty_ring():
+    with pytest.raises(ValueError):
+        EventLog(capacity=0)
+
+
+def test_ring_wraps_and_unindexes_evicted_events():
+    log = EventLog(capacity=4)
+    for i in range(10):
+        log.append("delay" if i % 2 else "resolved", f"event {i}", truck_id=f"T-{i % 3}")
+
+    assert len(log) == 4
+    assert log.oldest_seq == 7
+    assert [event["seq"] for event in log.latest(10)] == [7, 8, 9, 10]
+    assert log.get(6) is None
+    assert log.get(9)["message"] == "event 8"
+    assert [event["seq"] for event in log.of_type("delay")] == [8, 10]
+    assert [event["seq"] for event in log.for_truck("T-0")] == [7, 10]
+    assert "T-1" in log.by_truck and list(log.by_truck["T-1"]) == [8]
+
+
+def test_writes_wait_for_flush_and_rotate_segments(tmp_path):
+    log = EventLog(capacity=100, directory=str(tmp_path), segment_size=3, segments_kept=2)
+    for i in range(5):
+        log.append("delay", f"event {i}")
+    assert log.pending == 5
+    assert os.listdir(tmp_path) == []
+
+    log.flush()
+    assert log.pending == 0
+    assert sorted(os.listdir(tmp_path)) == ["events-000000000001.jsonl", "events-000000000004.jsonl"]
+
+    for i in range(5, 7):
+        log.append("delay", f"event {i}")
+    log.close()
+    # The third segment pushed out the oldest one
+    assert sorted(os.listdir(tmp_path)) == ["events-000000000004.jsonl", "events-000000000007.jsonl"]
+
+
+def test_since_replays_evicted_events_from_segments(tmp_path):
+    log = EventLog(capacity=4, directory=str(tmp_path), segment_size=5)
+    for i in range(12):
+        log.append("delay", f"event {i}")
+    # More events than the ring holds arrived before any flush: the evicted ones were written anyway
+    assert log.oldest_seq == 9
+    assert [event["seq"] for event in log.since(0)] == list(range(1, 13))
+    assert [event["seq"] for event in log.since(6, limit=4)] == [7, 8, 9, 10]
+    log.close()
+
+
+def test_replay_after_restart(tmp_path):
+    log = EventLog(capacity=4, directory=str(tmp_path), segment_size=5)
+    for i in range(6):
+        log.append("delay", f"event {i}")
+    state = log.state()
+    for i in range(6, 9):
+        log.append("delay", f"event {i}")
+    log.close()
+
+    # Numbering resumes after the last persisted event, and a snapshot taken before the
+    # last events is topped up from the segments
+    restarted = EventLog(capacity=4, directory=str(tmp_path), segment_size=5)
+    assert restarted.last_seq == 9
+    restarted.restore(state)
+    assert [event["seq"] for event in restarted.latest(10)] == [6, 7, 8, 9]
+    assert [event["seq"] for event in restarted.since(2)] == [3, 4, 5, 6, 7, 8, 9]
+    assert restarted.append("delay", "after restart")["seq"] == 10
+    restarted.close()
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from fleet_store import STALLED_RESUME_HOURS, FleetStore
+from simulation import TruckSimulator
+from spatial_index import haversine_km
+
+EPOCH = datetime(2025, 1, 1)
+
+
+def line(start, end, points):
+    t = np.linspace(0.0, 1.0, points)[:, None]
+    return np.asarray(start) + (np.asarray(end) - np.asarray(start)) * t
+
+
+def straight_truck(truck_id, end_lon, velocity, due_hours):
+    """A truck at the start of a route east along the equator"""
+    return {
+        "id": truck_id, "driver": truck_id, "cargoValue": 1, "status": "on-time", "velocity": velocity,
+        "position": [0.0, 0.0], "destination": [end_lon, 0.0], "route": line([0.0, 0.0], [end_lon, 0.0], 11),
+        "currentRouteIndex": 0, "contractId": None, "eta": (EPOCH + timedelta(hours=due_hours)).isoformat()
+    }
+
+
+def test_trucks_move_velocity_times_dt_and_project_eta():
+    fleet = FleetStore(epoch=EPOCH)
+    fleet.add_trucks([straight_truck("A", 1.0, 50, 3.0)], EPOCH)
+    route_km = float(haversine_km(0.0, 0.0, 1.0, 0.0))
+    assert fleet.route_km[0] == pytest.approx(route_km)
+    assert fleet.eta_hours[0] == pytest.approx(route_km / 50)
+
+    fleet.advance(1.0)
+    assert fleet.distance[0] == pytest.approx(50.0)
+    assert fleet.positions[0, 0] == pytest.approx(50.0 / route_km, rel=1e-3)
+    assert fleet.route_index[0] == 4
+    # Still on pace: the projected arrival does not move and the truck is not late
+    assert fleet.eta_hours[0] == pytest.approx(route_km / 50)
+    assert fleet.lateness_hours[0] == 0.0
+    assert fleet.eta(0) == (EPOCH + timedelta(hours=float(fleet.eta_hours[0]))).isoformat()
+
+
+def test_stopped_truck_projects_a_resume_delay_and_lateness():
+    fleet = FleetStore(epoch=EPOCH)
+    fleet.add_trucks([straight_truck("A", 1.0, 60, 2.0)], EPOCH)
+    fleet.set_velocity(0, 0)
+    fleet.project(np.array([0]))
+    route_km = float(haversine_km(0.0, 0.0, 1.0, 0.0))
+    # Stopped trucks resume at their cruising speed after STALLED_RESUME_HOURS
+    assert fleet.eta_hours[0] == pytest.approx(STALLED_RESUME_HOURS + route_km / 60)
+    assert fleet.lateness_hours[0] == pytest.approx(fleet.eta_hours[0] - 2.0)
+
+    fleet.advance(1.0)
+    assert fleet.distance[0] == 0.0
+    assert fleet.eta_hours[0] == pytest.approx(1.0 + STALLED_RESUME_HOURS + route_km / 60)
+
+
+def test_arrival_restarts_the_route_with_a_fresh_deadline():
+    fleet = FleetStore(epoch=EPOCH)
+    fleet.add_trucks([straight_truck("A", 0.1, 60, 4.0)], EPOCH)
+    fleet.advance(0.5)  # 30 km on an ~11 km route
+    assert fleet.distance[0] == 0.0
+    assert fleet.positions[0].tolist() == [0.0, 0.0]
+    assert fleet.deadline_hours[0] == pytest.approx(0.5 + 4.0)
+
+
+def test_live_trucks_are_not_moved_by_advance():
+    fleet = FleetStore(epoch=EPOCH)
+    fleet.add_trucks([straight_truck("A", 1.0, 50, 3.0), straight_truck("B", 1.0, 50, 3.0)], EPOCH)
+    fleet.observe(np.array([1]), np.array([[0.5, 0.0]]), np.array([40.0]))
+    assert fleet.route_index[1] == 5
+
+    moved = fleet.advance(1.0)
+    assert moved.tolist() == [0]
+    assert fleet.positions[1].tolist() == [0.5, 0.0]
+    # The live truck's ETA still counts down with the clock, from its reported progress and speed
+    remaining = fleet.route_km[1] - fleet.distance[1]
+    assert fleet.eta_hours[1] == pytest.approx(1.0 + remaining / 40)
+
+
+def test_reroutes_do_not_grow_packed_routes_without_bound():
+    fleet = TruckSimulator(50, seed=3, demo_trucks=False).fleet
+    fleet.advance(0.5)
+    positions = fleet.positions[:fleet.size].copy()
+    used = fleet._coords_used
+
+    for i in range(500):
+        row = i % 10
+        points = 15 if (i // 10) % 2 else 30  # alternately shorter (written in place) and longer (appended)
+        fleet.set_route(row, line(fleet.positions[row], [77.0, 20.0], points))
+
+    assert fleet._coords_used <= 2 * used + 30
+    # Untouched trucks are still where they were on their routes
+    untouched = np.arange(10, fleet.size)
+    fleet.project(untouched)
+    fleet._locate(untouched)
+    assert np.allclose(fleet.positions[untouched], positions[untouched])
+
+
+def test_shorter_route_written_in_place_is_followed():
+    fleet = TruckSimulator(5, seed=1, demo_trucks=False).fleet
+    used = fleet._coords_used
+    fleet.set_route(2, line([73.0, 18.0], [74.0, 18.0], 5))
+
+    assert fleet._coords_used == used
+    assert fleet.route(2).tolist() == line([73.0, 18.0], [74.0, 18.0], 5).tolist()
+    fleet.distance[2] = fleet.route_km[2] / 2
+    fleet._locate(np.array([2]))
+    assert np.allclose(fleet.positions[2], [73.5, 18.0])
+    # Neighbouring routes still resolve to their own points
+    fleet.distance[3] = 0.0
+    fleet._locate(np.array([3]))
+    assert np.allclose(fleet.positions[3], fleet.route(3)[0])
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import forecast
+from event_log import EventLog
+from forecast import contract_terms, fleet_input, forecast as run_forecast, merge_fleet_inputs
+from contract_store import InMemoryContractStore
+from simulation import TruckSimulator
+
+
+def without_timing(report):
+    return {key: value for key, value in report.items() if key not in ("seconds", "workers")}
+
+
+def test_seed_gives_the_same_report():
+    first = run_forecast(trials=60, seed=7, workers=1, chunk_size=25)
+    again = run_forecast(trials=60, seed=7, workers=1, chunk_size=25)
+    pooled = run_forecast(trials=60, seed=7, workers=2, chunk_size=25)
+
+    assert without_timing(first) == without_timing(again) == without_timing(pooled)
+    assert set(first["contracts"]) == {"CNT-2024-001", "CNT-2024-002", "CNT-2024-003"}
+    assert without_timing(run_forecast(trials=60, seed=8, workers=1)) != without_timing(first)
+
+
+def test_forecasts_the_fleet_it_is_given(capsys):
+    simulator = TruckSimulator(events=EventLog(capacity=16), epoch=datetime(2025, 3, 1))
+    on_time = fleet_input(simulator.fleet)
+    simulator.simulate_delay("TRK-402", "critical")
+    fleet = fleet_input(simulator.fleet)
+    assert fleet["severity"] == [forecast.SEVERITIES.index("critical"), -1, -1]
+
+    store = InMemoryContractStore()
+    store.put_many([
+        {"id": "CNT-2024-001", "penaltyPerHour": 500, "maxPenalty": None, "tiers": []},
+        {"id": "CNT-2024-002", "penaltyPerHour": 0, "maxPenalty": 0, "tiers": []},
+    ])
+    terms = contract_terms(store, fleet["contractIds"])
+    # Two shards' worth of the same trucks count twice against their contracts
+    report = run_forecast(trials=40, seed=1, workers=2, fleet=merge_fleet_inputs([fleet, fleet]), terms=terms)
+
+    assert report["trucks"] == 6
+    # A truck already stopped waits out its incident, so its contract is far more exposed
+    before = run_forecast(trials=40, seed=1, workers=1, fleet=merge_fleet_inputs([on_time, on_time]), terms=terms)
+    assert report["contracts"]["CNT-2024-001"]["mean"] > 2 * before["contracts"]["CNT-2024-001"]["mean"]
+    assert report["contracts"]["CNT-2024-002"]["max"] == 0
+    # Not in the store: nothing is owed
+    assert report["contracts"]["CNT-2024-003"]["max"] == 0
+    # Workers get the terms, not a ContractAnalyzer with its start-up warnings
+    assert "WARNING" not in capsys.readouterr().out
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import shard as shard_module
+from gateway import Gateway
+from history import FleetHistory
+from shard import ShardPublisher, build_shard
+
+
+def test_gateway_answers_through_the_dispatcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(shard_module, "EVENT_LOG_DIR", "")
+
+    async def run():
+        shard = build_shard(0, 0)
+        history = FleetHistory()
+        history.watch(shard.simulator)
+        publisher = ShardPublisher(shard, 0, str(tmp_path / "shard-0.sock"), history)
+        server = await publisher.start()
+
+        gateway = Gateway([publisher.path])
+        replies = {}
+        gateway.dispatcher.send = lambda websocket, message: replies.setdefault(message.get("requestId"), message)
+        gateway.start()
+        while not gateway.shards:
+            await asyncio.sleep(0.01)
+
+        truck = shard.simulator.fleet.ids[0]
+        history.record_arbitrage([{"truckId": truck, "contractId": "C-1", "projectedPenalty": 500.0,
+                                   "solutionCost": 200.0, "netSavings": 300.0}], now=time.time() - 60)
+
+        async def ask(request_id, message):
+            gateway.dispatcher.dispatch(object(), {**message, "requestId": request_id})
+            while request_id not in replies:
+                await asyncio.sleep(0.01)
+            return replies[request_id]
+
+        assert (await ask(1, {"type": "ping"}))["type"] == "pong"
+        assert await ask(2, {"type": "reroute", "truckId": "NOPE"}) == {
+            "type": "error", "message": "Unknown truck NOPE", "requestId": 2}
+        assert await ask(3, {"type": "execute_arbitrage", "truckId": truck}) == {"type": "ack", "requestId": 3}
+        ack = await ask(4, {"type": "telemetry", "reports": [
+            {"truckId": truck, "position": [73.8, 18.5], "velocity": 40},
+            {"truckId": "NOPE", "position": [73.8, 18.5], "velocity": 40},
+        ]})
+        assert ack == {"type": "telemetry_ack", "accepted": 1, "rejected": {"unknown": 1}, "requestId": 4}
+
+        log = await ask(5, {"type": "request_arbitrage_history"})
+        assert [(entry["kind"], entry["truckId"]) for entry in log["data"]] == [("executed", truck), ("offered", truck)]
+        savings = await ask(6, {"type": "request_savings_history", "hours": 1})
+        assert savings["totals"] == {"offers": 1, "executed": 1, "savings": 300.0, "penaltiesAvoided": 500.0}
+        assert (await ask(7, {"type": "request_truck_track", "truckId": "NOPE"}))["type"] == "error"
+
+        gateway.dispatcher.shutdown()
+        for task in gateway._followers:
+            task.cancel()
+        server.close()
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import os
+import threading
+
+import numpy as np
+
+from history import ARBITRAGE_COLUMNS, EVENT_SEGMENT_ROWS, STATUS_COUNT_COLUMNS, FleetHistory, TimeSeries
+
+
+def test_segments_are_sized_to_their_cadence(tmp_path):
+    history = FleetHistory(str(tmp_path))
+    counts = {status: np.array([1]) for status in STATUS_COUNT_COLUMNS if status != "t"}
+    history.status_counts.append(1000.0, **counts)
+    assert history.status_counts.segments[-1].capacity == 1440
+
+    trucks = np.arange(50)
+    history.positions.append(1000.0, truck=trucks, lon=np.zeros(50), lat=np.zeros(50), velocity=np.zeros(50),
+                             status=np.zeros(50))
+    assert history.positions.segments[-1].capacity == 50 * 1440
+
+    history.record_execution("T-1", now=1000.0)
+    assert history.arbitrage.segments[-1].capacity == EVENT_SEGMENT_ROWS
+
+
+def test_expired_segment_outlives_open_query(tmp_path):
+    series = TimeSeries({"t": "<f8", "value": "<i4"}, str(tmp_path), segment_seconds=10, retention_seconds=100)
+    series.append(1.0, value=np.array([1, 2]))
+    series.append(20.0, value=np.array([3]))
+    first = series.segments[0].path
+
+    with series._snapshot() as segments:
+        series.expire(500.0)
+        assert len(series) == 1
+        assert os.path.isdir(first)
+        assert segments[0][0].columns["value"][:segments[0][1]].tolist() == [1, 2]
+    assert not os.path.exists(first)
+
+
+def test_queries_while_appending(tmp_path):
+    series = TimeSeries(ARBITRAGE_COLUMNS, str(tmp_path), segment_rows=64)
+    stop = threading.Event()
+    seen = []
+
+    def query():
+        while not stop.is_set():
+            rows = series.range(0, 1e9, ("savings",))
+            # Every row a query sees is complete
+            seen.append((len(rows["t"]), bool((rows["t"] > 0).all())))
+
+    reader = threading.Thread(target=query)
+    reader.start()
+    for i in range(500):
+        series.append(1.0 + i, truck=np.array([i]), contract=np.array([0]), kind=np.array([0]),
+                      penalty=np.array([1.0]), cost=np.array([1.0]), savings=np.array([float(i)]))
+    stop.set()
+    reader.join()
+    assert len(series.range(0, 1e9)["t"]) == 500
+    assert all(complete for _, complete in seen)
+    assert [count for count, _ in seen] == sorted(count for count, _ in seen)
@@ -0,0 +1,75 @@
+import numpy as np
+
+from routing import RoadGraph, Router
+
+
+def grid_graph(size=12, seed=0):
+    """A size x size grid of two-way roads 0.1 degrees apart, with random speeds"""
+    rng = np.random.default_rng(seed)
+    nodes = np.array([[73.0 + 0.1 * x, 18.0 + 0.1 * y] for y in range(size) for x in range(size)])
+    edges, speeds = [], []
+    for y in range(size):
+        for x in range(size):
+            node = y * size + x
+            for neighbor in ([node + 1] if x + 1 < size else []) + ([node + size] if y + 1 < size else []):
+                speed = float(rng.uniform(30, 90))
+                edges += [(node, neighbor), (neighbor, node)]
+                speeds += [speed, speed]
+    return RoadGraph(nodes, np.array(edges), np.array(speeds))
+
+
+def path_cost(path):
+    return sum(path[2])
+
+
+def test_astar_matches_dijkstra():
+    router = Router(grid_graph())
+    rng = np.random.default_rng(1)
+    for source in rng.integers(0, 144, 10).tolist():
+        targets = rng.integers(0, 144, 8).tolist()
+        dijkstra = router.shortest_paths(source, targets)
+        for target in targets:
+            astar = router.shortest_path(source, target)
+            assert abs(path_cost(astar) - path_cost(dijkstra[target])) < 1e-9
+            assert astar[0][0] == source and astar[0][-1] == target
+
+
+def test_distance_weight_matches_dijkstra():
+    router = Router(grid_graph(), weight="distance")
+    dijkstra = router.shortest_paths(0, [143])
+    assert abs(sum(router.shortest_path(0, 143)[1]) - sum(dijkstra[143][1])) < 1e-9
+
+
+def test_blocked_nodes_force_a_detour():
+    # A straight road with one bypass: 0 - 1 - 2, and 0 - 3 - 2
+    nodes = np.array([[73.0, 18.0], [73.1, 18.0], [73.2, 18.0], [73.1, 18.1]])
+    edges = np.array([(0, 1), (1, 0), (1, 2), (2, 1), (0, 3), (3, 0), (3, 2), (2, 3)])
+    router = Router(RoadGraph(nodes, edges, np.full(len(edges), 60.0)))
+
+    assert router.shortest_path(0, 2)[0] == (0, 1, 2)
+    assert router.shortest_path(0, 2, frozenset({1}))[0] == (0, 3, 2)
+    assert router.shortest_path(0, 2, frozenset({1, 3})) is None
+
+
+def test_route_cache_hits_and_misses():
+    router = Router(grid_graph())
+    router.route([73.03, 18.03], [73.95, 18.95])
+    assert (router.hits, router.misses) == (0, 1)
+    # Another point in the same origin and destination cells reuses the cached path
+    route = router.route([73.05, 18.05], [73.97, 18.97])
+    assert (router.hits, router.misses) == (1, 1)
+    assert route["path"].shape == (21, 2)
+
+    router.route_many(np.array([[73.04, 18.04], [73.55, 18.55]]), np.array([[73.96, 18.96], [73.05, 18.05]]))
+    assert (router.hits, router.misses) == (2, 2)
+    # Detours around stalled trucks bypass the cache
+    router.route([73.03, 18.03], [73.95, 18.95], avoid=[[73.5, 18.5]])
+    assert (router.hits, router.misses) == (2, 2)
+
+
+def test_route_without_road_nodes_drives_straight():
+    router = Router(RoadGraph(np.zeros((0, 2)), np.zeros((0, 2)), np.zeros(0)))
+    route = router.route([73.0, 18.0], [73.5, 18.5])
+    assert np.allclose(route["path"][0], [73.0, 18.0]) and np.allclose(route["path"][-1], [73.5, 18.5])
+    paths, _, _ = router.route_many(np.array([[73.0, 18.0]]), np.array([[73.5, 18.5]]))
+    assert np.allclose(paths[0, -1], [73.5, 18.5])
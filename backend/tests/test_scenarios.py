@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from event_log import EventLog
+from simulation import ScenarioEngine, TruckSimulator, create_demo_scenarios
+
+
+def engine():
+    return ScenarioEngine(TruckSimulator(events=EventLog(capacity=64)))
+
+
+def test_timers_fire_in_due_order_then_insertion_order():
+    scenarios = engine()
+    fired = []
+    for delay, name in ((5, "e"), (1, "a"), (3, "b"), (3, "c"), (0, "start")):
+        scenarios.add_scenario(delay, lambda name=name: fired.append(name))
+
+    assert scenarios.advance(2.0) == 2
+    assert fired == ["start", "a"]
+    assert scenarios.next_due() == 3.0
+    assert scenarios.advance(10.0) == 3
+    assert fired == ["start", "a", "b", "c", "e"]
+    assert len(scenarios) == 0 and scenarios.fired == 5
+
+
+def test_recurring_timers_are_rescheduled_from_their_due_time():
+    scenarios = engine()
+    fired = []
+    scenarios.add_scenario(1, lambda: fired.append("capped"), interval=2, repeat=3)
+    scenarios.add_scenario(0, lambda: fired.append("forever"), interval=4)
+
+    # One late advance catches up on every occurrence due by then
+    scenarios.advance(9.0)
+    assert fired.count("capped") == 3
+    assert fired.count("forever") == 3  # at 0, 4 and 8
+    assert scenarios.next_due() == 12.0
+
+
+def test_condition_fires_after_consecutive_ticks():
+    scenarios = engine()
+    fired = []
+    scenarios.when_stopped("TRK-305", 2, lambda: fired.append("stopped"))
+
+    scenarios.advance(1.0)
+    scenarios.simulator.simulate_delay("TRK-305", "critical")
+    scenarios.advance(2.0)
+    assert fired == []
+    scenarios.advance(3.0)
+    assert fired == ["stopped"]
+    # Once fired, a one-shot condition is gone
+    assert scenarios.conditions == []
+
+
+def test_condition_streak_resets_when_predicate_fails():
+    scenarios = engine()
+    fired = []
+    scenarios.when_stopped("TRK-305", 2, lambda: fired.append("stopped"), once=False)
+    simulator = scenarios.simulator
+
+    simulator.simulate_delay("TRK-305", "critical")
+    scenarios.advance(1.0)
+    simulator.resolve_delay("TRK-305")
+    scenarios.advance(2.0)
+    simulator.simulate_delay("TRK-305", "critical")
+    scenarios.advance(3.0)
+    assert fired == []
+    scenarios.advance(4.0)
+    assert fired == ["stopped"]
+
+
+def test_scenario_file_actions_and_state_round_trip(tmp_path):
+    path = tmp_path / "script.jsonl"
+    path.write_text("\n".join(json.dumps(event) for event in (
+        {"at": 1, "action": "simulate_delay", "truckId": "TRK-402", "severity": "critical"},
+        {"at": 2, "action": "add_event", "message": "ping", "every": 5, "repeat": 2},
+        {"at": 4, "action": "resolve_delay", "truckId": "TRK-402"},
+    )) + "\n", encoding="utf-8")
+    scenarios = engine()
+    assert scenarios.load(str(path)) == 3
+    scenarios.add_scenario(3, lambda: None)  # Python callables are not saved
+    scenarios.when_stopped("TRK-518", 3, {"action": "add_event", "message": "stalled"})
+
+    scenarios.advance(2.0)
+    fleet = scenarios.simulator.fleet
+    assert fleet.velocity[fleet.row("TRK-402")] == 0
+    state = json.loads(json.dumps(scenarios.state()))
+    assert [timer[0] for timer in state["timers"]] == [4.0, 7.0]
+    assert len(state["conditions"]) == 1
+
+    restored = engine()
+    restored.restore(state)
+    assert restored.elapsed == 2.0 and restored.fired == 2
+    restored.advance(8.0)
+    assert [event["message"] for event in restored.simulator.events.of_type("system")] == ["ping"]
+    assert len(restored) == 0
+
+
+def test_unknown_action_is_rejected():
+    scenarios = engine()
+    scenarios.add_scenario(0, {"action": "teleport"})
+    with pytest.raises(ValueError):
+        scenarios.advance(1.0)
+
+
+def test_demo_scenario_loads():
+    scenarios = create_demo_scenarios(TruckSimulator(events=EventLog(capacity=64)))
+    scenarios.advance(10.0)
+    fleet = scenarios.simulator.fleet
+    assert fleet.velocity[fleet.row("TRK-402")] == 0
+    assert scenarios.fired == 3
@@ -0,0 +1,57 @@
+import filecmp
+import os
+
+import pytest
+
+import snapshot
+from snapshot import create_fixture, exists, load
+
+
+def files(path):
+    return sorted(os.path.relpath(os.path.join(root, name), path)
+                  for root, _, names in os.walk(path) for name in names)
+
+
+def test_fixture_is_deterministic(tmp_path):
+    first, second = str(tmp_path / "a"), str(tmp_path / "b")
+    create_fixture(first, 50, seed=7)
+    create_fixture(second, 50, seed=7)
+
+    assert files(first) == files(second)
+    _, mismatch, errors = filecmp.cmpfiles(first, second, files(first), shallow=False)
+    assert not mismatch and not errors
+    assert load(first).state["fleet"]["epoch"] == load(second).state["fleet"]["epoch"]
+
+
+def test_load_falls_back_to_the_copy_moved_aside(tmp_path):
+    path = str(tmp_path / "snapshot")
+    create_fixture(path, 10, seed=1)
+    # A write interrupted between its two renames leaves only the previous snapshot, as path.old
+    os.rename(path, path + ".old")
+
+    assert exists(path)
+    assert load(path).state["fleet"]["size"] == 10
+
+    # The next write puts it back before clearing the way for the new one
+    create_fixture(path, 12, seed=1)
+    assert load(path).state["fleet"]["size"] == 12
+    assert not os.path.exists(path + ".old")
+
+
+def test_interrupted_write_keeps_the_previous_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot")
+    create_fixture(path, 10, seed=1)
+    rename = os.rename
+
+    def crash_on_swap(source, target):
+        if source.endswith(".tmp"):
+            raise OSError("disk full")
+        rename(source, target)
+
+    monkeypatch.setattr(snapshot.os, "rename", crash_on_swap)
+    with pytest.raises(OSError):
+        create_fixture(path, 12, seed=1)
+    monkeypatch.undo()
+
+    assert exists(path)
+    assert load(path).state["fleet"]["size"] == 10
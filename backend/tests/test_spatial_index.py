@@ -0,0 +1,40 @@
+import numpy as np
+
+from spatial_index import SpatialGrid, haversine_km
+
+
+def brute_force(positions, alive, lon, lat, radius_km):
+    distances = haversine_km(lon, lat, positions[:, 0], positions[:, 1])
+    return sorted(np.flatnonzero(alive & (distances <= radius_km)).tolist())
+
+
+def test_incremental_updates_match_a_full_search():
+    rng = np.random.default_rng(5)
+    n = 2000
+    positions = np.column_stack((rng.uniform(72, 80, n), rng.uniform(15, 22, n)))
+    alive = np.ones(n, dtype=bool)
+    grid = SpatialGrid(capacity=n)
+    grid.update_many(np.arange(n), positions)
+
+    for step in range(30):
+        # Few keys move between queries, so the ordering is merged rather than re-sorted
+        moved = rng.choice(np.flatnonzero(alive), 20, replace=False)
+        positions[moved] += rng.normal(0.0, 0.5, (20, 2))
+        grid.update_many(moved, positions[moved])
+        if step % 5 == 0:
+            gone = int(rng.integers(n))
+            grid.remove(gone)
+            alive[gone] = False
+        lon, lat = rng.uniform(72, 80), rng.uniform(15, 22)
+
+        found = sorted(key for key, _ in grid.within_radius(lon, lat, 120.0))
+        assert found == brute_force(positions, alive, lon, lat, 120.0)
+        assert len(grid._order) <= n
+
+
+def test_new_keys_are_merged_in():
+    grid = SpatialGrid(capacity=4)
+    grid.update_many([0, 1, 2, 3], np.array([[73.0, 18.0], [73.1, 18.0], [80.0, 25.0], [80.1, 25.0]]))
+    assert [key for key, _ in grid.within_radius(73.0, 18.0, 50)] == [0, 1]
+    grid.update(4, 73.05, 18.0)
+    assert [key for key, _ in grid.within_radius(73.0, 18.0, 50)] == [0, 4, 1]
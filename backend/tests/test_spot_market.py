@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import spot_market
+from spot_market import SpotMarket, normalize_quote
+
+
+def quote(quote_id, **fields):
+    return {"id": quote_id, "provider": quote_id, "cost": 1000, "eta": 30, "location": [73.8, 18.5], **fields}
+
+
+def test_feed_expiry_is_kept_across_refreshes(tmp_path):
+    now = time.time()
+    feed = tmp_path / "quotes.json"
+    feed.write_text(json.dumps([
+        quote("Q-expires", expiresAt=now + 60),
+        quote("Q-quoted", quotedAt=now - 100, ttlSeconds=300),
+        quote("Q-iso", expiresAt=datetime.fromtimestamp(now + 90, timezone.utc).isoformat()),
+        quote("Q-stale", quotedAt=now - 400, ttlSeconds=300),
+        quote("Q-default"),
+    ]))
+    market = SpotMarket()
+    book = market.load_feed(str(feed))
+
+    assert "Q-stale" not in book.quotes
+    assert book.quotes["Q-expires"]["expiresAt"] == now + 60
+    assert abs(book.quotes["Q-quoted"]["expiresAt"] - (now + 200)) < 1e-6
+    assert abs(book.quotes["Q-iso"]["expiresAt"] - (now + 90)) < 1e-3
+    assert book.quotes["Q-default"]["expiresAt"] >= now + spot_market.DEFAULT_QUOTE_TTL
+
+    # Reading the same feed again later does not extend the feed's own expiries
+    later = market.load_feed(str(feed))
+    assert later.quotes["Q-expires"]["expiresAt"] == now + 60
+
+
+def test_millisecond_timestamps():
+    now = time.time()
+    assert abs(normalize_quote(quote("Q", expiresAt=(now + 60) * 1000))["expiresAt"] - (now + 60)) < 1e-3
+
+
+def test_pinned_quotes_never_expire():
+    market = SpotMarket()
+    market.add_quotes([quote("Q-pinned", expiresAt=time.time() - 1)], pinned=True)
+    assert market.purge() == 0
+    assert market.best()["id"] == "Q-pinned"
+
+
+def test_refresh_forever_purges_between_refreshes(tmp_path, monkeypatch):
+    feed = tmp_path / "quotes.json"
+    feed.write_text(json.dumps([quote("Q-short", ttlSeconds=0.05), quote("Q-long")]))
+    monkeypatch.setattr(spot_market, "PURGE_SECONDS", 0.02)
+    market = SpotMarket()
+
+    async def run():
+        task = asyncio.create_task(market.refresh_forever(str(feed), interval=60))
+        await asyncio.sleep(0.01)
+        assert "Q-short" in market.book.quotes
+        await asyncio.sleep(0.15)
+        task.cancel()
+
+    asyncio.run(run())
+    assert set(market.book.quotes) == {"Q-long"}
+
+
+def test_malformed_feed_quotes_are_dropped(tmp_path):
+    feed = tmp_path / "quotes.jsonl"
+    feed.write_text("\n".join([
+        json.dumps(quote("Q-good")),
+        json.dumps({"id": "Q-no-cost", "provider": "P", "eta": 30, "location": [73.8, 18.5]}),
+        json.dumps(quote("Q-no-location", location=None)),
+        json.dumps(quote("Q-text-cost", cost="cheap")),
+        "{not json",
+    ]))
+    book = SpotMarket().load_feed(str(feed))
+    assert set(book.quotes) == {"Q-good"}
+
+
+def test_refresh_forever_keeps_last_good_book(tmp_path, monkeypatch):
+    feed = tmp_path / "quotes.json"
+    feed.write_text(json.dumps([quote("Q-first")]))
+    market = SpotMarket()
+    calls = []
+
+    def load_feed(path, ttl):
+        calls.append(path)
+        if len(calls) > 1:
+            raise TypeError("broken feed")
+        return SpotMarket.load_feed(market, path, ttl)
+
+    monkeypatch.setattr(market, "load_feed", load_feed)
+
+    async def run():
+        task = asyncio.create_task(market.refresh_forever(str(feed), interval=0.01))
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(calls) > 2
+    assert set(market.book.quotes) == {"Q-first"}
+
+
+def test_added_quotes_survive_refresh(tmp_path):
+    feed = tmp_path / "quotes.json"
+    feed.write_text(json.dumps([quote("Q-feed"), quote("Q-both", cost=900)]))
+    market = SpotMarket()
+    market.add_quotes([quote("Q-added"), quote("Q-both", cost=1200), quote("Q-gone", expiresAt=time.time() + 0.01)])
+    time.sleep(0.02)
+
+    asyncio.run(market.refresh(str(feed)))
+    assert set(market.book.quotes) == {"Q-feed", "Q-both", "Q-added"}
+    assert market.book.quotes["Q-both"]["cost"] == 900
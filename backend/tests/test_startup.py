@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous for a cold CI runner; a warm import of server takes about 0.1 s
+MAX_IMPORT_SECONDS = 2.0
+
+
+def import_times(module: str):
+    """Cumulative import time in microseconds per module, from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", ["server", "gateway", "shard", "contract_analyzer"])
+def test_import_is_fast_and_skips_the_openai_sdk(module):
+    times = import_times(module)
+    assert not [name for name in times if name == "openai" or name.startswith("openai.")]
+    assert times[module] / 1e6 < MAX_IMPORT_SECONDS
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from delta import DeltaEncoder
+from event_log import EventLog
+from simulation import TruckSimulator
+from subscriptions import SubscriptionIndex, parse_bbox
+
+
+def subscribed():
+    """The three demo trucks, with one client per kind of subscription"""
+    simulator = TruckSimulator(events=EventLog(capacity=16))
+    simulator.add_event("info", "about TRK-305", "TRK-305")
+    simulator.add_event("info", "about nobody")
+    encoder = DeltaEncoder(simulator)
+    index = SubscriptionIndex()
+    index.subscribe("by-truck", truck_ids=["TRK-305"])
+    index.subscribe("by-contract", contract_ids=["CNT-2024-003"])
+    index.subscribe("by-bbox", bbox=(73.0, 18.0, 74.0, 19.0))  # around TRK-402
+    snapshots = {client: index.filter_snapshot(client, encoder.snapshot(), simulator.fleet)
+                 for client in ("by-truck", "by-contract", "by-bbox", "everything")}
+    return simulator, encoder, index, snapshots
+
+
+def move(simulator, truck_id, position):
+    fleet = simulator.fleet
+    row = fleet.row(truck_id)
+    fleet.observe(np.array([row]), np.array([position], dtype=np.float64), fleet.velocity[[row]])
+
+
+def test_snapshot_is_narrowed_to_the_subscription():
+    _, _, _, snapshots = subscribed()
+
+    def trucks(client):
+        return [truck["id"] for truck in snapshots[client]["data"]["trucks"]]
+
+    assert trucks("by-truck") == ["TRK-305"]
+    assert trucks("by-contract") == ["TRK-518"]
+    assert trucks("by-bbox") == ["TRK-402"]
+    assert trucks("everything") == ["TRK-402", "TRK-305", "TRK-518"]
+    # Events about trucks out of view are dropped; fleet-wide ones are kept
+    assert [event["message"] for event in snapshots["by-truck"]["data"]["events"]] == ["about TRK-305",
+                                                                                      "about nobody"]
+    assert [event["message"] for event in snapshots["by-bbox"]["data"]["events"]] == ["about nobody"]
+
+
+def test_trucks_entering_and_leaving_a_bbox():
+    simulator, encoder, index, _ = subscribed()
+    move(simulator, "TRK-402", [80.0, 25.0])
+    move(simulator, "TRK-305", [73.5, 18.5])
+    routed = index.route_delta(encoder.delta(), simulator.fleet)
+
+    # The contract watcher saw no change, so it gets no frame
+    assert set(routed) == {"by-truck", "by-bbox"}
+    assert [truck["id"] for truck in routed["by-truck"]["data"]["trucks"]] == ["TRK-305"]
+    assert "route" not in routed["by-truck"]["data"]["trucks"][0]
+
+    bbox = routed["by-bbox"]["data"]
+    assert bbox["removed"] == ["TRK-402"]
+    # A truck newly in view is sent whole, route included
+    assert [truck["id"] for truck in bbox["trucks"]] == ["TRK-305"]
+    assert "route" in bbox["trucks"][0] and "driver" in bbox["trucks"][0]
+    assert index.subscriptions["by-bbox"].visible == {"TRK-305"}
+
+
+def test_base_seq_is_the_last_frame_the_client_received():
+    simulator, encoder, index, _ = subscribed()
+    move(simulator, "TRK-305", [77.6, 13.0])
+    first = index.route_delta(encoder.delta(), simulator.fleet)
+    assert set(first) == {"by-truck"}
+    assert (first["by-truck"]["baseSeq"], first["by-truck"]["seq"]) == (0, 1)
+
+    simulator.simulate_delay("TRK-518", "critical")
+    second = index.route_delta(encoder.delta(), simulator.fleet)
+    assert set(second) == {"by-contract"}
+    # Skipped tick 1 was not a gap for this client
+    assert (second["by-contract"]["baseSeq"], second["by-contract"]["seq"]) == (0, 2)
+    assert [event["truckId"] for event in second["by-contract"]["data"]["events"]] == ["TRK-518"]
+
+
+def test_unsubscribe_clears_every_index():
+    _, _, index, _ = subscribed()
+    for client in ("by-truck", "by-contract", "by-bbox"):
+        index.unsubscribe(client)
+    assert not index.subscriptions
+    assert not index.by_truck and not index.by_contract and not index.by_cell and not index.visible_by_truck
+    assert index.wants("by-truck", "TRK-518")
+
+
+def test_parse_bbox():
+    assert parse_bbox(None) is None
+    assert parse_bbox([1, 2, 3, 4]) == (1.0, 2.0, 3.0, 4.0)
+    with pytest.raises(ValueError):
+        parse_bbox([1, 2, 3])
+    with pytest.raises(ValueError):
+        parse_bbox([3, 2, 1, 4])
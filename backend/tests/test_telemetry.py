@@ -0,0 +1,45 @@
+import time
+
+from simulation import TruckSimulator
+from telemetry import TelemetryIngest
+
+
+def ingest():
+    simulator = TruckSimulator()
+    return TelemetryIngest(simulator), simulator.fleet.ids[0]
+
+
+def test_reports_after_a_jump_are_checked_against_the_last_accepted():
+    telemetry, truck = ingest()
+    now = time.time()
+    result = telemetry.submit([truck] * 3, [73.0, 78.0, 73.01], [18.0, 18.0, 18.0], [50, 50, 50],
+                              [now - 300, now - 200, now - 100])
+    assert result == {"accepted": 2, "rejected": {"jump": 1}}
+    assert telemetry.last_position[telemetry.simulator.fleet.index[truck]].tolist() == [73.01, 18.0]
+
+
+def test_small_steps_after_a_jump_are_accepted():
+    telemetry, truck = ingest()
+    now = time.time()
+    assert telemetry.submit([truck], [73.0], [18.0], [50], [now - 400])["accepted"] == 1
+    result = telemetry.submit([truck] * 3, [78.0, 73.01, 73.02], [18.0, 18.0, 18.0], [50, 50, 50],
+                              [now - 300, now - 200, now - 100])
+    assert result == {"accepted": 2, "rejected": {"jump": 1}}
+
+
+def test_stale_is_judged_against_the_last_accepted():
+    telemetry, truck = ingest()
+    now = time.time()
+    # The second report shares the first's timestamp; the first is a jump, so the second is not stale
+    assert telemetry.submit([truck], [73.0], [18.0], [50], [now - 400])["accepted"] == 1
+    result = telemetry.submit([truck] * 2, [78.0, 73.01], [18.0, 18.0], [50, 50], [now - 300, now - 300])
+    assert result == {"accepted": 1, "rejected": {"jump": 1}}
+
+
+def test_missing_truck_id_is_unknown():
+    telemetry, truck = ingest()
+    result = telemetry.submit_message({"reports": [
+        {"position": [73.0, 18.0], "velocity": 40},
+        {"truckId": truck, "position": [73.0, 18.0], "velocity": 40},
+    ]})
+    assert result == {"accepted": 1, "rejected": {"unknown": 1}}
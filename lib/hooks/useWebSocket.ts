@@ -8,13 +8,25 @@ interface WebSocketDataMessage {
     events?: AgentEvent[];
 }
 
+type TruckDelta = Partial<Truck> & { id: string };
+
+interface WebSocketDeltaMessage {
+    trucks: TruckDelta[];
+    events: AgentEvent[];
+    removed?: string[];
+}
+
 interface WebSocketMessage {
     type: string;
-    data?: WebSocketDataMessage | ArbitrageOpportunity;
+    data?: WebSocketDataMessage | WebSocketDeltaMessage | ArbitrageOpportunity;
+    seq?: number;
+    baseSeq?: number;
     truckId?: string;
     timestamp?: string;
 }
 
+const MAX_EVENTS = 50;
+
 interface WebSocketState {
     trucks: Truck[];
     events: AgentEvent[];
@@ -36,6 +48,7 @@ export function useWebSocket(url: string = 'ws://localhost:8080') {
     const reconnectTimeoutRef = useRef<NodeJS.Timeout | undefined>(undefined);
     const reconnectAttempts = useRef(0);
     const maxReconnectAttempts = 5;
+    const seqRef = useRef<number | null>(null);
 
     const handleMessage = useCallback((message: WebSocketMessage) => {
         switch (message.type) {
@@ -43,6 +56,7 @@ export function useWebSocket(url: string = 'ws://localhost:8080') {
             case 'state_update':
                 if (message.data && 'trucks' in message.data) {
                     const data = message.data as WebSocketDataMessage;
+                    seqRef.current = message.seq ?? null;
                     setState(prev => ({
                         ...prev,
                         trucks: data.trucks || prev.trucks,
@@ -51,6 +65,36 @@ export function useWebSocket(url: string = 'ws://localhost:8080') {
                 }
                 break;
 
+            case 'state_delta': {
+                // A missed frame means our copy is stale; ask for a fresh snapshot
+                if (seqRef.current === null || message.baseSeq !== seqRef.current) {
+                    seqRef.current = null;
+                    if (wsRef.current?.readyState === WebSocket.OPEN) {
+                        wsRef.current.send(JSON.stringify({type: 'resync'}));
+                    }
+                    break;
+                }
+                seqRef.current = message.seq ?? null;
+
+                const delta = message.data as WebSocketDeltaMessage;
+                setState(prev => {
+                    const updates = new Map(delta.trucks.map(t => [t.id, t]));
+                    const removed = new Set(delta.removed ?? []);
+                    const trucks = prev.trucks.filter(t => !removed.has(t.id)).map(t => {
+                        const update = updates.get(t.id);
+                        if (!update) return t;
+                        updates.delete(t.id);
+                        return {...t, ...update};
+                    });
+                    updates.forEach(t => trucks.push(t as Truck));
+
+                    const seen = new Set(prev.events.map(e => e.id));
+                    const events = [...prev.events, ...delta.events.filter(e => !seen.has(e.id))];
+                    return {...prev, trucks, events: events.slice(-MAX_EVENTS)};
+                });
+                break;
+            }
+
             case 'arbitrage_opportunity':
                 if (message.data && 'truckId' in message.data) {
                     setState(prev => ({
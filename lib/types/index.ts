@@ -9,6 +9,8 @@ export interface Truck {
   destination: [number, number];
   route: [number, number][];
   driver: string;
+  eta?: string | null;
+  latenessHours?: number;
 }
 
 export interface AgentEvent {
@@ -22,6 +24,7 @@ export interface AgentEvent {
 export interface ArbitrageOpportunity {
   truckId: string;
   projectedPenalty: number;
+  projectedDelayHours?: number;
   solutionType: string;
   solutionCost: number;
   netSavings: number;